@@ -1,7 +1,17 @@
+import time
+_SCRIPT_START = time.perf_counter()
+
+import os
 import streamlit as st
-from src.retriever import Retriever
-from src.generator import GeminiGenerator, CLASSIC_INSUFFICIENT_MSG
-from src.vision import VisionExtractor
+# Only light modules here: the retriever (sklearn) is imported on the
+# warm-up thread and the Gemini SDK on the first model call, so the page
+# renders before either has loaded.
+from src.generator import CLASSIC_INSUFFICIENT_MSG
+from src.vision import parse_questions
+from src.context_packer import ContextPacker
+from src.tracing import span, tracer
+from src.warmup import BackgroundResource
+_IMPORTS_DONE = time.perf_counter()
 
 st.set_page_config(page_title="NexusAI", layout="wide", initial_sidebar_state="expanded")
 
@@ -139,22 +149,40 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+MAX_PARALLEL_QUESTIONS = 4
+# Subjects searched per question when auto-routing is on.
+ROUTE_SUBJECTS = 3
+# Optional Prometheus textfile, rewritten after every request.
+METRICS_FILE = os.getenv("NEXUS_METRICS_FILE")
+
 # ---------- Cached singletons ----------
 @st.cache_resource
-def get_retriever():
-    return Retriever()
+def get_index_loader():
+    """Loads (or builds) the index on a background thread, once per server process."""
+    def build():
+        from src.dedup import DEFAULT_THRESHOLD
+        from src.retriever import Retriever
+        retriever = Retriever(dedup_threshold=DEFAULT_THRESHOLD)
+        tracer.observe("app.index_warmup", time.perf_counter() - start)
+        return retriever
 
+    start = time.perf_counter()
+    return BackgroundResource(build, name="index-warmup")
+
+# The model clients are only built when first needed.
 @st.cache_resource
 def get_generator():
+    from src.generator import GeminiGenerator
     return GeminiGenerator()
 
 @st.cache_resource
 def get_vision():
+    from src.vision import VisionExtractor
     return VisionExtractor()
 
-retriever = get_retriever()
-generator = get_generator()
-vision = get_vision()
+index_loader = get_index_loader()
+# None until the index is ready; questions asked before then wait for it.
+retriever = index_loader.value
 
 
 # ---------- Sidebar ----------
@@ -162,17 +190,38 @@ with st.sidebar:
     st.title("⚡ Control Panel")
     st.markdown("---")
     top_k = st.slider("🔍 Top-K retrieved chunks", 1, 10, 3, 1)
+    context_budget = st.slider("🧾 Context budget (chars)", 1000, 12000, 6000, 500)
+    fan_out = st.checkbox("🧩 Answer each image question separately", value=True)
+    subject_filter = st.multiselect(
+        "📂 Search only these subjects",
+        retriever.get_folders() + retriever.get_subjects() if retriever else [],
+        disabled=retriever is None,
+        help="Pick folders (e.g. OS) or single subjects; leave empty to search everything.",
+    )
+    auto_route = st.checkbox(
+        "🧭 Auto-route to the nearest subjects",
+        value=False,
+        disabled=bool(subject_filter),
+        help=f"Search only the {ROUTE_SUBJECTS} subjects closest to the question.",
+    )
+    scope = {"subjects": subject_filter or None, "route": 0 if subject_filter or not auto_route else ROUTE_SUBJECTS}
     debug_mode = st.checkbox("🐛 Show retrieval debug", value=False)
     
-    if st.button("🔄 Reload Knowledge Base"):
-        with st.spinner("Rebuilding index from TXT files..."):
+    if st.button("🔄 Reload Knowledge Base", disabled=retriever is None):
+        with st.spinner("Updating index from changed source files..."):
             retriever.reload()
         st.success("✅ Knowledge base reloaded!")
 
     st.markdown("---")
     st.markdown("### 📊 Statistics")
-    st.caption(f"📚 Subjects: **{len(retriever.get_subjects())}**")
-    st.caption(f"📄 Total chunks: **{retriever.get_chunk_count()}**")
+    if retriever:
+        st.caption(f"📚 Subjects: **{len(retriever.get_subjects())}**")
+        st.caption(f"📄 Total chunks: **{retriever.get_chunk_count()}**")
+    elif index_loader.error:
+        st.error(f"Knowledge base failed to load: {index_loader.error}")
+    else:
+        st.caption("⏳ Loading knowledge base...")
+    startup_caption = st.empty()
     st.markdown("---")
     st.caption("💡 **Pro Tip:** Upload an image and ask your question!")
 
@@ -183,6 +232,12 @@ if "last_retrieved" not in st.session_state:
     st.session_state.last_retrieved = None
 if "last_query" not in st.session_state:
     st.session_state.last_query = None
+if "last_packing" not in st.session_state:
+    st.session_state.last_packing = None
+if "last_trace" not in st.session_state:
+    st.session_state.last_trace = None
+if "startup" not in st.session_state:
+    st.session_state.startup = None
 
 st.markdown('<div style="text-align: center; margin-bottom: 1rem;"><svg width="80" height="80" viewBox="0 0 512 512" xmlns="http://www.w3.org/2000/svg" style="display: inline-block;"><circle cx="256" cy="120" r="40" fill="#1a1a2e"/><circle cx="256" cy="280" r="180" fill="#ffffff" stroke="#1a1a2e" stroke-width="20"/><line x1="110" y1="200" x2="110" y2="120" stroke="#1a1a2e" stroke-width="15"/><circle cx="110" cy="120" r="20" fill="#1a1a2e"/><line x1="402" y1="200" x2="402" y2="120" stroke="#1a1a2e" stroke-width="15"/><circle cx="402" cy="120" r="20" fill="#1a1a2e"/><circle cx="90" cy="280" r="30" fill="#1a1a2e"/><circle cx="422" cy="280" r="30" fill="#1a1a2e"/><rect x="150" y="230" width="212" height="100" rx="50" fill="#00d4ff" stroke="#1a1a2e" stroke-width="15"/><circle cx="210" cy="280" r="25" fill="#1a1a2e"/><circle cx="302" cy="280" r="25" fill="#1a1a2e"/><path d="M 220 370 Q 256 390 292 370" fill="#1a1a2e"/><rect x="180" y="420" width="152" height="70" rx="15" fill="#ffffff" stroke="#1a1a2e" stroke-width="15"/><rect x="130" y="440" width="30" height="60" rx="15" fill="#ffffff" stroke="#1a1a2e" stroke-width="12"/><rect x="352" y="440" width="30" height="60" rx="15" fill="#ffffff" stroke="#1a1a2e" stroke-width="12"/><ellipse cx="256" cy="500" rx="50" ry="20" fill="#1a1a2e"/></svg><h1 style="margin: 0.5rem 0 0 0; color: #fff; font-weight: 800; font-size: 3rem;">NexusAI</h1><p style="color: #7a5fff; font-size: 1.2rem; margin-top: 0.5rem;">Advanced Image + Text Knowledge Retrieval</p></div>', unsafe_allow_html=True)
 
@@ -195,49 +250,139 @@ uploaded_image = st.file_uploader(
 
 extracted_text = None  # for UI display
 
+# Start-up timings of this session's first run: imports of this script and
+# time until the page skeleton (sidebar, header, uploader) was sent.
+if st.session_state.startup is None:
+    st.session_state.startup = {
+        "import_ms": (_IMPORTS_DONE - _SCRIPT_START) * 1000,
+        "first_paint_ms": (time.perf_counter() - _SCRIPT_START) * 1000,
+    }
+    tracer.observe("app.imports", _IMPORTS_DONE - _SCRIPT_START)
+    tracer.observe("app.first_paint", time.perf_counter() - _SCRIPT_START)
+startup = st.session_state.startup
+startup_caption.caption(
+    f"⏱️ Imports {startup['import_ms']:.0f} ms • first paint {startup['first_paint_ms']:.0f} ms"
+    + (f" • index ready in {index_loader.seconds:.1f} s" if index_loader.done else "")
+)
+
 
 # ---------- Chat UI ----------
 chat_container = st.container()
 user_question = st.chat_input("💬 Ask me anything about your textbooks...")
 
+# Render chat history (the new turn, if any, is streamed in below it)
+with chat_container:
+    for msg in st.session_state.messages:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
 
 if user_question:
     st.session_state.messages.append({"role": "user", "content": user_question})
+    with chat_container:
+        with st.chat_message("user"):
+            st.markdown(user_question)
 
-    combined_query_parts = []
+    if retriever is None:
+        # Hold the question until the warm-up thread has the index.
+        with chat_container:
+            with st.spinner("⏳ The knowledge base is still loading; your question will be answered as soon as it is ready..."):
+                index_loader.wait()
+        retriever = index_loader.value
+        if retriever is None:
+            st.session_state.messages.append(
+                {"role": "assistant", "content": f"⚠️ The knowledge base could not be loaded: {index_loader.error}"}
+            )
+            st.rerun()
+    generator = get_generator()
 
-    if uploaded_image is not None:
-        with st.spinner("🔍 Reading text from image..."):
-            extracted_text = vision.extract_text(uploaded_image)
-            if extracted_text:
-                combined_query_parts.append(extracted_text)
+    # Stage timings are recorded for every request while the debug panel
+    # is open, otherwise only for the sampled fraction (NEXUS_TRACE_SAMPLE).
+    with tracer.trace("ask", force=debug_mode) as request_trace:
+        combined_query_parts = []
 
-    if extracted_text:
-        st.markdown(f"<div style='background: rgba(122, 95, 255, 0.2); padding: 1rem; border-radius: 10px; border-left: 4px solid #7a5fff; margin: 1rem 0;'><strong>📌 Extracted Text:</strong><br><br>{extracted_text}</div>", unsafe_allow_html=True)
+        if uploaded_image is not None:
+            with st.spinner("🔍 Reading text from image..."):
+                with span("vision.extract"):
+                    vision_result = get_vision().extract(uploaded_image)
+                extracted_text = vision_result.text
+                if extracted_text:
+                    combined_query_parts.append(extracted_text)
+                elif not vision_result.ok:
+                    st.warning(f"Could not read the image ({vision_result.status}); answering from the text question only.")
 
-    combined_query_parts.append(user_question)
-    final_query = "\n\n".join([p for p in combined_query_parts if p.strip()])
+        if extracted_text:
+            st.markdown(f"<div style='background: rgba(122, 95, 255, 0.2); padding: 1rem; border-radius: 10px; border-left: 4px solid #7a5fff; margin: 1rem 0;'><strong>📌 Extracted Text:</strong><br><br>{extracted_text}</div>", unsafe_allow_html=True)
 
-    with st.spinner("🔎 Retrieving relevant textbook content..."):
-        retrieved = retriever.retrieve(final_query, top_k=top_k)
+        questions = parse_questions(extracted_text) if fan_out else []
 
-    st.session_state.last_retrieved = retrieved
-    st.session_state.last_query = final_query
+        if len(questions) > 1:
+            # Several questions on the image: one batched retrieval pass, then
+            # answers generated side by side and shown as each one finishes.
+            # The typed message goes with every question, as it would have
+            # gone with the whole image text.
+            queries = [f"{q}\n\n{user_question}" for q in questions]
+            note = f"Answering each question together with: “{user_question}”"
+            with st.spinner("🔎 Retrieving relevant textbook content..."):
+                retrieved_per_q = retriever.retrieve_many(queries, top_k=top_k, **scope)
+            packer = ContextPacker(max_chars=context_budget)
+            with span("pack_context"):
+                packed = [packer.pack(r) for r in retrieved_per_q]
 
-    if not retrieved:
-        answer = CLASSIC_INSUFFICIENT_MSG
-    else:
-        with st.spinner("🤖 Thinking..."):
-            answer = generator.generate(user_question, retrieved)
+            st.session_state.last_retrieved = [ch for r in retrieved_per_q for ch in r]
+            st.session_state.last_query = "\n---\n".join(queries)
+            st.session_state.last_packing = {
+                k: sum(report[k] for _, report in packed) for k in packed[0][1]
+            }
 
-    st.session_state.messages.append({"role": "assistant", "content": answer})
+            answers = [CLASSIC_INSUFFICIENT_MSG] * len(questions)
+            with chat_container:
+                with st.chat_message("assistant"):
+                    st.caption(note)
+                    slots = []
+                    for i, q in enumerate(questions, start=1):
+                        st.markdown(f"**Q{i}. {q}**")
+                        slots.append(st.empty())
+                        slots[-1].caption("⏳ Thinking...")
+                    for i, ans in generator.generate_concurrently(
+                        queries, [context for context, _ in packed], max_parallel=MAX_PARALLEL_QUESTIONS
+                    ):
+                        answers[i] = ans
+                        slots[i].markdown(ans)
 
+            answer = f"_{note}_\n\n" + "\n\n".join(
+                f"**Q{i}. {q}**\n\n{a}" for i, (q, a) in enumerate(zip(questions, answers), start=1)
+            )
+        else:
+            combined_query_parts.append(user_question)
+            final_query = "\n\n".join([p for p in combined_query_parts if p.strip()])
 
-# Render chat history
-with chat_container:
-    for msg in st.session_state.messages:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"])
+            with st.spinner("🔎 Retrieving relevant textbook content..."):
+                retrieved = retriever.retrieve(final_query, top_k=top_k, **scope)
+
+            # Merge neighbouring chunks, drop repeated text and fit the prompt budget
+            with span("pack_context"):
+                context, packing = ContextPacker(max_chars=context_budget).pack(retrieved)
+
+            st.session_state.last_retrieved = retrieved
+            st.session_state.last_query = final_query
+            st.session_state.last_packing = packing
+
+            with chat_container:
+                with st.chat_message("assistant"):
+                    if not retrieved:
+                        answer = CLASSIC_INSUFFICIENT_MSG
+                        st.markdown(answer)
+                    else:
+                        # Tokens are rendered as they arrive; they add up to stream.text.
+                        stream = generator.generate_stream(user_question, context)
+                        st.write_stream(stream)
+                        answer = stream.text
+
+    st.session_state.last_trace = request_trace.breakdown() if request_trace else None
+    if METRICS_FILE:
+        tracer.write_prometheus(METRICS_FILE)
+    st.session_state.messages.append({"role": "assistant", "content": answer})
 
 
 # ---------- Debug Panel ----------
@@ -245,9 +390,39 @@ if debug_mode and st.session_state.last_retrieved:
     st.markdown("---")
     with st.expander("🔍 Retrieval Debug Panel", expanded=False):
         st.code(st.session_state.last_query, language="text")
+        packing = st.session_state.last_packing
+        if packing:
+            st.caption(
+                f"🧾 Context: {packing['chunks']} chunks → {packing['passages']} passages • "
+                f"{packing['chars_in']} → {packing['chars_out']} chars (saved {packing['chars_saved']}) • "
+                f"merged {packing['merged']}, duplicates {packing['duplicates']}, "
+                f"over budget {packing['over_budget']}"
+            )
+        if st.session_state.last_trace:
+            st.markdown("**⏱️ Stage breakdown**")
+            st.code(
+                "\n".join(
+                    f"{'  ' * s['depth']}{s['name']:<{28 - 2 * s['depth']}} {s['duration_ms']:9.1f} ms"
+                    for s in st.session_state.last_trace
+                ),
+                language="text",
+            )
+            st.download_button(
+                "📈 Metrics (Prometheus)", tracer.prometheus_text(), file_name="nexus_metrics.prom"
+            )
         for ch in st.session_state.last_retrieved:
             st.markdown(
                 f"**📚 {ch['subject']}** • Page {ch['page']} • Chunk {ch['chunk_id']} • Score `{ch['score']:.4f}`"
             )
+            if ch.get("duplicates"):
+                st.caption(
+                    "Also in: "
+                    + ", ".join(f"{d['subject']} p.{d['page']}" for d in ch["duplicates"])
+                )
             st.caption(ch["text"][:350] + ("..." if len(ch["text"]) > 350 else ""))
-            st.markdown("---")
\ No newline at end of file
+            st.markdown("---")
+
+# While the index loads, re-run shortly so the sidebar picks it up.
+if not index_loader.done:
+    time.sleep(1.0)
+    st.rerun()
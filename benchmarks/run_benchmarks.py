@@ -0,0 +1,351 @@
+# benchmarks/run_benchmarks.py
+"""
+Retriever benchmarks on synthetic corpora scaled up from data/.
+
+For every scale (1x = the bundled corpus, Nx = N shuffled copies of every
+subject file) a fresh child process measures:
+  - imports: cold import time of the app's up-front modules and of the
+    retriever;
+  - index build: cold Retriever() wall time (full _load_and_index) and
+    peak RSS, then a warm start from the on-disk index cache;
+  - retrieval: retrieve() p50/p95/p99 latency and QPS per top_k, with the
+    result cache disabled, batched retrieve_many() QPS, and QPS with
+    subject routing plus its recall against the full search;
+  - rerank: QPS of the two-stage candidates + rerank backend;
+  - dense: LSA/IVF-PQ fit time, ANN QPS and recall@10 against exact search;
+  - end to end: the app's request path (retrieve, pack, generate) with a
+    FakeBackend in place of the model.
+
+Results are written as JSON. Against a baseline JSON, every shared metric
+is compared and the exit status is 1 when one regressed by more than
+--tolerance. Timings are only comparable on the same machine; --repeat N
+runs each scale N times and keeps the best value of every metric, which
+takes most of the noise out:
+
+    python benchmarks/run_benchmarks.py --scales 1 10 --repeat 3 --out bench.json \\
+        --baseline benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+TOP_KS = (1, 5, 10)
+ROUTE_SUBJECTS = 3
+
+# Metric name suffixes where a larger value is better; everything else
+# (seconds, MB) is better when smaller.
+HIGHER_IS_BETTER = ("_qps", "_recall")
+
+
+# ---------- Corpus synthesis ----------
+
+def synthesize_corpus(scale: int, out_dir: str, seed: int = 0) -> Dict[str, int]:
+    """
+    Write `scale` copies of every .txt file under data/ into out_dir. Copy 0
+    is the original; later copies shuffle the file's paragraphs, so the
+    vocabulary stays realistic while chunk and posting counts grow.
+    """
+    rng = random.Random(seed)
+    files = 0
+    total = 0
+    for root, _, names in os.walk(DATA_DIR):
+        for name in sorted(names):
+            if not name.lower().endswith(".txt"):
+                continue
+            rel = os.path.relpath(os.path.join(root, name), DATA_DIR)
+            with open(os.path.join(root, name), "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+            paragraphs = text.split("\n\n")
+            stem, ext = os.path.splitext(rel)
+            for copy in range(scale):
+                if copy:
+                    rng.shuffle(paragraphs)
+                    body = "\n\n".join(paragraphs)
+                    path = os.path.join(out_dir, f"{stem}_{copy}{ext}")
+                else:
+                    body = text
+                    path = os.path.join(out_dir, rel)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(body)
+                files += 1
+                total += len(body.encode("utf-8"))
+    return {"files": files, "bytes": total}
+
+
+# ---------- Measurements (child process) ----------
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {"p50_ms": pct(50) * 1000, "p95_ms": pct(95) * 1000, "p99_ms": pct(99) * 1000}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def sample_questions(retriever, n: int, seed: int) -> List[Dict]:
+    """Short keyword queries sampled from random chunks, labeled with that chunk."""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(n):
+        chunk = retriever.chunks[rng.randrange(retriever.get_chunk_count())]
+        words = [w for w in chunk["text"].split() if len(w) > 3]
+        if words:
+            start = rng.randrange(len(words))
+            questions.append(
+                {
+                    "question": " ".join(words[start : start + rng.randint(2, 6)]),
+                    "subject": chunk["subject"],
+                    "page": chunk["page"],
+                    "chunk_id": chunk["chunk_id"],
+                }
+            )
+    return questions
+
+
+def measure(corpus_dir: str, index_dir: str, queries: int, e2e_requests: int, seed: int) -> Dict:
+    results: Dict[str, float] = {}
+    # Cold imports in this fresh process: what app.py imports before its
+    # first paint, then the retriever its warm-up thread loads.
+    t = time.perf_counter()
+    import src.context_packer, src.generator, src.tracing, src.vision, src.warmup  # noqa: F401,E401
+    results["import_app_s"] = time.perf_counter() - t
+    t = time.perf_counter()
+    from src.retriever import Retriever
+    results["import_retriever_s"] = time.perf_counter() - t
+
+    # Peak RSS is cumulative, so record the footprint of the imports alone.
+    results["import_rss_mb"] = _peak_rss_mb()
+
+    t = time.perf_counter()
+    retriever = Retriever(data_dir=corpus_dir, index_dir=index_dir, cache_entries=0)
+    results["build_cold_s"] = time.perf_counter() - t
+    results["build_peak_rss_mb"] = _peak_rss_mb()
+    results["chunks"] = retriever.get_chunk_count()
+    dedup = (retriever._manifest or {}).get("dedup", {})
+    results["dedup_removed"] = dedup.get("chunks_before", 0) - dedup.get("chunks_after", 0)
+
+    t = time.perf_counter()
+    retriever = Retriever(data_dir=corpus_dir, index_dir=index_dir, cache_entries=0)
+    results["build_warm_s"] = time.perf_counter() - t
+
+    qs = [q["question"] for q in sample_questions(retriever, queries, seed)]
+    for q in qs[:10]:
+        retriever.retrieve(q)
+
+    for k in TOP_KS:
+        samples = []
+        start = time.perf_counter()
+        for q in qs:
+            t = time.perf_counter()
+            retriever.retrieve(q, top_k=k)
+            samples.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        for name, value in _percentiles(samples).items():
+            results[f"retrieve_k{k}_{name}"] = value
+        results[f"retrieve_k{k}_qps"] = len(qs) / elapsed
+
+    t = time.perf_counter()
+    retriever.retrieve_many(qs, top_k=5)
+    results["retrieve_many_k5_qps"] = len(qs) / (time.perf_counter() - t)
+
+    # Subject routing: latency when only the nearest subjects are scored,
+    # and how much of the full top 5 it still finds.
+    t = time.perf_counter()
+    for q in qs:
+        retriever.retrieve(q, top_k=5, route=ROUTE_SUBJECTS)
+    results[f"retrieve_route{ROUTE_SUBJECTS}_k5_qps"] = len(qs) / (time.perf_counter() - t)
+    results[f"route{ROUTE_SUBJECTS}_k5_recall"] = retriever.routing_recall(qs, top_k=5, route=ROUTE_SUBJECTS)["recall_at_k"]
+
+    # Two-stage backend: BM25 candidates, then the reranker.
+    retriever.retrieve(qs[0], backend="rerank")
+    t = time.perf_counter()
+    for q in qs:
+        retriever.retrieve(q, top_k=5, backend="rerank")
+    results["retrieve_rerank_k5_qps"] = len(qs) / (time.perf_counter() - t)
+
+    # Dense LSA backend: fit (or load) time, ANN query rate, recall vs exact search.
+    t = time.perf_counter()
+    retriever.retrieve(qs[0], backend="dense")
+    results["dense_fit_s"] = time.perf_counter() - t
+    t = time.perf_counter()
+    for q in qs:
+        retriever.retrieve(q, top_k=5, backend="dense")
+    results["retrieve_dense_k5_qps"] = len(qs) / (time.perf_counter() - t)
+    results["dense_k10_recall"] = retriever.dense_recall(qs, top_k=10)["recall_at_k"]
+
+    from src.backends import FakeBackend
+    from src.generator import GeminiGenerator
+    from src.context_packer import ContextPacker
+
+    generator = GeminiGenerator(backend=FakeBackend(), cache_path=None)
+    packer = ContextPacker()
+    samples = []
+    for q in qs[:e2e_requests]:
+        t = time.perf_counter()
+        context, _ = packer.pack(retriever.retrieve(q, top_k=5))
+        generator.generate(q, context, use_cache=False)
+        samples.append(time.perf_counter() - t)
+    for name, value in _percentiles(samples).items():
+        results[f"e2e_{name}"] = value
+
+    results["peak_rss_mb"] = _peak_rss_mb()
+    return results
+
+
+def run_scale(scale: int, args, work_dir: str) -> Dict:
+    corpus_dir = os.path.join(work_dir, f"corpus_{scale}x")
+    index_dir = os.path.join(work_dir, f"index_{scale}x")
+    if not os.path.isdir(corpus_dir):
+        print(f"[{scale}x] synthesizing corpus...", file=sys.stderr)
+        synthesize_corpus(scale, corpus_dir, seed=args.seed)
+
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--child", corpus_dir, index_dir,
+        "--queries", str(args.queries), "--e2e-requests", str(args.e2e_requests), "--seed", str(args.seed),
+    ]
+    results: Dict[str, float] = {}
+    for run in range(args.repeat):
+        print(f"[{scale}x] measuring ({run + 1}/{args.repeat})...", file=sys.stderr)
+        shutil.rmtree(index_dir, ignore_errors=True)
+        out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, cwd=ROOT_DIR).stdout
+        for name, value in json.loads(out.decode("utf-8").strip().splitlines()[-1]).items():
+            best = max if name.endswith(HIGHER_IS_BETTER) else min
+            results[name] = best(results[name], value) if name in results else value
+    size = sum(
+        os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(corpus_dir) for f in files
+    )
+    results["corpus_mb"] = size / (1024 * 1024)
+    return results
+
+
+# ---------- Baseline comparison ----------
+
+def _abs_ms(name: str, delta: float) -> float:
+    if name.endswith("_ms"):
+        return abs(delta)
+    if name.endswith("_s"):
+        return abs(delta) * 1000
+    return float("inf")
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float, min_ms: float = 0.0) -> List[Dict]:
+    """
+    Every metric present in both runs, flagged when worse than baseline by
+    more than tolerance (and, for timings, by more than min_ms in absolute
+    terms, so sub-millisecond jitter is not reported).
+    """
+    rows = []
+    for scale, metrics in current["results"].items():
+        base = baseline.get("results", {}).get(scale, {})
+        for name, value in metrics.items():
+            if name not in base or name in ("chunks", "dedup_removed", "corpus_mb", "import_rss_mb") or not base[name]:
+                continue
+            change = (value - base[name]) / base[name]
+            worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+            rows.append(
+                {
+                    "scale": scale,
+                    "metric": name,
+                    "baseline": base[name],
+                    "current": value,
+                    "change": change,
+                    "regressed": worse > tolerance and _abs_ms(name, value - base[name]) > min_ms,
+                }
+            )
+    return rows
+
+
+def _meta() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True,
+        ).stdout.decode().strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retriever benchmarks on scaled synthetic corpora.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--e2e-requests", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scale; the best value of each metric is kept.")
+    parser.add_argument("--work-dir", default=None, help="Keep synthesized corpora here (default: a temp dir).")
+    parser.add_argument("--out", default=None, help="Write results JSON here (default: stdout).")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative slowdown.")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="Ignore timing changes smaller than this.")
+    parser.add_argument("--child", nargs=2, metavar=("CORPUS_DIR", "INDEX_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.child[1], args.queries, args.e2e_requests, args.seed)))
+        return
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="nexus_bench_")
+    try:
+        report = {"meta": dict(_meta(), repeat=args.repeat), "results": {}}
+        for scale in args.scales:
+            report["results"][f"{scale}x"] = run_scale(scale, args, work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            rows = compare(report, json.load(f), args.tolerance, args.min_ms)
+        report["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "metrics": rows}
+        regressions = [r for r in rows if r["regressed"]]
+        for r in rows:
+            flag = "REGRESSED" if r["regressed"] else ""
+            print(
+                f"{r['scale']:>6} {r['metric']:<26} {r['baseline']:>12.3f} -> {r['current']:>12.3f} "
+                f"({r['change']:+.1%}) {flag}",
+                file=sys.stderr,
+            )
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
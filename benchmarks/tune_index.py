@@ -0,0 +1,236 @@
+# benchmarks/tune_index.py
+"""
+Sweep compact TF-IDF index settings (src.compact.Compaction) and report,
+for every combination, what it costs and what it saves against the exact
+index:
+
+  - index_mb: on-disk size of the term matrix, IDF and vocabulary (the
+    part every worker maps; chunk text is the same for all settings);
+  - vocab_terms / vocab_mem_mb: size of the in-memory term dict (0 for
+    hashed features); total_mb adds it to index_mb;
+  - build_s, retrieve p50/p95 latency and QPS (result cache disabled);
+  - recall_at_k: mean share of the exact index's top_k still returned;
+  - hit_at_k: share of labeled questions whose labeled chunk (or subject)
+    is in the top_k, for the exact index and for each setting.
+
+Questions come from --questions, a JSONL file of {"question", "subject",
+"page"?, "chunk_id"?}; without it, short keyword queries are sampled from
+random chunks and labeled with their source chunk. Every list flag is a
+sweep axis (0 turns max_features / row_top / hash_bits off):
+
+    python benchmarks/tune_index.py --dtype float64 float32 --min-df 1 2 \\
+        --row-top 0 64 --hash-bits 0 18 --scale 10 --out tuning.json
+
+Rows are sorted by total_mb; settings on the total_mb / recall Pareto
+front are marked with "*".
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.run_benchmarks import DATA_DIR, _percentiles, sample_questions, synthesize_corpus  # noqa: E402
+from src.compact import Compaction  # noqa: E402
+from src.index_store import ARRAY_FILES, VOCAB_FILE  # noqa: E402
+from src.retriever import Retriever, result_ids  # noqa: E402
+
+
+def load_questions(path: str) -> List[Dict]:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if row.get("question"):
+                    questions.append(row)
+    return questions
+
+
+def _hit(label: Dict, results: List[Dict]) -> bool:
+    if label.get("chunk_id") is not None:
+        return (label["subject"], label.get("page"), label["chunk_id"]) in result_ids(results)
+    subject = label.get("subject", "").strip("/")
+    return any(r["subject"] == subject or r["subject"].startswith(subject + "/") for r in results)
+
+
+def index_bytes(index_dir: str) -> int:
+    names = [VOCAB_FILE] + [f"{name}.npy" for name in ARRAY_FILES]
+    return sum(os.path.getsize(os.path.join(index_dir, name)) for name in names)
+
+
+def vocab_bytes(vocabulary: Dict[str, int]) -> int:
+    """Rough in-memory footprint of a term -> column dict."""
+    if not vocabulary:
+        return 0
+    return sys.getsizeof(vocabulary) + sum(sys.getsizeof(t) + sys.getsizeof(c) for t, c in vocabulary.items())
+
+
+def evaluate(
+    corpus_dir: str,
+    index_dir: str,
+    compaction: Compaction,
+    questions: List[Dict],
+    top_k: int,
+    exact: Optional[List[List]],
+    workers: int,
+) -> Tuple[Dict, List[List]]:
+    """Build and load the index with `compaction`; its report row and top_k ids per question."""
+    shutil.rmtree(index_dir, ignore_errors=True)
+    t = time.perf_counter()
+    Retriever(data_dir=corpus_dir, index_dir=index_dir, compaction=compaction, workers=workers)
+    build_s = time.perf_counter() - t
+    # Measure the loaded (memory-mapped) index, as workers see it.
+    retriever = Retriever(data_dir=corpus_dir, index_dir=index_dir, compaction=compaction, cache_entries=0)
+
+    qs = [q["question"] for q in questions]
+    for q in qs[:10]:
+        retriever.retrieve(q, top_k=top_k)
+    samples = []
+    results = []
+    start = time.perf_counter()
+    for q in qs:
+        t = time.perf_counter()
+        results.append(retriever.retrieve(q, top_k=top_k))
+        samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    recall = 1.0
+    if exact is not None:
+        pairs = [(a, result_ids(b)) for a, b in zip(exact, results) if a]
+        recall = sum(len(set(a) & set(b)) / len(a) for a, b in pairs) / max(len(pairs), 1)
+    vocabulary = retriever.vectorizer.vocabulary_ if retriever.vectorizer is not None else {}
+    matrix = retriever.tfidf_matrix
+    row = {
+        "settings": compaction.params(),
+        "index_mb": index_bytes(index_dir) / (1024 * 1024),
+        "nnz": int(matrix.nnz) if matrix is not None else 0,
+        "columns": int(matrix.shape[1]) if matrix is not None else 0,
+        "vocab_terms": len(vocabulary),
+        "vocab_mem_mb": vocab_bytes(vocabulary) / (1024 * 1024),
+        "total_mb": (index_bytes(index_dir) + vocab_bytes(vocabulary)) / (1024 * 1024),
+        "build_s": build_s,
+        "qps": len(qs) / elapsed,
+        f"recall_at_{top_k}": recall,
+        f"hit_at_{top_k}": sum(_hit(q, r) for q, r in zip(questions, results)) / max(len(qs), 1),
+    }
+    row.update(_percentiles(samples))
+    return row, [result_ids(r) for r in results]
+
+
+def grid(args) -> List[Compaction]:
+    off = lambda v: v or None  # noqa: E731
+    points = []
+    for dtype, min_df, max_df, max_features, row_top, hash_bits in itertools.product(
+        args.dtype, args.min_df, args.max_df, args.max_features, args.row_top, args.hash_bits
+    ):
+        try:
+            points.append(Compaction(dtype, min_df, max_df, off(max_features), off(row_top), off(hash_bits)))
+        except ValueError:
+            continue  # e.g. max_features with hashed features
+    return points
+
+
+def _number(text: str):
+    """An int document-frequency limit counts chunks, a float is a share of them."""
+    return float(text) if "." in text else int(text)
+
+
+def pareto(rows: List[Dict], recall_key: str):
+    """Mark rows no other row beats on both size and recall."""
+    for row in rows:
+        row["pareto"] = not any(
+            o is not row
+            and o["total_mb"] <= row["total_mb"]
+            and o[recall_key] >= row[recall_key]
+            and (o["total_mb"] < row["total_mb"] or o[recall_key] > row[recall_key])
+            for o in rows
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep compact index settings: size vs latency vs recall.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--scale", type=int, default=1, help="Use an Nx corpus synthesized from data/ instead of --data-dir.")
+    parser.add_argument("--questions", default=None, help="Labeled JSONL question set (default: sampled from chunks).")
+    parser.add_argument("--queries", type=int, default=300, help="Questions to sample without --questions.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Index build processes.")
+    parser.add_argument("--dtype", nargs="+", default=["float64", "float32"])
+    parser.add_argument("--min-df", type=_number, nargs="+", default=[1, 2])
+    parser.add_argument("--max-df", type=_number, nargs="+", default=[1.0])
+    parser.add_argument("--max-features", type=int, nargs="+", default=[0])
+    parser.add_argument("--row-top", type=int, nargs="+", default=[0, 64])
+    parser.add_argument("--hash-bits", type=int, nargs="+", default=[0, 18])
+    parser.add_argument("--out", default=None, help="Write the report JSON here.")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="nexus_tune_")
+    try:
+        corpus_dir = args.data_dir
+        if args.scale > 1:
+            corpus_dir = os.path.join(work_dir, "corpus")
+            print(f"synthesizing {args.scale}x corpus...", file=sys.stderr)
+            synthesize_corpus(args.scale, corpus_dir, seed=args.seed)
+        index_dir = os.path.join(work_dir, "index")
+
+        print("exact index...", file=sys.stderr)
+        exact_retriever = Retriever(data_dir=corpus_dir, index_dir=None, cache_entries=0)
+        if args.questions:
+            questions = load_questions(args.questions)
+        else:
+            questions = sample_questions(exact_retriever, args.queries, args.seed)
+        del exact_retriever
+
+        exact, exact_ids = evaluate(corpus_dir, index_dir, Compaction(), questions, args.top_k, None, args.workers)
+        rows = [exact]
+        for compaction in grid(args):
+            if compaction.params() == exact["settings"]:
+                continue
+            print(f"{compaction.params()}...", file=sys.stderr)
+            rows.append(
+                evaluate(corpus_dir, index_dir, compaction, questions, args.top_k, exact_ids, args.workers)[0]
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    recall_key, hit_key = f"recall_at_{args.top_k}", f"hit_at_{args.top_k}"
+    pareto(rows, recall_key)
+    rows.sort(key=lambda r: r["total_mb"])
+
+    print(
+        f"  {'dtype':<8}{'min_df':>7}{'max_df':>7}{'max_ft':>8}{'row_top':>8}{'hash':>5}"
+        f"{'index_mb':>10}{'vocab_mb':>9}{'total_mb':>9}{'p50_ms':>8}{'p95_ms':>8}{'recall':>8}{'hit':>7}"
+    )
+    for r in rows:
+        s = r["settings"]
+        print(
+            f"{'*' if r['pareto'] else ' '} {s['dtype']:<8}{s['min_df']:>7}{s['max_df']:>7}"
+            f"{s['max_features'] or '-':>8}{s['row_top'] or '-':>8}{s['hash_bits'] or '-':>5}"
+            f"{r['index_mb']:>10.2f}{r['vocab_mem_mb']:>9.2f}{r['total_mb']:>9.2f}{r['p50_ms']:>8.2f}{r['p95_ms']:>8.2f}"
+            f"{r[recall_key]:>8.3f}{r[hit_key]:>7.3f}"
+        )
+
+    if args.out:
+        report = {
+            "corpus": args.data_dir if args.scale <= 1 else DATA_DIR,
+            "scale": args.scale,
+            "questions": len(questions),
+            "labeled": bool(args.questions),
+            "top_k": args.top_k,
+            "results": rows,
+        }
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# src/answer_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from src.cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+ANSWER_CACHE_PATH = os.path.join(ROOT_DIR, ".answer_cache", "answers.sqlite3")
+
+
+def answer_key(question: str, context_chunks: List[Dict], model_name: str) -> str:
+    """
+    Cache key for a generated answer: the normalized question, the model, and
+    the ordered (subject, page, chunk_id, text hash) of every context chunk.
+    """
+    chunks = [
+        [
+            c.get("subject"),
+            c.get("page"),
+            c.get("chunk_id"),
+            hashlib.sha1(c.get("text", "").encode("utf-8")).hexdigest(),
+        ]
+        for c in context_chunks
+    ]
+    payload = json.dumps([normalize_query(question), model_name, chunks])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Disk-backed answer cache in SQLite (WAL mode), shared by every Streamlit
+    session and process pointing at the same file. Entries expire after
+    `ttl_seconds`; beyond `max_entries` or `max_bytes` the least recently
+    used ones are evicted. Failures are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        path: str = ANSWER_CACHE_PATH,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        max_entries: Optional[int] = 10000,
+        max_bytes: Optional[int] = 64 * 1024 * 1024,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY,"
+                " answer TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers(last_used)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps this safe to share
+        # between Streamlit's session threads; `with conn` commits or rolls back.
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT answer, created FROM answers WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    row = None
+                if row is None:
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning("Answer cache read failed: %s", e)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, answer: str):
+        now = time.time()
+        size = len(answer.encode("utf-8"))
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO answers (key, answer, size, created, last_used)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, answer, size, now, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning("Answer cache write failed: %s", e)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        if self.ttl_seconds is not None:
+            cur = conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl_seconds,))
+            self.evictions += max(cur.rowcount, 0)
+
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        over_entries = count - self.max_entries if self.max_entries is not None else 0
+        over_bytes = total - self.max_bytes if self.max_bytes is not None else 0
+        if over_entries <= 0 and over_bytes <= 0:
+            return
+
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM answers ORDER BY last_used ASC"):
+            if over_entries <= 0 and over_bytes <= 0:
+                break
+            victims.append((key,))
+            over_entries -= 1
+            over_bytes -= size
+        conn.executemany("DELETE FROM answers WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM answers")
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers"
+            ).fetchone()
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
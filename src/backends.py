@@ -0,0 +1,203 @@
+# src/backends.py
+import os
+import json
+import time
+import base64
+import logging
+import threading
+import urllib.error
+import urllib.request
+from typing import Callable, Iterator, List, Optional, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+
+logger = logging.getLogger(__name__)
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def _get_genai():
+    """
+    google.generativeai, imported and configured on first use: the import
+    alone takes most of a second, which callers that never reach Gemini
+    (FakeBackend, HTTPBackend, app start-up) should not pay.
+    """
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+
+            if GEMINI_API_KEY:
+                try:
+                    genai.configure(api_key=GEMINI_API_KEY)
+                except Exception:
+                    try:
+                        genai.api_key = GEMINI_API_KEY
+                    except Exception:
+                        logger.warning("Could not set API key via genai.configure or genai.api_key; calls may fail.")
+            _genai = genai
+    return _genai
+
+# A prompt is a string or a list of parts: strings and
+# {"mime_type": ..., "data": bytes} image parts.
+Prompt = Union[str, List]
+
+
+def _text_only(prompt: Prompt) -> str:
+    if isinstance(prompt, str):
+        return prompt
+    return "\n\n".join(p if isinstance(p, str) else "[IMAGE DATA OMITTED]" for p in prompt)
+
+
+class GeminiBackend:
+    """
+    Text-generation backend that calls the Gemini API.
+    Any backend needs `model_name`, `generate(prompt, timeout=None) -> str`
+    and `generate_stream(prompt, timeout=None) -> Iterator[str]` (text
+    deltas); errors are raised to the caller. `timeout` is in seconds.
+    """
+
+    def __init__(self, model_name: str = "gemini-2.5-flash"):
+        self.model_name = model_name
+        try:
+            self.model = _get_genai().GenerativeModel(model_name)
+        except Exception:
+            self.model = None
+
+    @staticmethod
+    def _request_options(timeout: Optional[float]) -> dict:
+        return {"request_options": {"timeout": timeout}} if timeout else {}
+
+    def generate(self, prompt: Prompt, timeout: Optional[float] = None) -> str:
+        if self.model:
+            response = self.model.generate_content(prompt, **self._request_options(timeout))
+            text = getattr(response, "text", None)
+            if not text:
+                try:
+                    text = response.candidates[0].content
+                except Exception:
+                    text = str(response)
+            return text.strip()
+
+        resp = _get_genai().generate_text(model=self.model_name, prompt=_text_only(prompt))
+        text = getattr(resp, "text", "") or str(resp)
+        return text.strip()
+
+    def generate_stream(self, prompt: Prompt, timeout: Optional[float] = None) -> Iterator[str]:
+        if not self.model:
+            yield self.generate(prompt, timeout)
+            return
+        for chunk in self.model.generate_content(prompt, stream=True, **self._request_options(timeout)):
+            try:
+                text = chunk.text
+            except Exception:
+                # Chunks without text parts (e.g. safety metadata only).
+                continue
+            if text:
+                yield text
+
+
+class FakeBackend:
+    """
+    Offline stand-in for GeminiBackend, for tests and benchmarks.
+
+    `responses` is either a fixed string, a list cycled through call by call,
+    or a callable mapping the prompt to the reply. Every prompt is recorded.
+    generate() sleeps `first_delay` before replying. Streaming splits the
+    reply into `stream_chars`-sized deltas, sleeping `first_delay` before the
+    first one and `delay` before each later one, to simulate
+    time-to-first-token and generation speed.
+    """
+
+    def __init__(
+        self,
+        responses: Union[str, List[str], Callable[[str], str]] = "This is a fake answer.",
+        model_name: str = "fake-model",
+        stream_chars: int = 16,
+        first_delay: float = 0.0,
+        delay: float = 0.0,
+    ):
+        self.model_name = model_name
+        self.responses = responses
+        self.stream_chars = stream_chars
+        self.first_delay = first_delay
+        self.delay = delay
+        self.prompts: List[str] = []
+        # Deltas actually handed out by generate_stream (to check early stops).
+        self.streamed_deltas = 0
+
+    @property
+    def calls(self) -> int:
+        return len(self.prompts)
+
+    def generate(self, prompt: Prompt, timeout: Optional[float] = None) -> str:
+        self.prompts.append(prompt)
+        time.sleep(self.first_delay)
+        return self._reply(prompt)
+
+    def generate_stream(self, prompt: Prompt, timeout: Optional[float] = None) -> Iterator[str]:
+        self.prompts.append(prompt)
+        text = self._reply(prompt)
+        for i in range(0, len(text), self.stream_chars):
+            time.sleep(self.first_delay if i == 0 else self.delay)
+            self.streamed_deltas += 1
+            yield text[i : i + self.stream_chars]
+
+    def _reply(self, prompt: Prompt) -> str:
+        if callable(self.responses):
+            return self.responses(prompt)
+        if isinstance(self.responses, list):
+            return self.responses[(len(self.prompts) - 1) % len(self.responses)]
+        return self.responses
+
+
+class HTTPBackend:
+    """
+    Backend for a JSON-over-HTTP model endpoint, such as the local stub in
+    src/stub_server.py. POST {url}/generate with {"model", "prompt", "stream"}
+    returns {"text"}; with stream=true, one JSON object per line. Image parts
+    are sent base64-encoded. HTTP errors keep their status in `code`;
+    unreachable servers raise ConnectionError.
+    """
+
+    def __init__(self, url: str = "http://127.0.0.1:8765", model_name: str = "stub-model"):
+        self.url = url.rstrip("/")
+        self.model_name = model_name
+
+    def _post(self, prompt: Prompt, stream: bool, timeout: Optional[float]):
+        parts = [prompt] if isinstance(prompt, str) else prompt
+        payload = {
+            "model": self.model_name,
+            "stream": stream,
+            "prompt": [
+                p if isinstance(p, str)
+                else {"mime_type": p.get("mime_type"), "data": base64.b64encode(p["data"]).decode("ascii")}
+                for p in parts
+            ],
+        }
+        request = urllib.request.Request(
+            self.url + "/generate",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError:
+            raise
+        except urllib.error.URLError as e:
+            raise ConnectionError(f"{self.url}: {e.reason}") from e
+
+    def generate(self, prompt: Prompt, timeout: Optional[float] = None) -> str:
+        with self._post(prompt, False, timeout) as resp:
+            return json.load(resp).get("text", "").strip()
+
+    def generate_stream(self, prompt: Prompt, timeout: Optional[float] = None) -> Iterator[str]:
+        with self._post(prompt, True, timeout) as resp:
+            for line in resp:
+                text = json.loads(line).get("text") if line.strip() else None
+                if text:
+                    yield text
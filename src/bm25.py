@@ -0,0 +1,140 @@
+# src/bm25.py
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+Ranges = Sequence[Tuple[int, int]]
+
+
+class BM25Index:
+    """
+    Posting-list inverted index with BM25 scoring.
+
+    Postings are stored term-major (CSC layout): for term t, doc ids live in
+    docs[ptr[t]:ptr[t+1]] in ascending order, next to the precomputed BM25
+    impact of each posting. search() uses MaxScore pruning, so the cost of a
+    query depends on the posting lists it touches, not on the chunk count.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        self.n_docs = 0
+        self._analyzer = None
+        self._ptr = np.zeros(1, dtype=np.int64)
+        self._docs = np.empty(0, dtype=np.int32)
+        self._impacts = np.empty(0, dtype=np.float32)
+        self._max_impact = np.empty(0, dtype=np.float32)
+
+    def fit(self, texts: List[str]) -> "BM25Index":
+        counter = CountVectorizer(stop_words="english")
+        tf = counter.fit_transform(texts).tocsc()
+        tf.sort_indices()
+
+        self.vocabulary = counter.vocabulary_
+        self._analyzer = counter.build_analyzer()
+        self.n_docs = tf.shape[0]
+
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        avg_len = doc_len.mean() if self.n_docs else 1.0
+        df = np.diff(tf.indptr)
+        idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5))
+
+        term_of_posting = np.repeat(np.arange(tf.shape[1]), df)
+        freqs = tf.data.astype(np.float64)
+        length_norm = self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+        impacts = idf[term_of_posting] * freqs * (self.k1 + 1) / (freqs + length_norm[tf.indices])
+
+        self._ptr = tf.indptr.astype(np.int64)
+        self._docs = tf.indices.astype(np.int32)
+        self._impacts = impacts.astype(np.float32)
+        self._max_impact = np.zeros(tf.shape[1], dtype=np.float32)
+        nonempty = df > 0
+        if nonempty.any():
+            self._max_impact[nonempty] = np.maximum.reduceat(
+                self._impacts, self._ptr[:-1][nonempty]
+            )
+        return self
+
+    def _postings(self, term_id: int, ranges: Optional[Ranges] = None) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self._ptr[term_id], self._ptr[term_id + 1]
+        docs, impacts = self._docs[start:end], self._impacts[start:end]
+        if ranges is None:
+            return docs, impacts
+        # Doc ids are ascending, so each [lo, hi) row range is one slice.
+        bounds = np.searchsorted(docs, np.asarray(ranges, dtype=docs.dtype).ravel())
+        pieces = [(bounds[j], bounds[j + 1]) for j in range(0, len(bounds), 2)]
+        return (
+            np.concatenate([docs[:0]] + [docs[a:b] for a, b in pieces]),
+            np.concatenate([impacts[:0]] + [impacts[a:b] for a, b in pieces]),
+        )
+
+    def search(self, query: str, k: int, ranges: Optional[Ranges] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (doc_ids, scores) of the top k documents, best first.
+        `ranges` (sorted, disjoint [start, end) doc id ranges) restricts the
+        search to those documents; only their slice of each posting list is
+        visited.
+
+        MaxScore: query terms are visited in descending upper-bound order and
+        their postings merged into the candidate set. Once the remaining terms'
+        upper bounds can no longer lift an unseen document past the current
+        k-th score, the rest become non-essential: their lists are only probed
+        (binary search) for surviving candidates instead of being traversed.
+        """
+        empty = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64))
+        if not query or self._analyzer is None or k <= 0:
+            return empty
+
+        counts = Counter(t for t in self._analyzer(query) if t in self.vocabulary)
+        if not counts:
+            return empty
+
+        terms = [(self.vocabulary[t], float(qtf)) for t, qtf in counts.items()]
+        bounds = [float(self._max_impact[tid]) * w for tid, w in terms]
+        order = np.argsort(bounds)[::-1]
+        terms = [terms[i] for i in order]
+        bounds = [bounds[i] for i in order]
+        # rest[i]: best possible contribution of terms i+1.. to any document
+        rest = np.concatenate([np.cumsum(bounds[::-1])[::-1][1:], [0.0]])
+
+        cand_docs = np.empty(0, dtype=np.int32)
+        cand_scores = np.empty(0, dtype=np.float64)
+        theta = 0.0
+        essential = True
+
+        for i, (tid, weight) in enumerate(terms):
+            docs, impacts = self._postings(tid, ranges)
+            if essential:
+                merged = np.concatenate([cand_docs, docs])
+                cand_docs, inverse = np.unique(merged, return_inverse=True)
+                cand_scores = np.bincount(
+                    inverse,
+                    weights=np.concatenate([cand_scores, impacts * weight]),
+                    minlength=len(cand_docs),
+                )
+            else:
+                # Drop candidates that cannot reach theta even with every
+                # remaining term, then probe this term's postings for the rest.
+                keep = cand_scores + bounds[i] + rest[i] >= theta
+                cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+                pos = np.searchsorted(docs, cand_docs)
+                pos_ok = pos < len(docs)
+                hit = np.zeros(len(cand_docs), dtype=bool)
+                hit[pos_ok] = docs[pos[pos_ok]] == cand_docs[pos_ok]
+                cand_scores[hit] += impacts[pos[hit]] * weight
+
+            if len(cand_scores) >= k:
+                theta = float(np.partition(cand_scores, len(cand_scores) - k)[-k])
+                if essential and rest[i] <= theta:
+                    essential = False
+
+        if not len(cand_docs):
+            return empty
+        top = min(k, len(cand_scores))
+        idx = np.argpartition(-cand_scores, top - 1)[:top]
+        idx = idx[np.lexsort((cand_docs[idx], -cand_scores[idx]))]
+        return cand_docs[idx], cand_scores[idx]
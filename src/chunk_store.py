@@ -0,0 +1,362 @@
+# src/chunk_store.py
+import os
+import json
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+SUBJECTS_FILE = "chunk_subjects.json"
+COLUMN_FILES = (
+    "subject_ids", "pages", "chunk_ids", "starts", "ends", "text_offsets", "text",
+    "dup_offsets", "dup_subject_ids", "dup_pages", "dup_chunk_ids",
+)
+DUP_COLUMNS = ("dup_subject_ids", "dup_pages", "dup_chunk_ids")
+FIELDS = ("subject", "page", "chunk_id", "text", "start", "end")
+
+
+class ChunkView(Mapping):
+    """
+    Read-only, dict-like view of one chunk row. Fields are pulled from the
+    store's columns on access, so holding a view costs one small object.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "ChunkStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key):
+        s, i = self._store, self._row
+        if key == "text":
+            return s.text(i)
+        if key == "subject":
+            return s.subjects[s.subject_ids[i]]
+        if key == "page":
+            return int(s.pages[i])
+        if key == "chunk_id":
+            return int(s.chunk_ids[i])
+        if key == "start":
+            return int(s.starts[i])
+        if key == "end":
+            return int(s.ends[i])
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"ChunkView({dict(self)!r})"
+
+
+class ChunkStore:
+    """
+    Columnar chunk metadata: interned subject ids, int32 page/chunk-id
+    columns, raw offsets, and every chunk's text in one contiguous UTF-8
+    buffer addressed by an offsets array. Columns may be memory-mapped.
+    Back-references of near-duplicate copies collapsed into a row (their
+    subject, page and chunk id) are stored the same way, addressed by
+    dup_offsets.
+
+    Indexing with an int returns a ChunkView; with a slice, a ChunkStore.
+    """
+
+    def __init__(
+        self,
+        subjects: List[str],
+        subject_ids: np.ndarray,
+        pages: np.ndarray,
+        chunk_ids: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        text_offsets: np.ndarray,
+        text: np.ndarray,
+        dup_offsets: Optional[np.ndarray] = None,
+        dup_subject_ids: Optional[np.ndarray] = None,
+        dup_pages: Optional[np.ndarray] = None,
+        dup_chunk_ids: Optional[np.ndarray] = None,
+    ):
+        self.subjects = subjects
+        self.subject_ids = subject_ids
+        self.pages = pages
+        self.chunk_ids = chunk_ids
+        self.starts = starts
+        self.ends = ends
+        self.text_offsets = text_offsets
+        self._text = text
+        if dup_offsets is None:
+            dup_offsets = np.zeros(len(subject_ids) + 1, dtype=np.int64)
+            dup_subject_ids = dup_pages = dup_chunk_ids = np.empty(0, dtype=np.int32)
+        self.dup_offsets = dup_offsets
+        self.dup_subject_ids = dup_subject_ids
+        self.dup_pages = dup_pages
+        self.dup_chunk_ids = dup_chunk_ids
+
+    @classmethod
+    def empty(cls) -> "ChunkStore":
+        return ChunkStoreBuilder().build()
+
+    @classmethod
+    def from_rows(cls, rows) -> "ChunkStore":
+        builder = ChunkStoreBuilder()
+        builder.extend(rows)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.subject_ids)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError("ChunkStore slices must be contiguous")
+            stop = max(start, stop)
+            offsets = self.text_offsets[start : stop + 1]
+            base = int(offsets[0]) if len(offsets) else 0
+            dups = self.dup_offsets[start : stop + 1]
+            lo, hi = int(dups[0]), int(dups[-1])
+            return ChunkStore(
+                self.subjects,
+                self.subject_ids[start:stop],
+                self.pages[start:stop],
+                self.chunk_ids[start:stop],
+                self.starts[start:stop],
+                self.ends[start:stop],
+                np.asarray(offsets) - base,
+                self._text[base : int(offsets[-1]) if len(offsets) else base],
+                np.asarray(dups) - lo,
+                *(getattr(self, name)[lo:hi] for name in DUP_COLUMNS),
+            )
+        i = int(item)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        return ChunkView(self, i)
+
+    def __iter__(self) -> Iterator[ChunkView]:
+        for i in range(len(self)):
+            yield ChunkView(self, i)
+
+    def text(self, row: int) -> str:
+        start, end = self.text_offsets[row], self.text_offsets[row + 1]
+        return self._text[start:end].tobytes().decode("utf-8")
+
+    def texts(self) -> Iterator[str]:
+        """Chunk texts in row order, decoded one at a time."""
+        for i in range(len(self)):
+            yield self.text(i)
+
+    def duplicates(self, row: int) -> List[Dict]:
+        """Locations of the near-duplicate copies collapsed into `row`."""
+        lo, hi = int(self.dup_offsets[row]), int(self.dup_offsets[row + 1])
+        return [
+            {
+                "subject": self.subjects[self.dup_subject_ids[i]],
+                "page": int(self.dup_pages[i]),
+                "chunk_id": int(self.dup_chunk_ids[i]),
+            }
+            for i in range(lo, hi)
+        ]
+
+    def duplicate_count(self) -> int:
+        return int(self.dup_offsets[-1])
+
+    def subject_names(self) -> List[str]:
+        """
+        Distinct subjects that still have rows, or whose chunks were all
+        collapsed into other subjects' rows, without touching per-row objects.
+        """
+        if not len(self):
+            return []
+        used = np.union1d(self.subject_ids, self.dup_subject_ids)
+        return sorted(self.subjects[i] for i in used)
+
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self._columns().values())
+
+    def collapse(self, canonical: np.ndarray) -> "ChunkStore":
+        """
+        Drop every row i with canonical[i] != i, recording its location as a
+        back-reference on row canonical[i] (which must be kept). For a store
+        without back-references yet, e.g. right after a build.
+        """
+        canonical = np.asarray(canonical)
+        rows = np.arange(len(self))
+        keep = canonical == rows
+        dropped = rows[~keep]
+        # Dropped rows grouped by the kept row they collapse into, in row order.
+        dropped = dropped[np.argsort(canonical[dropped], kind="stable")]
+        new_row = np.cumsum(keep) - 1
+        dup_offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(new_row[canonical[dropped]], minlength=len(dup_offsets) - 1), out=dup_offsets[1:])
+
+        lengths = np.diff(np.asarray(self.text_offsets))
+        text_offsets = np.zeros(len(dup_offsets), dtype=np.int64)
+        np.cumsum(lengths[keep], out=text_offsets[1:])
+        return ChunkStore(
+            self.subjects,
+            np.asarray(self.subject_ids)[keep],
+            np.asarray(self.pages)[keep],
+            np.asarray(self.chunk_ids)[keep],
+            np.asarray(self.starts)[keep],
+            np.asarray(self.ends)[keep],
+            text_offsets,
+            np.asarray(self._text)[np.repeat(keep, lengths)],
+            dup_offsets,
+            np.asarray(self.subject_ids)[dropped],
+            np.asarray(self.pages)[dropped],
+            np.asarray(self.chunk_ids)[dropped],
+        )
+
+    def save(self, directory: str):
+        with open(os.path.join(directory, SUBJECTS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.subjects, f)
+        columns = self._columns()
+        for name in COLUMN_FILES:
+            np.save(os.path.join(directory, f"chunk_{name}.npy"), np.ascontiguousarray(columns[name]))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ChunkStore":
+        with open(os.path.join(directory, SUBJECTS_FILE), "r", encoding="utf-8") as f:
+            subjects = json.load(f)
+        mode = "r" if mmap else None
+        columns = {
+            name: np.load(os.path.join(directory, f"chunk_{name}.npy"), mmap_mode=mode)
+            for name in COLUMN_FILES
+        }
+        return cls(subjects, **columns)
+
+    def _columns(self) -> Dict[str, np.ndarray]:
+        return {
+            "subject_ids": self.subject_ids,
+            "pages": self.pages,
+            "chunk_ids": self.chunk_ids,
+            "starts": self.starts,
+            "ends": self.ends,
+            "text_offsets": self.text_offsets,
+            "text": self._text,
+            "dup_offsets": self.dup_offsets,
+            "dup_subject_ids": self.dup_subject_ids,
+            "dup_pages": self.dup_pages,
+            "dup_chunk_ids": self.dup_chunk_ids,
+        }
+
+
+class ChunkStoreBuilder:
+    """Accumulates rows (dicts/views) or whole stores, then packs them once."""
+
+    def __init__(self):
+        self._subjects: List[str] = []
+        self._subject_index: Dict[str, int] = {}
+        self._blocks: List[Dict[str, np.ndarray]] = []
+        self._pending: Optional[Dict[str, list]] = None
+
+    def _intern(self, subject: str) -> int:
+        sid = self._subject_index.get(subject)
+        if sid is None:
+            sid = self._subject_index[subject] = len(self._subjects)
+            self._subjects.append(subject)
+        return sid
+
+    def add(self, row: Mapping):
+        if self._pending is None:
+            self._pending = {
+                k: [] for k in ("subject_ids", "pages", "chunk_ids", "starts", "ends", "text", "dup_counts")
+                + DUP_COLUMNS
+            }
+        p = self._pending
+        p["subject_ids"].append(self._intern(row["subject"]))
+        p["pages"].append(row["page"])
+        p["chunk_ids"].append(row["chunk_id"])
+        p["starts"].append(row.get("start", 0))
+        p["ends"].append(row.get("end", 0))
+        p["text"].append(row["text"].encode("utf-8"))
+        dups = row.get("duplicates") or []
+        p["dup_counts"].append(len(dups))
+        for d in dups:
+            p["dup_subject_ids"].append(self._intern(d["subject"]))
+            p["dup_pages"].append(d["page"])
+            p["dup_chunk_ids"].append(d["chunk_id"])
+
+    def extend(self, rows):
+        if isinstance(rows, ChunkStore):
+            self.add_store(rows)
+            return
+        for row in rows:
+            self.add(row)
+
+    def _flush(self):
+        p = self._pending
+        if not p:
+            return
+        lengths = np.fromiter((len(t) for t in p["text"]), dtype=np.int64, count=len(p["text"]))
+        self._blocks.append(
+            {
+                "subject_ids": np.asarray(p["subject_ids"], dtype=np.int32),
+                "pages": np.asarray(p["pages"], dtype=np.int32),
+                "chunk_ids": np.asarray(p["chunk_ids"], dtype=np.int32),
+                "starts": np.asarray(p["starts"], dtype=np.int64),
+                "ends": np.asarray(p["ends"], dtype=np.int64),
+                "lengths": lengths,
+                "text": np.frombuffer(b"".join(p["text"]), dtype=np.uint8),
+                "dup_counts": np.asarray(p["dup_counts"], dtype=np.int64),
+                **{name: np.asarray(p[name], dtype=np.int32) for name in DUP_COLUMNS},
+            }
+        )
+        self._pending = None
+
+    def add_store(self, store: ChunkStore):
+        """Append every row of `store` column-wise (no per-row objects)."""
+        self._flush()
+        if not len(store):
+            return
+        remap = np.array([self._intern(s) for s in store.subjects], dtype=np.int32)
+        offsets = np.asarray(store.text_offsets)
+        dups = np.asarray(store.dup_offsets)
+        self._blocks.append(
+            {
+                "subject_ids": remap[store.subject_ids],
+                "pages": np.asarray(store.pages, dtype=np.int32),
+                "chunk_ids": np.asarray(store.chunk_ids, dtype=np.int32),
+                "starts": np.asarray(store.starts, dtype=np.int64),
+                "ends": np.asarray(store.ends, dtype=np.int64),
+                "lengths": np.diff(offsets),
+                "text": np.asarray(store._text[offsets[0] : offsets[-1]]),
+                "dup_counts": np.diff(dups),
+                "dup_subject_ids": remap[store.dup_subject_ids[dups[0] : dups[-1]]],
+                "dup_pages": np.asarray(store.dup_pages[dups[0] : dups[-1]], dtype=np.int32),
+                "dup_chunk_ids": np.asarray(store.dup_chunk_ids[dups[0] : dups[-1]], dtype=np.int32),
+            }
+        )
+
+    def build(self) -> ChunkStore:
+        self._flush()
+        blocks = self._blocks
+
+        def cat(name, dtype):
+            if not blocks:
+                return np.empty(0, dtype=dtype)
+            return np.concatenate([b[name] for b in blocks]).astype(dtype, copy=False)
+
+        lengths = cat("lengths", np.int64)
+        text_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=text_offsets[1:])
+        dup_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(cat("dup_counts", np.int64), out=dup_offsets[1:])
+        return ChunkStore(
+            list(self._subjects),
+            cat("subject_ids", np.int32),
+            cat("pages", np.int32),
+            cat("chunk_ids", np.int32),
+            cat("starts", np.int64),
+            cat("ends", np.int64),
+            text_offsets,
+            cat("text", np.uint8),
+            dup_offsets,
+            *(cat(name, np.int32) for name in DUP_COLUMNS),
+        )
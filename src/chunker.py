@@ -0,0 +1,182 @@
+# src/chunker.py
+import re
+from bisect import bisect_right
+from typing import Callable, Dict, Iterator, List, Tuple
+
+STRATEGIES = ("sentence", "paragraph", "window")
+
+# Characters clean_text() turns into spaces (besides whitespace itself).
+_JUNK = r"\x00-\x08\x0B\x0C\x0E-\x1F\x7F\U00010000-\U0010FFFF"
+# One or more blank (or whitespace-only) lines separate paragraphs.
+_PARA_BREAK_RE = re.compile(r"\n(?:[ \t\r\f\v]*\n)+")
+# End of a sentence: terminal punctuation followed by a separator, matching
+# the (?<=[.!?])\s+ split that used to run on the cleaned text.
+_SENTENCE_END_RE = re.compile(r"[.!?]\u200b*(?=[\s" + _JUNK + r"])")
+# Runs of characters that survive clean_text(); used to map window edges back.
+_TOKEN_RE = re.compile(r"[^\s" + _JUNK + r"]+")
+
+_NON_PRINTABLE_RE = re.compile(r"[^\x09\x0A\x0D\x20-\x7E\u0080-\uFFFF]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# (raw start, raw end, cleaned text, page)
+Unit = Tuple[int, int, str, int]
+
+
+def clean_text(text: str) -> str:
+    if not text:
+        return ""
+    text = text.replace("\u200b", "")
+    text = _NON_PRINTABLE_RE.sub(" ", text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text
+
+
+def _page_locator(raw: str) -> Callable[[int], int]:
+    """Map a raw offset to its 1-based paragraph number."""
+    first = len(raw) - len(raw.lstrip())
+    ends = [m.end() for m in _PARA_BREAK_RE.finditer(raw) if m.start() > first]
+    return lambda pos: bisect_right(ends, pos) + 1
+
+
+def _spans(raw: str, strategy: str) -> Iterator[Tuple[int, int]]:
+    if strategy == "window":
+        yield 0, len(raw)
+        return
+    start = 0
+    if strategy == "sentence":
+        for m in _SENTENCE_END_RE.finditer(raw):
+            yield start, m.end()
+            start = m.end()
+    else:
+        for m in _PARA_BREAK_RE.finditer(raw):
+            yield start, m.start()
+            start = m.end()
+    yield start, len(raw)
+
+
+def _iter_units(raw: str, strategy: str, page_at: Callable[[int], int]) -> Iterator[Unit]:
+    for start, end in _spans(raw, strategy):
+        segment = raw[start:end]
+        text = clean_text(segment)
+        if text:
+            start += len(segment) - len(segment.lstrip())
+            yield start, end, text, page_at(start)
+
+
+def _window(
+    raw: str,
+    unit: Unit,
+    chunk_size: int,
+    chunk_overlap: int,
+    page_at: Callable[[int], int],
+) -> Iterator[Unit]:
+    """Sliding character window with overlap over one over-long unit."""
+    text = unit[2]
+    # Cleaned-text offset of every token in the unit, to map window edges
+    # back to raw offsets. Only built for units that actually need windowing.
+    tokens = []
+    starts = []
+    offset = 0
+    for m in _TOKEN_RE.finditer(raw, unit[0], unit[1]):
+        n = len(m.group().replace("\u200b", ""))
+        if n:
+            tokens.append(m)
+            starts.append(offset)
+            offset += n + 1
+
+    def locate(pos: int) -> int:
+        i = max(bisect_right(starts, pos) - 1, 0)
+        return min(tokens[i].start() + (pos - starts[i]), tokens[i].end())
+
+    start = 0
+    L = len(text)
+    while start < L:
+        end = start + chunk_size
+        piece = text[start:end]
+        lead = len(piece) - len(piece.lstrip())
+        piece = piece.strip()
+        if piece:
+            raw_start = locate(start + lead)
+            yield raw_start, locate(start + lead + len(piece)), piece, page_at(raw_start)
+        start = end - chunk_overlap
+        if start < 0:
+            start = 0
+        if start >= L - 1:
+            break
+
+
+def _pack(
+    raw: str,
+    units: Iterator[Unit],
+    chunk_size: int,
+    chunk_overlap: int,
+    page_at: Callable[[int], int],
+) -> Iterator[Unit]:
+    """Greedily pack units up to chunk_size; windows any unit that alone is too long."""
+    acc: List[Unit] = []
+    acc_len = 0
+
+    def flush():
+        if acc_len <= chunk_size:
+            yield acc[0][0], acc[-1][1], " ".join(u[2] for u in acc), acc[0][3]
+        else:
+            yield from _window(raw, acc[0], chunk_size, chunk_overlap, page_at)
+
+    for unit in units:
+        n = len(unit[2])
+        if acc and acc_len + n + 1 <= chunk_size:
+            acc.append(unit)
+            acc_len += n + 1
+            continue
+        if acc:
+            yield from flush()
+        acc = [unit]
+        acc_len = n
+    if acc:
+        yield from flush()
+
+
+def chunk_text(
+    raw: str,
+    strategy: str = "sentence",
+    chunk_size: int = 900,
+    chunk_overlap: int = 100,
+) -> Iterator[Dict]:
+    """
+    Single pass over a file's raw text, yielding chunk dicts with
+    "page", "chunk_id", "text", "start" and "end".
+
+    Paragraphs (blank-line separated blocks) are located on the raw text,
+    before whitespace is normalized. "page" is the paragraph a chunk starts
+    in and "chunk_id" numbers the chunks starting in that paragraph;
+    "start"/"end" are character offsets into `raw`, and clean_text() of that
+    slice equals the chunk text.
+
+    Strategies:
+      - sentence:  pack whole sentences up to chunk_size
+      - paragraph: pack whole paragraphs up to chunk_size
+      - window:    chunk_size windows with chunk_overlap over the whole file
+    Units that alone exceed chunk_size fall back to the overlapping window.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown chunk strategy {strategy!r}; expected one of {STRATEGIES}")
+
+    page_at = _page_locator(raw)
+    units = _iter_units(raw, strategy, page_at)
+    if strategy == "window":
+        pieces = (
+            piece
+            for unit in units
+            for piece in _window(raw, unit, chunk_size, chunk_overlap, page_at)
+        )
+    else:
+        pieces = _pack(raw, units, chunk_size, chunk_overlap, page_at)
+
+    last_page = None
+    chunk_id = 0
+    for start, end, text, page in pieces:
+        if page != last_page:
+            last_page = page
+            chunk_id = 0
+        chunk_id += 1
+        yield {"page": page, "chunk_id": chunk_id, "text": text, "start": start, "end": end}
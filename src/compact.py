@@ -0,0 +1,173 @@
+# src/compact.py
+import math
+from typing import Dict, Optional, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix, hstack
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+DTYPES = ("float64", "float32")
+# Hashed features: share of the columns given to unigrams; bigrams, which
+# are far more numerous, get the rest.
+UNIGRAM_SHARE = 0.25
+
+
+class Compaction:
+    """
+    How the TF-IDF index is stored. The defaults keep the exact index
+    (float64, every unigram and bigram); each option trades a little
+    ranking fidelity for a smaller matrix and vocabulary in every worker:
+
+      - dtype: "float32" halves the weight array;
+      - min_df / max_df: drop terms found in fewer / more chunks than this
+        (an int counts chunks, a float is a share of them), as sklearn does;
+      - max_features: keep only the most frequent remaining terms;
+      - row_top: keep each chunk's row_top highest weights (re-normalized);
+      - hash_bits: hash terms into 2**hash_bits columns instead of keeping
+        a vocabulary, so no term dict is built, saved or loaded.
+
+    Query vectors are never sparsified; only the chunk rows are.
+    benchmarks/tune_index.py sweeps these settings against the exact index.
+    """
+
+    def __init__(
+        self,
+        dtype: str = "float64",
+        min_df: Union[int, float] = 1,
+        max_df: Union[int, float] = 1.0,
+        max_features: Optional[int] = None,
+        row_top: Optional[int] = None,
+        hash_bits: Optional[int] = None,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown index dtype {dtype!r}; expected one of {DTYPES}")
+        if hash_bits is not None and not 10 <= hash_bits <= 26:
+            raise ValueError("hash_bits must be between 10 and 26")
+        if hash_bits is not None and max_features is not None:
+            raise ValueError("max_features needs a vocabulary; it cannot be combined with hash_bits")
+        if row_top is not None and row_top < 1:
+            raise ValueError("row_top must be positive")
+        self.dtype = dtype
+        self.min_df = min_df
+        self.max_df = max_df
+        self.max_features = max_features
+        self.row_top = row_top
+        self.hash_bits = hash_bits
+
+    def params(self) -> Dict:
+        """Settings that change the built index (part of the manifest params)."""
+        return {
+            "dtype": self.dtype,
+            "min_df": self.min_df,
+            "max_df": self.max_df,
+            "max_features": self.max_features,
+            "row_top": self.row_top,
+            "hash_bits": self.hash_bits,
+        }
+
+    @property
+    def hashed(self) -> bool:
+        return self.hash_bits is not None
+
+    def new_vectorizer(self):
+        if self.hashed:
+            return HashedTfidfVectorizer(1 << self.hash_bits, dtype=getattr(np, self.dtype))
+        return TfidfVectorizer(stop_words="english", ngram_range=(1, 2), dtype=getattr(np, self.dtype))
+
+    def keep_columns(self, df: np.ndarray, term_counts: np.ndarray, n_docs: int) -> Optional[np.ndarray]:
+        """
+        Boolean mask of the columns surviving the document-frequency and
+        max_features limits (most frequent terms by total count), or None
+        when nothing is pruned.
+        """
+        if self.min_df == 1 and self.max_df == 1.0 and self.max_features is None:
+            return None
+        low = self.min_df if isinstance(self.min_df, int) else math.ceil(self.min_df * n_docs)
+        high = self.max_df if isinstance(self.max_df, int) else self.max_df * n_docs
+        keep = (df >= low) & (df <= high)
+        if self.max_features is not None and keep.sum() > self.max_features:
+            freq = np.where(keep, term_counts, -1.0)
+            top = np.argpartition(-freq, self.max_features - 1)[: self.max_features]
+            keep = np.zeros(len(df), dtype=bool)
+            keep[top] = True
+        return keep
+
+    def compact_rows(self, matrix: csr_matrix) -> csr_matrix:
+        """Sparsify L2-normalized chunk rows to row_top weights and cast to dtype."""
+        if self.row_top is not None:
+            matrix = normalize(_top_per_row(matrix, self.row_top), norm="l2", copy=False)
+        return matrix.astype(self.dtype, copy=False)
+
+
+class HashedTfidfVectorizer:
+    """
+    TF-IDF over hashed features, for indexes without a vocabulary. Same
+    analysis as the vocabulary vectorizer (English stop words, unigrams and
+    bigrams); unigrams hash into the first UNIGRAM_SHARE of the columns and
+    bigrams into the rest, so phrase columns stay identifiable. idf_ is set
+    by the index build, like a fitted TfidfVectorizer's.
+    """
+
+    def __init__(self, n_features: int, dtype=np.float64):
+        # No terms are kept; saved as an empty vocabulary.
+        self.vocabulary_: Dict[str, int] = {}
+        self.n_features = n_features
+        self.n_unigrams = int(n_features * UNIGRAM_SHARE)
+        self.dtype = dtype
+        self.idf_: Optional[np.ndarray] = None
+        common = {"stop_words": "english", "alternate_sign": False, "norm": None}
+        self._unigrams = HashingVectorizer(ngram_range=(1, 1), n_features=self.n_unigrams, **common)
+        self._bigrams = HashingVectorizer(ngram_range=(2, 2), n_features=n_features - self.n_unigrams, **common)
+
+    def counts(self, texts) -> csr_matrix:
+        """Raw term counts, float64, with sorted column indices."""
+        matrix = hstack([self._unigrams.transform(texts), self._bigrams.transform(texts)], format="csr")
+        matrix.sort_indices()
+        return matrix
+
+    def transform(self, texts) -> csr_matrix:
+        matrix = self.counts(texts)
+        matrix.data *= self.idf_[matrix.indices]
+        # Pruned columns have a zero IDF.
+        matrix.eliminate_zeros()
+        return normalize(matrix, norm="l2", copy=False).astype(self.dtype, copy=False)
+
+    def bigram_columns(self) -> np.ndarray:
+        bigram = np.zeros(self.n_features, dtype=bool)
+        bigram[self.n_unigrams :] = True
+        return bigram
+
+
+def drop_columns(matrix: csr_matrix, keep: np.ndarray, renumber: bool) -> csr_matrix:
+    """
+    Remove the entries of columns not in `keep`; with renumber, kept columns
+    are numbered consecutively (the matrix gets keep.sum() columns).
+    Row order and sorted indices are preserved.
+    """
+    mask = keep[matrix.indices]
+    indices = matrix.indices[mask]
+    n_cols = matrix.shape[1]
+    if renumber:
+        new_col = np.cumsum(keep, dtype=np.int64) - 1
+        indices = new_col[indices].astype(matrix.indices.dtype)
+        n_cols = int(keep.sum())
+    kept_before = np.concatenate([[0], np.cumsum(mask)])
+    indptr = kept_before[matrix.indptr].astype(matrix.indptr.dtype)
+    return csr_matrix((matrix.data[mask], indices, indptr), shape=(matrix.shape[0], n_cols))
+
+
+def _top_per_row(matrix: csr_matrix, n: int) -> csr_matrix:
+    """Keep the n largest entries of every row (ties keep the lower columns)."""
+    lengths = np.diff(matrix.indptr)
+    if not len(lengths) or lengths.max() <= n:
+        return matrix
+    rows = np.repeat(np.arange(matrix.shape[0]), lengths)
+    # Entries grouped by row, largest first; position within the group is the rank.
+    order = np.lexsort((-matrix.data, rows))
+    rank = np.arange(len(order)) - np.repeat(matrix.indptr[:-1], lengths)
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order[rank < n]] = True
+    indptr = np.zeros_like(matrix.indptr)
+    np.cumsum(np.minimum(lengths, n), out=indptr[1:])
+    return csr_matrix((matrix.data[mask], matrix.indices[mask], indptr), shape=matrix.shape)
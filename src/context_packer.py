@@ -0,0 +1,188 @@
+# src/context_packer.py
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _header(i: int, c: Dict) -> str:
+    return f"[CONTEXT {i} — {c.get('subject','unknown')} | page {c.get('page','?')}]"
+
+
+def format_context(chunks: List[Dict]) -> str:
+    """The prompt's context block: each chunk under a numbered header."""
+    blocks = [_header(i, c) + "\n" + c.get("text", "") for i, c in enumerate(chunks, start=1)]
+    return "\n\n".join(blocks).strip()
+
+
+def _shingles(text: str, size: int) -> Set[Tuple[str, ...]]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def _overlap(a: str, b: str, limit: int) -> int:
+    """Length of the longest suffix of a that is also a prefix of b (at most limit)."""
+    for k in range(min(len(a), len(b), limit), 0, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into the passages actually sent to the model:
+
+      1. chunks of the same source text (the "source" the retriever reports,
+         else the subject's page) that are adjacent (consecutive "ordinal"s,
+         else chunk ids) or overlap in that text are merged into one
+         passage, without repeating the overlap;
+      2. passages are taken in score order, and any passage (or sentence)
+         whose word shingles are at least `dedup_threshold` covered by
+         passages already taken is dropped as a near-duplicate;
+      3. passages are packed into the budget: `max_chars` characters of
+         formatted context, or `max_tokens` at `chars_per_token` if that is
+         smaller. A passage that no longer fits is cut at a sentence end
+         when at least `min_tail_chars` are left, otherwise skipped.
+
+    pack() returns the passages (in score order) and a report of what was
+    removed, including the context characters saved.
+    """
+
+    def __init__(
+        self,
+        max_chars: Optional[int] = 6000,
+        max_tokens: Optional[int] = None,
+        chars_per_token: float = 4.0,
+        dedup_threshold: float = 0.8,
+        shingle_size: int = 3,
+        min_tail_chars: int = 200,
+    ):
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.chars_per_token = chars_per_token
+        self.dedup_threshold = dedup_threshold
+        self.shingle_size = shingle_size
+        self.min_tail_chars = min_tail_chars
+
+    def budget(self) -> Optional[int]:
+        limits = []
+        if self.max_chars is not None:
+            limits.append(self.max_chars)
+        if self.max_tokens is not None:
+            limits.append(int(self.max_tokens * self.chars_per_token))
+        return min(limits) if limits else None
+
+    def pack(self, chunks: List[Dict]) -> Tuple[List[Dict], Dict[str, int]]:
+        report = {
+            "chunks": len(chunks),
+            "merged": 0,
+            "duplicates": 0,
+            "sentences_trimmed": 0,
+            "over_budget": 0,
+            "truncated": 0,
+        }
+        passages = self._merge(chunks, report)
+        passages.sort(key=lambda p: -p.get("score", 0.0))
+        passages = self._dedup(passages, report)
+        passages = self._fit(passages, report)
+        for rank, p in enumerate(passages, start=1):
+            p["rank"] = rank
+
+        report["passages"] = len(passages)
+        report["chars_in"] = len(format_context(chunks))
+        report["chars_out"] = len(format_context(passages))
+        report["chars_saved"] = report["chars_in"] - report["chars_out"]
+        return passages, report
+
+    def _merge(self, chunks: List[Dict], report: Dict[str, int]) -> List[Dict]:
+        groups: Dict[Tuple, List[Dict]] = {}
+        for c in chunks:
+            p = dict(c)
+            p["chunk_ids"] = [c.get("chunk_id")]
+            # Chunk offsets (and ordinals) are comparable within one source text.
+            source = c.get("source") or ("page", c.get("page"))
+            groups.setdefault((c.get("subject"), source), []).append(p)
+
+        merged = []
+        for group in groups.values():
+            position = "ordinal" if all(p.get("ordinal") is not None for p in group) else "chunk_id"
+            group.sort(key=lambda p: (p.get("start", 0), p.get(position) or 0))
+            cur = group[0]
+            last = cur.get(position)
+            for nxt in group[1:]:
+                overlapping = "start" in nxt and "end" in cur and nxt["start"] <= cur["end"]
+                consecutive = nxt.get(position) is not None and last is not None and nxt[position] == last + 1
+                if not (overlapping or consecutive):
+                    merged.append(cur)
+                    cur = nxt
+                    last = cur.get(position)
+                    continue
+                report["merged"] += 1
+                if overlapping and nxt.get("end", 0) <= cur.get("end", 0):
+                    pass  # nxt lies inside cur
+                else:
+                    limit = cur["end"] - nxt["start"] if overlapping else 0
+                    k = _overlap(cur["text"], nxt["text"], limit)
+                    tail = nxt["text"][k:]
+                    cur["text"] = cur["text"] + tail if k else cur["text"] + " " + tail
+                    if "end" in nxt:
+                        cur["end"] = max(cur.get("end", 0), nxt["end"])
+                cur["chunk_ids"].append(nxt.get("chunk_id"))
+                last = nxt.get(position)
+                cur["score"] = max(cur.get("score", 0.0), nxt.get("score", 0.0))
+            merged.append(cur)
+        return merged
+
+    def _dedup(self, passages: List[Dict], report: Dict[str, int]) -> List[Dict]:
+        seen: Set[Tuple[str, ...]] = set()
+        kept = []
+        for p in passages:
+            shingles = _shingles(p["text"], self.shingle_size)
+            if seen and shingles and len(shingles & seen) >= self.dedup_threshold * len(shingles):
+                report["duplicates"] += 1
+                continue
+
+            if seen:
+                sentences = _SENTENCE_SPLIT_RE.split(p["text"])
+                keep = []
+                for s in sentences:
+                    sh = _shingles(s, self.shingle_size)
+                    if sh and len(sh & seen) >= self.dedup_threshold * len(sh):
+                        continue
+                    keep.append(s)
+                if len(keep) < len(sentences):
+                    report["sentences_trimmed"] += len(sentences) - len(keep)
+                    p["text"] = " ".join(keep)
+
+            seen |= shingles
+            kept.append(p)
+        return kept
+
+    def _fit(self, passages: List[Dict], report: Dict[str, int]) -> List[Dict]:
+        budget = self.budget()
+        if budget is None:
+            return passages
+
+        packed = []
+        used = 0
+        for p in passages:
+            header = len(_header(len(packed) + 1, p)) + 1
+            sep = 2 if packed else 0
+            room = budget - used - sep - header
+            if len(p["text"]) <= room:
+                packed.append(p)
+                used += sep + header + len(p["text"])
+                continue
+            if room >= self.min_tail_chars:
+                cut = p["text"][:room]
+                end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+                p["text"] = cut[: end + 1] if end > 0 else cut.rsplit(" ", 1)[0]
+                packed.append(p)
+                used += sep + header + len(p["text"])
+                report["truncated"] += 1
+                continue
+            report["over_budget"] += 1
+        return packed
@@ -0,0 +1,107 @@
+# src/dedup.py
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+# MinHash permutations, and LSH bands over them (NUM_PERM // BANDS rows
+# each). 16 bands of 4 make pairs above ~0.5 Jaccard likely candidates;
+# candidates are then checked exactly against the threshold.
+NUM_PERM = 64
+BANDS = 16
+# Jaccard similarity above which the app and the service collapse chunks.
+DEFAULT_THRESHOLD = 0.8
+# Shingle entries hashed per batch (memory: batch x NUM_PERM x 8 bytes).
+_BATCH = 1 << 16
+
+
+def minhash(features: csr_matrix, num_perm: int = NUM_PERM, seed: int = 0) -> np.ndarray:
+    """
+    (rows x num_perm) uint32 MinHash signatures of each row's set of
+    feature columns. Rows without features get all-ones signatures.
+    """
+    rng = np.random.RandomState(seed)
+    # Multiply-shift hashing: odd 64-bit multipliers, high 32 bits of the product.
+    a = rng.randint(0, 1 << 62, size=num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.randint(0, 1 << 62, size=num_perm, dtype=np.int64).astype(np.uint64)
+    n_rows = features.shape[0]
+    sig = np.full((n_rows, num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    indptr = features.indptr
+    live = np.flatnonzero(np.diff(indptr))
+    ids = features.indices.astype(np.uint64)
+
+    lo = 0
+    while lo < len(live):
+        # Whole rows per batch, about _BATCH entries at a time.
+        hi = int(np.searchsorted(indptr[live + 1], indptr[live[lo]] + _BATCH, side="right"))
+        hi = max(hi, lo + 1)
+        rows = live[lo:hi]
+        start, end = indptr[rows[0]], indptr[rows[-1] + 1]
+        h = ((ids[start:end, None] * a + b) >> np.uint64(32)).astype(np.uint32)
+        sig[rows] = np.minimum.reduceat(h, indptr[rows] - start, axis=0)
+        lo = hi
+    return sig
+
+
+def _band_candidates(sig: np.ndarray, rows: np.ndarray, bands: int) -> np.ndarray:
+    """(member, first member) row pairs of every LSH bucket, over all bands."""
+    r = sig.shape[1] // bands
+    pairs = []
+    for j in range(bands):
+        key = np.zeros(len(rows), dtype=np.uint64)
+        for col in sig[rows, j * r : (j + 1) * r].T:
+            key = key * np.uint64(1000003) + col
+        order = np.lexsort((rows, key))
+        key, members = key[order], rows[order]
+        first = np.ones(len(key), dtype=bool)
+        first[1:] = key[1:] != key[:-1]
+        head = members[np.maximum.accumulate(np.where(first, np.arange(len(key)), 0))]
+        pairs.append(np.stack([members[~first], head[~first]], axis=1))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def jaccard(features: csr_matrix, pairs: np.ndarray) -> np.ndarray:
+    """Exact Jaccard similarity of the feature sets of each (i, j) row pair."""
+    if not len(pairs):
+        return np.empty(0)
+    binary = features.copy()
+    binary.data = np.ones_like(binary.data, dtype=np.float32)
+    inter = np.asarray(binary[pairs[:, 0]].multiply(binary[pairs[:, 1]]).sum(axis=1)).ravel()
+    sizes = np.diff(features.indptr)
+    union = sizes[pairs[:, 0]] + sizes[pairs[:, 1]] - inter
+    return inter / np.maximum(union, 1)
+
+
+def near_duplicates(
+    features: csr_matrix,
+    threshold: float,
+    num_perm: int = NUM_PERM,
+    bands: int = BANDS,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    canonical[i]: the row that row i collapses into; i itself for rows that
+    stay. Rows are shingled by their feature columns (e.g. the unigram and
+    bigram terms of a count matrix). MinHash + LSH banding pick candidate
+    pairs in about linear time; pairs whose exact Jaccard similarity is at
+    least `threshold` are linked, and every connected group collapses into
+    its first (lowest) row. Rows without features are never duplicates.
+    """
+    n_rows = features.shape[0]
+    canonical = np.arange(n_rows)
+    rows = np.flatnonzero(np.diff(features.indptr))
+    if len(rows) < 2:
+        return canonical
+    sig = minhash(features, num_perm, seed)
+    pairs = _band_candidates(sig, rows, bands)
+    pairs = pairs[jaccard(features, pairs) >= threshold]
+    if not len(pairs):
+        return canonical
+    graph = coo_matrix(
+        (np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])), shape=(n_rows, n_rows)
+    )
+    _, labels = connected_components(graph, directed=False)
+    first = np.full(labels.max() + 1, n_rows, dtype=np.int64)
+    np.minimum.at(first, labels, canonical)
+    return first[labels]
@@ -0,0 +1,280 @@
+# src/dense.py
+import os
+import json
+import shutil
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from src.ranking import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+DENSE_FORMAT_VERSION = 1
+META_FILE = "dense_meta.json"
+ARRAY_FILES = ("projection", "vectors", "centroids", "codebooks", "codes", "list_ptr", "list_rows")
+
+Ranges = Sequence[Tuple[int, int]]
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+class DenseIndex:
+    """
+    Dense LSA vectors of the chunks with an IVF-PQ approximate search index.
+
+    fit() projects the TF-IDF rows onto their top `dim` singular vectors
+    (TruncatedSVD) and L2-normalizes them, so a dot product is the cosine
+    similarity in the latent space. For search:
+
+      - a coarse k-means quantizer splits the vectors into `n_lists`
+        inverted lists (about sqrt(rows) by default);
+      - each vector's residual from its list centroid is product-quantized
+        into `dim / sub_dim` one-byte codes;
+      - search() scores only the `nprobe` lists nearest the query, via
+        per-query lookup tables over the codes, and re-ranks the best
+        `rerank` candidates exactly against the float32 vectors.
+
+    search_exact() is the brute-force reference (optionally restricted to
+    row ranges), used for scoped queries and for measuring recall. All
+    arrays can be saved and memory-mapped back read-only.
+    """
+
+    def __init__(
+        self,
+        dim: int = 128,
+        sub_dim: int = 8,
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        rerank: int = 64,
+        train_rows: int = 20000,
+        seed: int = 0,
+    ):
+        self.dim = dim
+        self.sub_dim = sub_dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.train_rows = train_rows
+        self.seed = seed
+        # Id of the sparse index the vectors were computed from.
+        self.fingerprint: Optional[str] = None
+        self.projection: Optional[np.ndarray] = None  # terms x dim
+        self.vectors: Optional[np.ndarray] = None  # rows x dim, L2-normalized
+        self.centroids: Optional[np.ndarray] = None  # lists x dim
+        self.codebooks: Optional[np.ndarray] = None  # subspaces x ksub x sub_dim
+        self.codes: Optional[np.ndarray] = None  # rows x subspaces, in list order
+        self.list_ptr: Optional[np.ndarray] = None  # list l owns positions [ptr[l], ptr[l+1])
+        self.list_rows: Optional[np.ndarray] = None  # row id at each list position
+
+    def __len__(self) -> int:
+        return 0 if self.vectors is None else len(self.vectors)
+
+    # ---------- Build ----------
+
+    def fit(self, tfidf_matrix: csr_matrix, fingerprint: Optional[str] = None) -> "DenseIndex":
+        # Only needed to build; loading a saved index skips these imports.
+        from sklearn.cluster import KMeans
+        from sklearn.decomposition import TruncatedSVD
+
+        n_rows, n_terms = tfidf_matrix.shape
+        rng = np.random.RandomState(self.seed)
+        self.fingerprint = fingerprint
+
+        dim = max(1, min(self.dim, n_rows - 1, n_terms - 1))
+        svd = TruncatedSVD(n_components=dim, algorithm="randomized", random_state=self.seed)
+        vectors = svd.fit_transform(tfidf_matrix)
+        # Zero-pad to a whole number of PQ subspaces; padding never changes a dot product.
+        padded = -(-dim // self.sub_dim) * self.sub_dim
+        projection = np.zeros((n_terms, padded), dtype=np.float32)
+        projection[:, :dim] = svd.components_.T
+        vectors = np.pad(vectors, ((0, 0), (0, padded - dim)))
+        self.projection = projection
+        self.vectors = _normalize_rows(vectors).astype(np.float32)
+
+        # Quantizers are trained on a sample of at most train_rows vectors.
+        train = np.arange(n_rows)
+        if n_rows > self.train_rows:
+            train = np.sort(rng.choice(n_rows, self.train_rows, replace=False))
+        sample = self.vectors[train]
+
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, len(sample))
+        coarse = KMeans(n_clusters=n_lists, n_init=1, max_iter=50, random_state=self.seed).fit(sample)
+        self.centroids = coarse.cluster_centers_.astype(np.float32)
+        assign = self._nearest(self.vectors, self.centroids)
+
+        residuals = self.vectors - self.centroids[assign]
+        n_sub = padded // self.sub_dim
+        ksub = min(256, len(sample))
+        sample_res = residuals[train]
+        self.codebooks = np.zeros((n_sub, ksub, self.sub_dim), dtype=np.float32)
+        codes = np.zeros((n_rows, n_sub), dtype=np.uint8)
+        for j in range(n_sub):
+            cols = slice(j * self.sub_dim, (j + 1) * self.sub_dim)
+            km = KMeans(n_clusters=ksub, n_init=1, max_iter=25, random_state=self.seed).fit(sample_res[:, cols])
+            self.codebooks[j] = km.cluster_centers_
+            codes[:, j] = self._nearest(residuals[:, cols], self.codebooks[j])
+
+        order = np.argsort(assign, kind="stable")
+        self.list_rows = order.astype(np.int64)
+        self.codes = codes[order]
+        self.list_ptr = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=self.list_ptr[1:])
+        return self
+
+    @staticmethod
+    def _nearest(x: np.ndarray, centers: np.ndarray, batch: int = 8192) -> np.ndarray:
+        """Index of the nearest (L2) center for every row of x, in batches."""
+        out = np.empty(len(x), dtype=np.int64)
+        c_sq = (centers ** 2).sum(axis=1)
+        for b in range(0, len(x), batch):
+            block = x[b : b + batch]
+            out[b : b + batch] = np.argmin(c_sq[None, :] - 2 * block @ centers.T, axis=1)
+        return out
+
+    # ---------- Search ----------
+
+    def project(self, q_mat: csr_matrix) -> np.ndarray:
+        """
+        TF-IDF query rows -> L2-normalized dense query vectors. Only the
+        projection rows of the query's own terms are read (a sparse @ dense
+        product would upcast, i.e. copy, the whole float32 projection).
+        """
+        out = np.zeros((q_mat.shape[0], self.projection.shape[1]), dtype=np.float32)
+        for i in range(q_mat.shape[0]):
+            lo, hi = q_mat.indptr[i], q_mat.indptr[i + 1]
+            if hi > lo:
+                out[i] = q_mat.data[lo:hi].astype(np.float32) @ self.projection[q_mat.indices[lo:hi]]
+        return _normalize_rows(out)
+
+    def search(self, q: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top k (row ids, cosine scores), best first."""
+        if not len(self) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        coarse = self.centroids @ q
+        lists = top_k_indices(coarse, nprobe or self.nprobe)
+
+        spans = [(self.list_ptr[l], self.list_ptr[l + 1]) for l in lists]
+        positions = np.concatenate([np.arange(a, b) for a, b in spans])
+        if not len(positions):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        base = np.repeat(coarse[lists], [b - a for a, b in spans])
+
+        # tables[j, c]: dot of the query's j-th subvector with codeword c.
+        n_sub = len(self.codebooks)
+        tables = np.einsum("jcd,jd->jc", self.codebooks, q.reshape(n_sub, self.sub_dim))
+        approx = base + tables[np.arange(n_sub), self.codes[positions]].sum(axis=1)
+
+        shortlist = self.list_rows[positions[top_k_indices(approx, max(k, self.rerank))]]
+        exact = self.vectors[shortlist] @ q
+        best = top_k_indices(exact, k)
+        return shortlist[best], exact[best]
+
+    def search_exact(self, q: np.ndarray, k: int, ranges: Optional[Ranges] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force top k over all rows, or only the given [start, end) row ranges."""
+        if ranges is None:
+            ranges = [(0, len(self))]
+        if not len(self) or not ranges or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate([np.arange(s, e) for s, e in ranges])
+        scores = np.concatenate([self.vectors[s:e] @ q for s, e in ranges])
+        best = top_k_indices(scores, k)
+        return rows[best], scores[best]
+
+    def recall(self, q_vecs: np.ndarray, k: int = 10, nprobe: Optional[int] = None) -> float:
+        """Mean share of the exact top k that search() also returns."""
+        if not len(q_vecs):
+            return 0.0
+        total = 0.0
+        for q in q_vecs:
+            want = set(self.search_exact(q, k)[0].tolist())
+            got = set(self.search(q, k, nprobe)[0].tolist())
+            total += len(want & got) / max(len(want), 1)
+        return total / len(q_vecs)
+
+    # ---------- Persistence ----------
+
+    def _meta(self) -> Dict:
+        return {
+            "version": DENSE_FORMAT_VERSION,
+            "fingerprint": self.fingerprint,
+            "dim": self.dim,
+            "sub_dim": self.sub_dim,
+            "n_lists": self.n_lists,
+            "nprobe": self.nprobe,
+            "rerank": self.rerank,
+            "seed": self.seed,
+        }
+
+    def save(self, directory: str):
+        """Write to a temp directory and swap it into place."""
+        tmp_dir = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        try:
+            os.makedirs(tmp_dir)
+            for name in ARRAY_FILES:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(self, name))
+            with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(self._meta(), f)
+            old_dir = f"{directory}.{os.getpid()}.old"
+            if os.path.exists(directory):
+                os.replace(directory, old_dir)
+            os.replace(tmp_dir, directory)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        except Exception as e:
+            logger.warning("Could not persist dense index to %s: %s", directory, e)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> Optional["DenseIndex"]:
+        try:
+            with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception:
+            return None
+        if meta.get("version") != DENSE_FORMAT_VERSION:
+            return None
+        try:
+            self = cls(
+                dim=meta["dim"],
+                sub_dim=meta["sub_dim"],
+                n_lists=meta["n_lists"],
+                nprobe=meta["nprobe"],
+                rerank=meta["rerank"],
+                seed=meta["seed"],
+            )
+            self.fingerprint = meta["fingerprint"]
+            mode = "r" if mmap else None
+            for name in ARRAY_FILES:
+                setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode))
+            return self
+        except Exception as e:
+            logger.warning("Could not load dense index from %s: %s", directory, e)
+            return None
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], k: int, rrf_k: int = 60) -> List[Dict]:
+    """
+    Fuse ranked result lists: every chunk scores sum(1 / (rrf_k + rank))
+    over the lists it appears in. Returns the top k as fresh result dicts
+    with the fused score and rank.
+    """
+    fused: Dict[Tuple, float] = {}
+    first: Dict[Tuple, Dict] = {}
+    for results in result_lists:
+        for rank, r in enumerate(results, start=1):
+            key = (r["subject"], r["page"], r["chunk_id"])
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            first.setdefault(key, r)
+    ordered = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    out = []
+    for rank, (key, score) in enumerate(ordered, start=1):
+        out.append(dict(first[key], score=score, rank=rank))
+    return out
@@ -1,27 +1,51 @@
 # src/generator.py
-import os
-from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional, Tuple
+import time
 import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import google.generativeai as genai
-
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+from src.answer_cache import ANSWER_CACHE_PATH, AnswerCache, answer_key
+from src.context_packer import format_context
+from src.backends import GEMINI_API_KEY, GeminiBackend  # noqa: F401
+from src.model_client import ERROR, OK, TIMEOUT, ModelClient, ModelTimeout, default_client
+from src.tracing import count, record, span
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-    except Exception:
-        try:
-            genai.api_key = GEMINI_API_KEY
-        except Exception:
-            logger.warning("Could not set API key via genai.configure or genai.api_key; calls may fail.")
-
 CLASSIC_INSUFFICIENT_MSG = "I don't have enough information in the knowledge base to answer this."
+# Shown (never cached) when the model could not be reached, as opposed to
+# the model saying the context is insufficient.
+MODEL_TIMEOUT_MSG = "The model took too long to answer. Please try again."
+MODEL_ERROR_MSG = "The model is unavailable right now. Please try again."
+# Appended to a streamed answer whose stream failed after text was shown.
+STREAM_CUT_NOTICE = "\n\n⚠️ This answer was cut short: {reason}"
+
+
+def _held_back(text: str) -> int:
+    """Length of the longest suffix of text that could be the start of CLASSIC_INSUFFICIENT_MSG."""
+    for n in range(min(len(text), len(CLASSIC_INSUFFICIENT_MSG) - 1), 0, -1):
+        if text.endswith(CLASSIC_INSUFFICIENT_MSG[:n]):
+            return n
+    return 0
+
+
+class AnswerStream:
+    """
+    Iterator over the text deltas of one streamed answer. Once it is
+    exhausted, `text` holds the final answer: the concatenated deltas.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._deltas: Iterator[str] = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        return next(self._deltas)
 
 
 class GeminiGenerator:
@@ -30,26 +54,38 @@ class GeminiGenerator:
       - the user's question
       - retrieved context chunks from the KB
     and returns a short, clear, exam-friendly answer using ONLY that context.
+
+    `backend` is anything with `model_name`, `generate(prompt) -> str` and
+    `generate_stream(prompt)` (GeminiBackend by default, FakeBackend offline).
+    Calls go through `client` (the shared ModelClient by default) with a
+    `timeout` deadline (None uses the client's). Answers are cached on
+    disk at `cache_path` (None disables the cache).
     """
 
-    def __init__(self, model_name: str = "gemini-2.5-flash", max_chars: int = 2200):
+    def __init__(
+        self,
+        model_name: str = "gemini-2.5-flash",
+        max_chars: int = 2200,
+        backend=None,
+        cache_path: Optional[str] = ANSWER_CACHE_PATH,
+        client: Optional[ModelClient] = None,
+        timeout: Optional[float] = None,
+    ):
         self.max_chars = max_chars
-        try:
-            self.model = genai.GenerativeModel(model_name)
-            self.model_name = model_name
-        except Exception:
-            self.model = None
-            self.model_name = model_name
+        self.backend = backend or GeminiBackend(model_name)
+        self.model_name = self.backend.model_name
+        self.client = client or default_client()
+        self.timeout = timeout
+        self.cache: Optional[AnswerCache] = None
+        if cache_path:
+            try:
+                self.cache = AnswerCache(cache_path)
+            except Exception as e:
+                logger.warning("Answer cache disabled: %s", e)
 
     def _build_prompt(self, question: str, context_chunks: List[Dict]) -> str:
         # Build a clean context block
-        blocks = []
-        for i, c in enumerate(context_chunks, start=1):
-            header = f"[CONTEXT {i} — {c.get('subject','unknown')} | page {c.get('page','?')}]"
-            blocks.append(header + "\n" + c.get("text", ""))
-
-        combined_context = "\n\n".join(blocks).strip()
-
+        combined_context = format_context(context_chunks)
         prompt = f"""
 You are a helpful tutor for college students.
 
@@ -80,35 +116,175 @@ Keep the answer focused and avoid unnecessary extra details.
 """
         return prompt
 
-    def generate(self, question: str, context_chunks: List[Dict]) -> str:
+    def _prompt(self, question: str, context_chunks: List[Dict]) -> str:
+        with span("build_prompt"):
+            prompt = self._build_prompt(question, context_chunks)
+        count("prompts")
+        count("prompt_chars", len(prompt))
+        return prompt
+
+    def generate(self, question: str, context_chunks: List[Dict], use_cache: bool = True) -> str:
         if not context_chunks:
             return CLASSIC_INSUFFICIENT_MSG
 
-        prompt = self._build_prompt(question, context_chunks)
+        key = None
+        if use_cache and self.cache is not None:
+            with span("answer_cache.get"):
+                key = answer_key(question, context_chunks, self.model_name)
+                cached = self.cache.get(key)
+            count("answer_cache", result="miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
 
-        try:
-            if self.model:
-                response = self.model.generate_content(prompt)
-                text = getattr(response, "text", None)
-                if not text:
-                    try:
-                        text = response.candidates[0].content
-                    except Exception:
-                        text = str(response)
-                text = text.strip()
-            else:
-                resp = genai.generate_text(model=self.model_name, prompt=prompt)
-                text = getattr(resp, "text", "") or str(resp)
-                text = text.strip()
-        except Exception as e:
-            logger.exception("Primary generation failed: %s", e)
-            text = ""
+        prompt = self._prompt(question, context_chunks)
 
+        with span("model.generate", model=self.model_name):
+            result = self.client.call(self.backend, prompt, timeout=self.timeout)
+        count("model_results", status=result.status)
+        if result.status == TIMEOUT:
+            return MODEL_TIMEOUT_MSG
+        if result.status == ERROR:
+            logger.error("Generation failed: %s", result.error)
+            return MODEL_ERROR_MSG
+
+        text = result.text.strip()
         if not text:
             return CLASSIC_INSUFFICIENT_MSG
 
         if CLASSIC_INSUFFICIENT_MSG in text:
-            return CLASSIC_INSUFFICIENT_MSG
+            answer = CLASSIC_INSUFFICIENT_MSG
+        else:
+            # basic length control
+            answer = text[: self.max_chars]
+
+        # Only real model replies are cached; failures above return early.
+        if key is not None:
+            self.cache.put(key, answer)
+        return answer
+
+    def generate_concurrently(
+        self,
+        questions: List[str],
+        contexts: List[List[Dict]],
+        max_parallel: int = 4,
+        use_cache: bool = True,
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        generate() for several (question, context) pairs at once, with at
+        most `max_parallel` in flight (the shared ModelClient still caps
+        the process as a whole). Yields (index, answer) as each finishes, so
+        the total wait is close to the slowest question, not the sum.
+        """
+        if not questions:
+            return
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(questions)))) as pool:
+            # Each worker runs in a copy of the caller's context so its spans
+            # land in the caller's trace.
+            futures = {
+                pool.submit(contextvars.copy_context().run, self.generate, q, ctx, use_cache): i
+                for i, (q, ctx) in enumerate(zip(questions, contexts))
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def generate_stream(
+        self, question: str, context_chunks: List[Dict], use_cache: bool = True
+    ) -> AnswerStream:
+        """
+        Streaming counterpart of generate(). The max_chars budget is enforced
+        while streaming (the model stream is closed once it is spent), and
+        text that could be the start of CLASSIC_INSUFFICIENT_MSG is held back
+        until it is clear whether the model is declining to answer. Trailing
+        whitespace is held back too, so the deltas add up to the final text.
+        If the model stream fails after text was shown, the answer ends with
+        STREAM_CUT_NOTICE and is not cached.
+        """
+        stream = AnswerStream()
+        stream._deltas = self._stream(stream, question, context_chunks, use_cache)
+        return stream
+
+    def _stream(
+        self, stream: AnswerStream, question: str, context_chunks: List[Dict], use_cache: bool
+    ) -> Iterator[str]:
+        if not context_chunks:
+            stream.text = CLASSIC_INSUFFICIENT_MSG
+            yield CLASSIC_INSUFFICIENT_MSG
+            return
+
+        key = None
+        if use_cache and self.cache is not None:
+            with span("answer_cache.get"):
+                key = answer_key(question, context_chunks, self.model_name)
+                cached = self.cache.get(key)
+            count("answer_cache", result="miss" if cached is None else "hit")
+            if cached is not None:
+                stream.text = cached
+                yield cached
+                return
+
+        prompt = self._prompt(question, context_chunks)
+        started = time.perf_counter()
+        first_token = None
+        text = ""
+        emitted = 0
+        insufficient = False
+        failed = None
+        source = None
+
+        try:
+            source = self.client.stream(self.backend, prompt, timeout=self.timeout)
+            for delta in source:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                text = (text + delta) if text else delta.lstrip()
+                if CLASSIC_INSUFFICIENT_MSG in text:
+                    insufficient = True
+                    break
+                body = text.rstrip()
+                safe = min(len(body) - _held_back(body), self.max_chars)
+                safe = len(text[:safe].rstrip())
+                if safe > emitted:
+                    yield text[emitted:safe]
+                    emitted = safe
+                if len(text) >= self.max_chars:
+                    break
+        except ModelTimeout:
+            failed = MODEL_TIMEOUT_MSG
+        except Exception as e:
+            logger.exception("Streaming generation failed: %s", e)
+            failed = MODEL_ERROR_MSG
+        finally:
+            if source is not None and hasattr(source, "close"):
+                source.close()
+        # Spans are recorded by hand: the stream's time is spread over yields.
+        if first_token is not None:
+            record("model.first_token", started, first_token)
+        record("model.stream", started, time.perf_counter() - started, model=self.model_name)
+        count("model_results", status=TIMEOUT if failed == MODEL_TIMEOUT_MSG else ERROR if failed else OK)
+
+        if failed and not emitted and not insufficient:
+            answer = failed
+            yield answer
+        elif insufficient or not text.strip():
+            answer = CLASSIC_INSUFFICIENT_MSG
+            if emitted:
+                # Part of the reply was shown before the model declined:
+                # finish it up to the end of the message.
+                end = text.index(CLASSIC_INSUFFICIENT_MSG) + len(CLASSIC_INSUFFICIENT_MSG)
+                yield text[emitted:end]
+                answer = text[:end]
+            else:
+                yield answer
+        else:
+            answer = text[: self.max_chars].rstrip()
+            if emitted < len(answer):
+                yield answer[emitted:]
+            if failed:
+                notice = STREAM_CUT_NOTICE.format(reason=failed)
+                yield notice
+                answer += notice
+        stream.text = answer
 
-        # basic length control
-        return text[: self.max_chars]
+        # As in generate(), only completed model replies are cached.
+        if key is not None and not failed and text.strip():
+            self.cache.put(key, CLASSIC_INSUFFICIENT_MSG if insufficient else answer)
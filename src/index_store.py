@@ -0,0 +1,200 @@
+# src/index_store.py
+import os
+import json
+import shutil
+import hashlib
+import logging
+from typing import List, Dict, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from src.chunk_store import ChunkStore
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the on-disk layout or the chunking/vectorizing logic changes,
+# so stale artifacts are rebuilt instead of silently reused.
+INDEX_FORMAT_VERSION = 6
+
+MANIFEST_FILE = "manifest.json"
+VOCAB_FILE = "vocab.json"
+META_FILE = "meta.json"
+ARRAY_FILES = ("idf", "data", "indices", "indptr")
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def build_manifest(
+    data_dir: str,
+    paths: List[str],
+    params: Dict,
+    previous: Optional[Dict] = None,
+) -> Dict:
+    """
+    Describe the corpus that an index was (or will be) built from.
+
+    Content hashes are only recomputed for files whose size or mtime differ
+    from the previous manifest, so an unchanged corpus costs one stat per file.
+    Per-file row counts, fit and dedup statistics are carried over for unchanged files;
+    the Retriever fills them in for anything it (re)indexes.
+    """
+    known = {}
+    if previous:
+        known = {f["path"]: f for f in previous.get("files", [])}
+
+    files = []
+    for path in paths:
+        rel = os.path.relpath(path, data_dir).replace(os.sep, "/")
+        st = os.stat(path)
+        old = known.get(rel)
+        if old and old.get("size") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns:
+            digest = old["sha256"]
+        else:
+            digest = _sha256(path)
+        entry = {
+            "path": rel,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": digest,
+        }
+        if old and old.get("sha256") == digest and "rows" in old:
+            entry["rows"] = old["rows"]
+        files.append(entry)
+
+    manifest = {"version": INDEX_FORMAT_VERSION, "params": params, "files": files}
+    for key in ("fit", "dedup"):
+        if previous and key in previous:
+            manifest[key] = previous[key]
+    return manifest
+
+
+def _content_key(manifest: Dict):
+    return (
+        manifest.get("version"),
+        json.dumps(manifest.get("params"), sort_keys=True),
+        [(f["path"], f["sha256"]) for f in manifest.get("files", [])],
+    )
+
+
+def manifest_fingerprint(manifest: Optional[Dict]) -> Optional[str]:
+    """Short stable id of the corpus + parameters an index was built for."""
+    if not manifest:
+        return None
+    key = json.dumps(_content_key(manifest), sort_keys=True, default=str)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def manifest_matches(stored: Optional[Dict], current: Dict) -> bool:
+    """True if an index built for `stored` is valid for the `current` corpus."""
+    if not stored:
+        return False
+    return _content_key(stored) == _content_key(current)
+
+
+def read_manifest(index_dir: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def write_manifest(index_dir: str, manifest: Dict):
+    """Refresh stat info in place (e.g. after a touch that kept content identical)."""
+    tmp = os.path.join(index_dir, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(index_dir, MANIFEST_FILE))
+    except Exception as e:
+        logger.warning("Could not refresh index manifest: %s", e)
+
+
+def save_index(
+    index_dir: str,
+    manifest: Dict,
+    vocabulary: Dict[str, int],
+    idf: np.ndarray,
+    matrix: csr_matrix,
+    chunks: ChunkStore,
+):
+    """
+    Write the index artifact to a temp directory and swap it into place, so
+    readers in other processes never observe a half-written index.
+    """
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = f"{index_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    try:
+        terms = [None] * len(vocabulary)
+        for term, col in vocabulary.items():
+            terms[col] = term
+        with open(os.path.join(tmp_dir, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"shape": list(matrix.shape)}, f)
+        chunks.save(tmp_dir)
+
+        arrays = {
+            "idf": np.asarray(idf),
+            "data": matrix.data,
+            "indices": matrix.indices,
+            "indptr": matrix.indptr,
+        }
+        for name in ARRAY_FILES:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), arrays[name])
+
+        # Manifest last: its presence marks the artifact as complete.
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        old_dir = f"{index_dir}.{os.getpid()}.old"
+        if os.path.exists(index_dir):
+            os.replace(index_dir, old_dir)
+        os.replace(tmp_dir, index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    except Exception as e:
+        logger.warning("Could not persist index to %s: %s", index_dir, e)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_index(index_dir: str) -> Optional[Dict]:
+    """
+    Load a saved index. Numeric arrays and the chunk store columns are
+    memory-mapped read-only, so pages are shared between processes that open
+    the same artifact.
+    """
+    try:
+        with open(os.path.join(index_dir, VOCAB_FILE), "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        with open(os.path.join(index_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        arrays = {
+            name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+            for name in ARRAY_FILES
+        }
+        matrix = csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=tuple(meta["shape"]),
+            copy=False,
+        )
+        return {
+            "vocabulary": {t: i for i, t in enumerate(terms)},
+            "idf": np.asarray(arrays["idf"]),
+            "matrix": matrix,
+            "chunks": ChunkStore.load(index_dir, mmap=True),
+        }
+    except Exception as e:
+        logger.warning("Could not load cached index from %s: %s", index_dir, e)
+        return None
@@ -0,0 +1,83 @@
+# src/ingest.py
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.chunker import chunk_text
+from src.pdf_pages import PageCache, iter_pages
+
+
+@dataclass(frozen=True)
+class ChunkConfig:
+    """
+    Everything that turning a source file into chunk rows depends on.
+    Small and picklable, so index-build workers get exactly this and no
+    Retriever state.
+    """
+
+    data_dir: str
+    chunk_size: int
+    chunk_overlap: int
+    chunk_strategy: str
+    # Extracted PDF page text (see pdf_pages.PageCache); None extracts
+    # pages while chunking.
+    page_cache_dir: Optional[str] = None
+    # Content hash of every indexed PDF by path: its page cache key.
+    pdf_digests: Dict[str, str] = field(default_factory=dict)
+
+
+def read_txt(path: str) -> str:
+    """Raw file text; whitespace is normalized later, by the chunker."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except Exception:
+        try:
+            with open(path, "r", encoding="latin-1") as f:
+                return f.read()
+        except Exception:
+            return ""
+
+
+def subject_of(data_dir: str, path: str) -> str:
+    """"folder/filename" (no extension) of a file under data_dir."""
+    rel = os.path.relpath(path, data_dir)
+    folder = os.path.dirname(rel).replace(os.sep, "/")
+    filename = os.path.splitext(os.path.basename(path))[0]
+    return f"{folder}/{filename}" if folder and folder != "." else filename
+
+
+def pdf_pages(config: ChunkConfig, path: str) -> Iterator[Tuple[int, str]]:
+    """(page number, text) of a PDF, from the page cache when it holds the book."""
+    digest = config.pdf_digests.get(path)
+    if config.page_cache_dir and digest:
+        cache = PageCache(config.page_cache_dir)
+        if cache.count(digest) is not None:
+            return cache.pages(digest)
+    return iter_pages(path)
+
+
+def chunk_file(config: ChunkConfig, path: str) -> List[Dict]:
+    """
+    Read one file and return its chunk metadata rows. PDFs are chunked
+    page by page: "page" is the PDF page number, "chunk_id" counts
+    chunks within the page and "start"/"end" are offsets into the
+    page's extracted text.
+    """
+    subject = subject_of(config.data_dir, path)
+    params = {
+        "strategy": config.chunk_strategy,
+        "chunk_size": config.chunk_size,
+        "chunk_overlap": config.chunk_overlap,
+    }
+
+    rows = []
+    if not path.lower().endswith(".pdf"):
+        for chunk in chunk_text(read_txt(path), **params):
+            rows.append({"subject": subject, **chunk})
+        return rows
+
+    for number, text in pdf_pages(config, path):
+        for chunk_id, chunk in enumerate(chunk_text(text, **params), start=1):
+            rows.append({"subject": subject, **chunk, "page": number, "chunk_id": chunk_id})
+    return rows
@@ -0,0 +1,305 @@
+# src/model_client.py
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, replace
+from functools import partial
+from typing import Dict, Iterator, Optional
+
+from src import tracing
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+# Transient API failures, matched by class name (google.api_core) or HTTP
+# status so this module does not have to import the SDK.
+_RETRYABLE_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "GatewayTimeout", "DeadlineExceeded", "Aborted",
+}
+_RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+_END = object()
+
+
+class ModelTimeout(TimeoutError):
+    """The call's deadline passed before the model finished answering."""
+
+
+@dataclass
+class ModelResult:
+    status: str  # OK, TIMEOUT or ERROR
+    text: str = ""
+    attempts: int = 0
+    latency: float = 0.0
+    error: Optional[str] = None
+    coalesced: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status == OK
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if type(exc).__name__ in _RETRYABLE_NAMES:
+        return True
+    try:
+        return int(getattr(exc, "code", 0)) in _RETRYABLE_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+def prompt_key(model_name: str, prompt) -> str:
+    """Identity of a request, for coalescing: model plus every prompt part (text or image bytes)."""
+    h = hashlib.sha256(model_name.encode("utf-8"))
+    for part in prompt if isinstance(prompt, list) else [prompt]:
+        if isinstance(part, dict):
+            h.update(b"\x00part:" + str(part.get("mime_type", "")).encode("utf-8") + b"\x00")
+            h.update(bytes(part.get("data", b"")))
+        else:
+            h.update(b"\x00text:")
+            h.update(str(part).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ModelClient:
+    """
+    Process-wide asyncio client for model backends (see src/backends.py).
+
+    A private event loop runs on a daemon thread, so synchronous callers
+    (Streamlit script runs) use call() / stream() and async code can await
+    acall(). All callers share one semaphore of `max_concurrency` slots.
+    Every call has a deadline (`timeout` seconds, including time spent
+    waiting for a slot and between retries). Retryable errors are retried up
+    to `max_retries` times with full-jitter exponential backoff. Identical
+    prompts already in flight are coalesced onto the same call.
+
+    Backend calls run on a thread pool and receive the remaining time as
+    `timeout`, so the transport gives up as well when a deadline passes.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        timeout: float = 60.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="model-client", daemon=True)
+        self._thread.start()
+        self._executor = ThreadPoolExecutor(max_workers=2 * max_concurrency, thread_name_prefix="model-call")
+        self._slots = self._run(self._make_semaphore())
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "coalesced": 0, "retries": 0, "timeouts": 0, "errors": 0}
+
+    async def _make_semaphore(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+        tracing.count(f"model_client_{name}")
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["in_flight"] = len(self._inflight)
+        return stats
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._executor.shutdown(wait=False)
+
+    # ---------- Single calls ----------
+
+    def call(self, backend, prompt, timeout: Optional[float] = None) -> ModelResult:
+        """backend.generate(prompt) under the client's limits. Never raises."""
+        return self._run(self._coalesced(backend, prompt, timeout))
+
+    async def acall(self, backend, prompt, timeout: Optional[float] = None) -> ModelResult:
+        """Awaitable call(), usable from any event loop."""
+        future = asyncio.run_coroutine_threadsafe(self._coalesced(backend, prompt, timeout), self._loop)
+        return await asyncio.wrap_future(future)
+
+    async def _coalesced(self, backend, prompt, timeout: Optional[float]) -> ModelResult:
+        key = prompt_key(backend.model_name, prompt)
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count("coalesced")
+            return replace(await asyncio.shield(task), coalesced=True)
+
+        task = self._loop.create_task(self._call(backend, prompt, timeout))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _attempt(self, backend, prompt, remaining: float) -> str:
+        await self._slots.acquire()
+        try:
+            future = self._executor.submit(partial(backend.generate, prompt, timeout=remaining))
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is freed when the backend call returns, not when this
+        # attempt is cancelled on timeout: a call still running on the pool
+        # keeps counting against max_concurrency.
+        future.add_done_callback(self._release_soon)
+        return await asyncio.wrap_future(future)
+
+    def _release_soon(self, *_):
+        """Release a slot from any thread."""
+        self._loop.call_soon_threadsafe(self._slots.release)
+
+    async def _call(self, backend, prompt, timeout: Optional[float]) -> ModelResult:
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        attempts = 0
+        self._count("calls")
+
+        while True:
+            attempts += 1
+            remaining = deadline - time.monotonic()
+            attempt = self._loop.create_task(self._attempt(backend, prompt, remaining))
+            done, _ = await asyncio.wait({attempt}, timeout=max(remaining, 0))
+            if not done:
+                attempt.cancel()
+                self._count("timeouts")
+                logger.warning("Model call timed out after %.1fs (%d attempts)", timeout, attempts)
+                return ModelResult(
+                    TIMEOUT, "", attempts, time.monotonic() - start, f"no answer within {timeout:.1f}s"
+                )
+
+            try:
+                text = attempt.result()
+                return ModelResult(OK, text or "", attempts, time.monotonic() - start)
+            except Exception as e:
+                delay = self._backoff(attempts)
+                if (
+                    attempts > self.max_retries
+                    or not is_retryable(e)
+                    or time.monotonic() + delay >= deadline
+                ):
+                    self._count("errors")
+                    logger.warning("Model call failed after %d attempts: %s", attempts, e)
+                    return ModelResult(
+                        ERROR, "", attempts, time.monotonic() - start, f"{type(e).__name__}: {e}"
+                    )
+                self._count("retries")
+                logger.info("Retrying model call in %.2fs after: %s", delay, e)
+                await asyncio.sleep(delay)
+
+    # ---------- Streaming ----------
+
+    def stream(self, backend, prompt, timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        backend.generate_stream(prompt) under the client's limits, holding a
+        slot until the stream ends or is closed. The deadline covers the
+        whole stream. Failures before the first delta are retried like
+        call(); afterwards they propagate. Raises ModelTimeout on deadline.
+        Streams are not coalesced. A stream cut off by its deadline keeps
+        its slot until the pending backend read returns.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        attempts = 0
+        self._count("calls")
+
+        while True:
+            attempts += 1
+            emitted = False
+            timed_out = False
+            self._acquire(deadline)
+            source = None
+            pending = None
+            try:
+                source = iter(backend.generate_stream(prompt, timeout=deadline - time.monotonic()))
+                while True:
+                    pending = self._executor.submit(next, source, _END)
+                    delta = self._wait(pending, deadline)
+                    if delta is _END:
+                        return
+                    emitted = True
+                    yield delta
+            except ModelTimeout:
+                timed_out = True
+                self._count("timeouts")
+                raise
+            except Exception as e:
+                delay = self._backoff(attempts)
+                if (
+                    emitted
+                    or attempts > self.max_retries
+                    or not is_retryable(e)
+                    or time.monotonic() + delay >= deadline
+                ):
+                    self._count("errors")
+                    raise
+                self._count("retries")
+                logger.info("Retrying model stream in %.2fs after: %s", delay, e)
+            finally:
+                if timed_out and pending is not None:
+                    # The timed-out read may still be running on the pool;
+                    # leave it be, and free the slot once it returns.
+                    pending.add_done_callback(self._release_soon)
+                else:
+                    self._release_soon()
+                    if source is not None and hasattr(source, "close"):
+                        source.close()
+            time.sleep(delay)
+
+    def _acquire(self, deadline: float):
+        remaining = max(deadline - time.monotonic(), 0)
+        try:
+            self._run(asyncio.wait_for(self._slots.acquire(), remaining))
+        except (asyncio.TimeoutError, FutureTimeout):
+            self._count("timeouts")
+            raise ModelTimeout("no free model slot before the deadline") from None
+
+    def _wait(self, future, deadline: float):
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            if future.done():
+                raise  # the backend's own transport timeout
+            raise ModelTimeout("model stream exceeded its deadline") from None
+
+
+_default_client: Optional[ModelClient] = None
+_default_lock = threading.Lock()
+
+
+def default_client() -> ModelClient:
+    """The process-wide client shared by GeminiGenerator and VisionExtractor."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = ModelClient()
+        return _default_client
@@ -0,0 +1,136 @@
+# src/pdf_pages.py
+import os
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PAGES_FILE = "pages.json"
+# Pages extracted per pool task; one task opens the PDF once for all of them.
+PAGES_PER_TASK = 16
+
+
+def _open(path: str):
+    from pypdf import PdfReader  # only needed when PDFs are indexed
+
+    reader = PdfReader(path)
+    if reader.is_encrypted:
+        reader.decrypt("")
+    return reader
+
+
+def page_count(path: str) -> int:
+    try:
+        return len(_open(path).pages)
+    except Exception as e:
+        logger.warning("Could not read PDF %s: %s", path, e)
+        return 0
+
+
+def _extract(reader, number: int, path: str) -> str:
+    try:
+        return reader.pages[number - 1].extract_text() or ""
+    except Exception as e:
+        logger.warning("Could not extract page %d of %s: %s", number, path, e)
+        return ""
+
+
+def iter_pages(path: str) -> Iterator[Tuple[int, str]]:
+    """(1-based page number, text) of every page, extracted one at a time."""
+    try:
+        reader = _open(path)
+        n = len(reader.pages)
+    except Exception as e:
+        logger.warning("Could not read PDF %s: %s", path, e)
+        return
+    for number in range(1, n + 1):
+        yield number, _extract(reader, number, path)
+
+
+class PageCache:
+    """
+    Extracted PDF page text on disk: <root>/<sha256 of the file>/<page>.txt.
+
+    Keyed on content, so a book is extracted once however often the index is
+    rebuilt, moved or renamed. extract() fills the cache with a process pool,
+    splitting every book into page ranges; pages() streams a book back one
+    page at a time. A book is complete once its PAGES_FILE is written.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest)
+
+    def count(self, digest: str) -> Optional[int]:
+        """Page count of a fully extracted book, or None."""
+        try:
+            with open(os.path.join(self._dir(digest), PAGES_FILE), "r", encoding="utf-8") as f:
+                return int(json.load(f)["pages"])
+        except Exception:
+            return None
+
+    def pages(self, digest: str) -> Iterator[Tuple[int, str]]:
+        for number in range(1, (self.count(digest) or 0) + 1):
+            try:
+                with open(_page_path(self._dir(digest), number), "r", encoding="utf-8") as f:
+                    yield number, f.read()
+            except OSError:
+                yield number, ""
+
+    def extract(self, books: List[Tuple[str, str]], workers: Optional[int] = None):
+        """
+        Extract every (path, sha256) book not cached yet. workers=1 runs in
+        this process; None uses every core.
+        """
+        todo = [(path, digest) for path, digest in books if self.count(digest) is None]
+        if not todo:
+            return
+        tasks = []
+        counts = {}
+        for path, digest in todo:
+            n = counts[digest] = page_count(path)
+            os.makedirs(self._dir(digest), exist_ok=True)
+            for first in range(1, n + 1, PAGES_PER_TASK):
+                tasks.append((path, self._dir(digest), first, min(first + PAGES_PER_TASK, n + 1)))
+
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                list(pool.map(_extract_range, *zip(*tasks)))
+        else:
+            for task in tasks:
+                _extract_range(*task)
+
+        for digest, n in counts.items():
+            _write_atomic(os.path.join(self._dir(digest), PAGES_FILE), json.dumps({"pages": n}))
+
+
+def _page_path(directory: str, number: int) -> str:
+    return os.path.join(directory, f"{number:05d}.txt")
+
+
+def _write_atomic(path: str, text: str):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _extract_range(path: str, directory: str, first: int, end: int) -> int:
+    """Process-pool worker: write pages [first, end) of one PDF to the cache."""
+    missing = [n for n in range(first, end) if not os.path.exists(_page_path(directory, n))]
+    if not missing:
+        return 0
+    try:
+        reader = _open(path)
+    except Exception as e:
+        logger.warning("Could not read PDF %s: %s", path, e)
+        reader = None
+    for number in missing:
+        text = _extract(reader, number, path) if reader is not None else ""
+        _write_atomic(_page_path(directory, number), text)
+    return len(missing)
@@ -0,0 +1,198 @@
+# src/reranker.py
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+from src.chunk_store import ChunkStore
+from src.tracing import count
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _norm(token: str) -> str:
+    """Lowercase and strip a plural "s", so "deadlocks" matches "deadlock"."""
+    token = token.lower()
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct normalized content words of the query, in order."""
+    seen = []
+    for token in _WORD_RE.findall(query.lower()):
+        if len(token) > 1 and token not in ENGLISH_STOP_WORDS:
+            t = _norm(token)
+            if t not in seen:
+                seen.append(t)
+    return seen
+
+
+def term_pattern(terms: List[str]) -> "re.Pattern":
+    """Regex matching any of the (normalized) terms as a word, plural or not."""
+    alternatives = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+    return re.compile(r"\b(" + alternatives + r")s?\b", re.IGNORECASE)
+
+
+def proximity(terms: List[str], text: str, pattern: Optional["re.Pattern"] = None) -> float:
+    """
+    How tightly the query terms cluster in text: coverage of the distinct
+    terms found times their density in the shortest word window holding
+    all of them. 0 when fewer than two terms occur.
+    """
+    wanted = {t: i for i, t in enumerate(terms)}
+    pattern = pattern or term_pattern(terms)
+    hits = [(m.start(), wanted[m.group(1).lower()]) for m in pattern.finditer(text)]
+    found = len({i for _, i in hits})
+    if found < 2:
+        return 0.0
+
+    # Shortest window containing every found term (two pointers over hits),
+    # measured in words.
+    best = None
+    inside: Dict[int, int] = {}
+    lo = 0
+    for pos, i in hits:
+        inside[i] = inside.get(i, 0) + 1
+        while len(inside) == found:
+            width = text.count(" ", hits[lo][0], pos) + 1
+            best = width if best is None else min(best, width)
+            j = hits[lo][1]
+            inside[j] -= 1
+            if not inside[j]:
+                del inside[j]
+            lo += 1
+    return (found / len(terms)) * min(1.0, found / best)
+
+
+class Reranker:
+    """
+    Second stage of the "rerank" retrieval backend. The first stage (BM25
+    unigram postings, in Retriever) pulls `candidates` chunks; rerank()
+    re-scores only those with
+
+      - the TF-IDF cosine of the candidate rows (`w_cosine`);
+      - phrase matches: share of the query's bigram features present in
+        the chunk (`w_phrase`);
+      - term proximity in the chunk text (`w_proximity`);
+      - subject-title overlap, e.g. "deadlock" in OS/deadlocks (`w_subject`);
+
+    then picks top_k by maximal marginal relevance, so near-duplicate
+    chunks do not fill every slot (`mmr_lambda` = 1 disables it).
+
+    Each stage has a latency budget in ms. When the candidate stage overruns
+    `candidate_budget_ms`, only its best candidates go on to the rerank,
+    cut in proportion to the overrun (see cut_candidates). Proximity is
+    computed in first-stage order; when `rerank_budget_ms` runs out the
+    pool is cut to the candidates scored so far. Overruns are counted in
+    the rerank_over_budget metric per stage.
+    """
+
+    def __init__(
+        self,
+        candidates: int = 200,
+        candidate_budget_ms: Optional[float] = 10.0,
+        rerank_budget_ms: Optional[float] = 5.0,
+        w_cosine: float = 1.0,
+        w_phrase: float = 0.15,
+        w_proximity: float = 0.1,
+        w_subject: float = 0.1,
+        mmr_lambda: float = 0.7,
+    ):
+        self.candidates = candidates
+        self.candidate_budget_ms = candidate_budget_ms
+        self.rerank_budget_ms = rerank_budget_ms
+        self.w_cosine = w_cosine
+        self.w_phrase = w_phrase
+        self.w_proximity = w_proximity
+        self.w_subject = w_subject
+        self.mmr_lambda = mmr_lambda
+
+    def check_budget(self, stage: str, elapsed: float) -> bool:
+        """Count an overrun of `stage`'s budget; True when within it."""
+        budget = self.candidate_budget_ms if stage == "candidates" else self.rerank_budget_ms
+        if budget is not None and elapsed * 1000 > budget:
+            count("rerank_over_budget", stage=stage)
+            return False
+        return True
+
+    def cut_candidates(self, rows: np.ndarray, elapsed: float, k: int) -> np.ndarray:
+        """
+        The first-stage `rows` (best first) passed on to rerank(), given the
+        candidate stage took `elapsed` seconds: all of them within budget,
+        else the best len(rows) * budget / elapsed of them (at least k).
+        """
+        if self.check_budget("candidates", elapsed):
+            return rows
+        keep = max(k, int(len(rows) * self.candidate_budget_ms / (elapsed * 1000)))
+        return rows[:keep]
+
+    def rerank(
+        self,
+        query: str,
+        q_vec: csr_matrix,
+        rows: np.ndarray,
+        rows_matrix: csr_matrix,
+        chunks: ChunkStore,
+        bigram: np.ndarray,
+        k: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Re-score candidate `rows` (first-stage order, best first) whose TF-IDF
+        rows are `rows_matrix`; `bigram` flags the vocabulary's bigram columns.
+        Returns the top k (row ids, scores), best first.
+        """
+        start = time.perf_counter()
+        if not len(rows):
+            return rows, np.empty(0)
+        terms = query_terms(query)
+
+        prox = np.zeros(len(rows))
+        done = len(rows)
+        if self.w_proximity and len(terms) > 1:
+            pattern = term_pattern(terms)
+            for n, row in enumerate(rows):
+                if n >= k and not self.check_budget("rerank", time.perf_counter() - start):
+                    done = n
+                    break
+                prox[n] = proximity(terms, chunks.text(int(row)), pattern)
+        rows, rows_matrix, prox = rows[:done], rows_matrix[:done], prox[:done]
+
+        score = self.w_cosine * np.asarray(rows_matrix @ q_vec.T.toarray()).ravel()
+        score += self.w_proximity * prox
+
+        q_bigrams = q_vec.indices[bigram[q_vec.indices]]
+        if self.w_phrase and len(q_bigrams):
+            present = np.asarray((rows_matrix[:, q_bigrams] != 0).sum(axis=1)).ravel()
+            score += self.w_phrase * present / len(q_bigrams)
+
+        if self.w_subject and terms:
+            overlap: Dict[int, float] = {}
+            sids = np.asarray(chunks.subject_ids)[rows]
+            for sid in np.unique(sids):
+                words = {_norm(w) for w in _WORD_RE.findall(chunks.subjects[sid].replace("_", " "))}
+                overlap[sid] = sum(t in words for t in terms) / len(terms)
+            score += self.w_subject * np.array([overlap[s] for s in sids])
+
+        order = self._mmr(score, rows_matrix, k)
+        return rows[order], score[order]
+
+    def _mmr(self, score: np.ndarray, rows_matrix: csr_matrix, k: int) -> np.ndarray:
+        """Greedy maximal marginal relevance over the best 4*k by score."""
+        pool = np.argsort(-score, kind="stable")[: max(k * 4, k)]
+        if self.mmr_lambda >= 1 or len(pool) <= 1:
+            return pool[:k]
+        # Rows are L2-normalized, so this is their cosine similarity.
+        sim = (rows_matrix[pool] @ rows_matrix[pool].T).toarray()
+        rel = score[pool] / (score[pool].max() or 1.0)
+        chosen = [0]
+        max_sim = sim[0].copy()
+        while len(chosen) < min(k, len(pool)):
+            mmr = self.mmr_lambda * rel - (1 - self.mmr_lambda) * max_sim
+            mmr[chosen] = -np.inf
+            nxt = int(np.argmax(mmr))
+            chosen.append(nxt)
+            np.maximum(max_sim, sim[nxt], out=max_sim)
+        return pool[chosen]
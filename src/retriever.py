@@ -1,21 +1,45 @@
 import os
-import re
-from typing import List, Dict, Optional
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+from scipy.sparse import csr_matrix, vstack
 import numpy as np
 
+from src import index_store
+from src.chunker import chunk_text, clean_text  # noqa: F401  (re-exported)
+from src.bm25 import BM25Index
+from src.compact import Compaction, HashedTfidfVectorizer, drop_columns
+from src.dedup import near_duplicates
+from src.ingest import ChunkConfig, chunk_file
+from src.pdf_pages import PageCache
+from src.ranking import top_k_indices
+from src.dense import DenseIndex, reciprocal_rank_fusion
+from src.reranker import Reranker
+from src.cache import LRUCache, normalize_query
+from src.tracing import count, span
+from src.chunk_store import ChunkStore, ChunkStoreBuilder
+
 ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(ROOT_DIR, "data")
+INDEX_DIR = os.path.join(ROOT_DIR, ".index_cache")
+PAGE_CACHE_DIR = os.path.join(ROOT_DIR, ".page_cache")
+SOURCE_EXTENSIONS = (".txt", ".pdf")
+BACKENDS = ("tfidf", "bm25", "dense", "hybrid", "rerank")
+# Subdirectory of index_dir holding the persisted DenseIndex.
+DENSE_DIR = "dense"
+# Results taken from each ranking before hybrid fusion, and the RRF constant.
+HYBRID_DEPTH = 50
+RRF_K = 60
+
+logger = logging.getLogger(__name__)
 
 
-def clean_text(text: str) -> str:
-    if not text:
-        return ""
-    text = text.replace("\u200b", "")
-    text = re.sub(r"[^\x09\x0A\x0D\x20-\x7E\u0080-\uFFFF]+", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+def result_ids(results: List[Dict]) -> List[Tuple[str, int, int]]:
+    """(subject, page, chunk_id) of each result, the key comparisons match on."""
+    return [(r["subject"], r["page"], r["chunk_id"]) for r in results]
 
 
 class Retriever:
@@ -24,163 +48,1138 @@ class Retriever:
         data_dir: str = DATA_DIR,
         chunk_size: int = 900,
         chunk_overlap: int = 100,
+        chunk_strategy: str = "sentence",
+        index_dir: Optional[str] = INDEX_DIR,
+        refit_threshold: float = 0.2,
+        backend: str = "tfidf",
+        workers: Optional[int] = 1,
+        cache_entries: int = 1024,
+        cache_bytes: int = 32 * 1024 * 1024,
+        route_subjects: int = 0,
+        dense_dim: int = 128,
+        reranker: Optional[Reranker] = None,
+        compaction: Optional[Compaction] = None,
+        page_cache_dir: Optional[str] = PAGE_CACHE_DIR,
+        extract_workers: Optional[int] = None,
+        dedup_threshold: Optional[float] = None,
     ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown retrieval backend {backend!r}; expected one of {BACKENDS}")
         self.data_dir = data_dir
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        # "sentence", "paragraph" or "window"; see chunker.chunk_text.
+        self.chunk_strategy = chunk_strategy
+        # Where the built index is persisted; None disables the on-disk cache.
+        self.index_dir = index_dir
+        # Fraction of rows touched by incremental reloads (since the last full
+        # fit) after which the vocabulary and IDF are refitted from scratch.
+        self.refit_threshold = refit_threshold
+        # Ranking engine used by retrieve(): brute-force TF-IDF cosine or the
+        # BM25 inverted index (built lazily on first use).
+        self.backend = backend
+        # Processes for full index builds: 1 builds serially, None uses every
+        # core. Parallel builds shard by top-level subject folder.
+        self.workers = workers
+        # Default for retrieve(route=...): search only this many subjects,
+        # picked by centroid similarity to the query; 0 searches everything.
+        self.route_subjects = route_subjects
+        # LSA dimensions of the "dense" backend (fitted lazily on first use).
+        self.dense_dim = dense_dim
+        # Second stage (and stage budgets) of the two-stage "rerank" backend.
+        self.reranker = reranker or Reranker()
+        # Storage of the TF-IDF index (dtype, vocabulary pruning, per-row
+        # sparsification, hashed features); the default is the exact index.
+        self.compaction = compaction or Compaction()
+        # Extracted PDF page text, keyed on file hash (see pdf_pages.PageCache);
+        # None extracts pages serially while chunking, without caching.
+        self.page_cache_dir = page_cache_dir
+        # Processes extracting PDF pages into the cache; None uses every core.
+        self.extract_workers = extract_workers
+        # Content hash of every indexed PDF, from the manifest: its cache key.
+        self._pdf_digests: Dict[str, str] = {}
+        # Chunks whose unigram/bigram sets overlap at least this much (Jaccard)
+        # are collapsed into one row at build time, keeping back-references
+        # to every copy (e.g. dedup.DEFAULT_THRESHOLD); None keeps every chunk.
+        self.dedup_threshold = dedup_threshold
 
-        self.chunks: List[Dict] = []
+        self.chunks: ChunkStore = ChunkStore.empty()
         self.vectorizer: Optional[TfidfVectorizer] = None
         self.tfidf_matrix = None
+        # Manifest of the files the current index was built from, with the
+        # number of rows each file contributes (see index_store.build_manifest).
+        self._manifest: Optional[Dict] = None
+        self._bm25: Optional[BM25Index] = None
+        self._dense: Optional[DenseIndex] = None
+        # True for the vocabulary's bigram columns (phrase features).
+        self._bigram_cols: Optional[np.ndarray] = None
+        # subject -> [start, end) row ranges, and the subject centroid matrix
+        # used for routing; both derived lazily from chunks/tfidf_matrix.
+        self._subject_ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None
+        self._centroids: Optional[Tuple[List[str], csr_matrix]] = None
+        # (manifest, first row of every file, file paths), derived from the
+        # manifest's per-file row counts; see _file_rows().
+        self._file_starts: Optional[Tuple[Dict, np.ndarray, List[str]]] = None
+        # Bumped whenever the indexed chunks change; part of every cache key
+        # so results are never served across a reindex.
+        self.generation = 0
+        # Result cache keyed on (generation, backend, normalized query, top_k,
+        # scope);
+        # cache_entries=0 disables it.
+        self._result_cache: Optional[LRUCache] = None
+        if cache_entries:
+            self._result_cache = LRUCache(
+                max_entries=cache_entries, max_bytes=cache_bytes, sizeof=_results_size
+            )
 
         self._load_and_index()
 
-    def _list_txt_files(self) -> List[str]:
-        """Recursively list all .txt files under data_dir."""
-        txt_files = []
+    def _list_source_files(self) -> List[str]:
+        """Recursively list all .txt and .pdf files under data_dir."""
+        source_files = []
         if not os.path.exists(self.data_dir):
             return []
         for root, dirs, files in os.walk(self.data_dir):
             for f in files:
-                if f.lower().endswith(".txt"):
-                    txt_files.append(os.path.join(root, f))
-        txt_files.sort()
-        return txt_files
-
-    def _read_txt(self, path: str) -> str:
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                text = f.read()
-            return clean_text(text)
-        except Exception:
-            try:
-                with open(path, "r", encoding="latin-1") as f:
-                    text = f.read()
-                return clean_text(text)
-            except Exception:
-                return ""
-
-    def _split_paragraphs(self, text: str) -> List[str]:
-        """Split text into paragraphs using blank lines; fallback to sentence-based packing."""
-        if not text:
-            return []
-        paragraphs = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
-
-        # If document doesn't have blank-lines, split by sentences and pack into chunk_size
-        if len(paragraphs) <= 1:
-            sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if s.strip()]
-            paragraphs = []
-            acc = ""
-            for s in sentences:
-                if len(acc) + len(s) + 1 <= self.chunk_size:
-                    acc = (acc + " " + s).strip()
-                else:
-                    if acc:
-                        paragraphs.append(acc)
-                    acc = s
-            if acc:
-                paragraphs.append(acc)
-        return paragraphs
-
-    def _split_long_paragraph(self, p: str) -> List[str]:
-        """Split long paragraph using sliding-window with overlap."""
-        if len(p) <= self.chunk_size:
-            return [p]
-        chunks = []
-        start = 0
-        L = len(p)
-        while start < L:
-            end = start + self.chunk_size
-            chunk = p[start:end].strip()
-            chunks.append(chunk)
-            start = end - self.chunk_overlap
-            if start < 0:
-                start = 0
-            if start >= L - 1:
-                break
-        return chunks
-
-    def _chunk_file(self, text: str) -> List[str]:
-        paragraphs = self._split_paragraphs(text)
-        final_chunks = []
-
-        for p in paragraphs:
-            if len(p) <= self.chunk_size:
-                final_chunks.append(p)
-            else:
-                parts = self._split_long_paragraph(p)
-                final_chunks.extend(parts)
+                if f.lower().endswith(SOURCE_EXTENSIONS):
+                    source_files.append(os.path.join(root, f))
+        source_files.sort()
+        return source_files
 
-        return final_chunks
+    def _index_params(self) -> Dict:
+        """Everything besides file contents that changes the built index."""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "chunk_strategy": self.chunk_strategy,
+            "stop_words": "english",
+            "ngram_range": [1, 2],
+            "dedup_threshold": self.dedup_threshold,
+            **self.compaction.params(),
+        }
 
     def _load_and_index(self):
-        """Load all txt files, chunk them, and build TF-IDF index."""
-        self.chunks = []
-        txt_paths = self._list_txt_files()
-
-        for path in txt_paths:
-            rel = os.path.relpath(path, self.data_dir)
-            folder = os.path.dirname(rel)
-            filename = os.path.splitext(os.path.basename(path))[0]
-            subject = f"{folder}/{filename}" if folder and folder != "." else filename
-
-            full_text = self._read_txt(path)
-            paragraphs = self._split_paragraphs(full_text)
-
-            for page_num, para in enumerate(paragraphs, start=1):
-                para_chunks = self._chunk_file(para)
-
-                for cid, ctext in enumerate(para_chunks, start=1):
-                    self.chunks.append(
-                        {
-                            "subject": subject,
-                            "page": page_num,
-                            "chunk_id": cid,
-                            "text": ctext,
-                        }
+        """Load the persisted index if it still matches data_dir, else rebuild it."""
+        source_paths = self._list_source_files()
+        stored = index_store.read_manifest(self.index_dir) if self.index_dir else None
+        manifest = index_store.build_manifest(
+            self.data_dir, source_paths, self._index_params(), previous=stored
+        )
+
+        if self.index_dir and index_store.manifest_matches(stored, manifest):
+            loaded = index_store.load_index(self.index_dir)
+            if loaded is not None:
+                self._apply_loaded_index(loaded)
+                self._manifest = manifest
+                if stored != manifest:
+                    index_store.write_manifest(self.index_dir, manifest)
+                return
+
+        self._build_index(source_paths, manifest)
+
+    def _invalidate_derived(self):
+        """Drop structures derived from chunks/tfidf_matrix after they change."""
+        self._bm25 = None
+        self._dense = None
+        self._bigram_cols = None
+        self._subject_ranges = None
+        self._centroids = None
+        self.generation += 1
+        if self._result_cache is not None:
+            self._result_cache.clear()
+
+    def _apply_loaded_index(self, loaded: Dict):
+        self._invalidate_derived()
+        self.chunks = loaded["chunks"]
+        self.vectorizer = self._new_vectorizer()
+        if not self.compaction.hashed:
+            self.vectorizer.vocabulary_ = loaded["vocabulary"]
+        self.vectorizer.idf_ = loaded["idf"]
+        self.tfidf_matrix = loaded["matrix"]
+
+    def _new_vectorizer(self):
+        """A TfidfVectorizer, or a HashedTfidfVectorizer for hashed-feature indexes."""
+        return self.compaction.new_vectorizer()
+
+    def _chunk_config(self) -> ChunkConfig:
+        return ChunkConfig(
+            data_dir=self.data_dir,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            chunk_strategy=self.chunk_strategy,
+            page_cache_dir=self.page_cache_dir,
+            pdf_digests=dict(self._pdf_digests),
+        )
+
+    def _save_index(self):
+        if not self.index_dir or self.vectorizer is None:
+            return
+        index_store.save_index(
+            self.index_dir,
+            self._manifest,
+            self.vectorizer.vocabulary_,
+            self.vectorizer.idf_,
+            self.tfidf_matrix,
+            self.chunks,
+        )
+
+    def _prepare_pdfs(self, paths: List[str], manifest: Dict, extract: Iterable[str]):
+        """
+        Record the content hash of every PDF in `paths` (in manifest order)
+        and extract the pages of those in `extract` into the page cache,
+        in parallel, before chunking reads them.
+        """
+        self._pdf_digests = {
+            path: entry["sha256"]
+            for path, entry in zip(paths, manifest["files"])
+            if path.lower().endswith(".pdf")
+        }
+        books = [(path, self._pdf_digests[path]) for path in extract if path in self._pdf_digests]
+        if not books or not self.page_cache_dir:
+            return
+        with span("index.pdf_extract", books=len(books)):
+            try:
+                PageCache(self.page_cache_dir).extract(books, workers=self.extract_workers)
+            except OSError as e:
+                # Chunking falls back to extracting uncached pages serially.
+                logger.warning("Could not fill the PDF page cache in %s: %s", self.page_cache_dir, e)
+
+    def _build_index(self, source_paths: List[str], manifest: Dict):
+        """
+        Full build of the index from every file in source_paths, then saved
+        to index_dir. PDF pages are first extracted into the page cache.
+        Files are chunked and their terms counted in shards (one per
+        top-level folder, in a process pool when workers > 1), streaming
+        rows into a columnar ChunkStore; _merge_shards joins the shards into
+        the (optionally deduplicated and compacted) TF-IDF matrix. The
+        manifest gets every file's row count and a fresh fit.
+        """
+        self._invalidate_derived()
+        self._prepare_pdfs(source_paths, manifest, source_paths)
+        config = self._chunk_config()
+
+        workers = self.workers or os.cpu_count() or 1
+        if workers > 1 and len(source_paths) > 1:
+            shards: Dict[str, List[str]] = {}
+            for path in source_paths:
+                shards.setdefault(self._shard_key(path), []).append(path)
+            shard_paths = list(shards.values())
+            with ProcessPoolExecutor(max_workers=min(workers, len(shard_paths))) as pool:
+                results = list(
+                    pool.map(
+                        _chunk_and_count_shard,
+                        [config] * len(shard_paths),
+                        [self.compaction] * len(shard_paths),
+                        shard_paths,
                     )
+                )
+        else:
+            shard_paths = [source_paths]
+            results = [_chunk_and_count_shard(config, self.compaction, source_paths)]
+
+        per_file = self._merge_shards(source_paths, shard_paths, results, manifest)
+        for entry, n_rows in zip(manifest["files"], per_file):
+            entry["rows"] = n_rows
+
+        manifest["fit"] = {"rows": len(self.chunks), "drift": 0}
+        self._manifest = manifest
+        self._save_index()
 
-        texts = [c["text"] for c in self.chunks]
+    def _shard_key(self, path: str) -> str:
+        rel = os.path.relpath(path, self.data_dir)
+        parts = rel.split(os.sep)
+        return parts[0] if len(parts) > 1 else ""
 
-        if texts:
-            self.vectorizer = TfidfVectorizer(stop_words="english", ngram_range=(1, 2))
-            self.tfidf_matrix = self.vectorizer.fit_transform(texts)
+    def _merge_shards(
+        self, source_paths: List[str], shard_paths: List[List[str]], results, manifest: Dict
+    ) -> List[int]:
+        """
+        Merge per-shard chunks and term counts into the TF-IDF index.
+
+        Shard vocabularies are merged into the sorted global vocabulary and
+        document frequencies are summed from per-shard counts. Rows keep sorted
+        column indices, so the IDF weighting and L2 normalization (the same
+        arithmetic as TfidfTransformer) produce bit-identical output however
+        the corpus was sharded; a serial build is simply one shard. Hashed
+        shards already share their columns. Near-duplicate chunks are then
+        collapsed (see _collapse_duplicates; statistics go to
+        manifest["dedup"]), and the compaction's pruning and row
+        sparsification are applied last.
+        Returns the number of rows contributed by each file in source_paths.
+        """
+        hashed = self.compaction.hashed
+        if hashed:
+            global_terms = None
+            n_columns = 1 << self.compaction.hash_bits
         else:
+            global_terms = sorted(set().union(*(terms for _, terms, _, _ in results)))
+            column = {t: i for i, t in enumerate(global_terms)}
+            n_columns = len(global_terms)
+        df = np.zeros(n_columns, dtype=np.int64)
+
+        # path -> (chunks, count rows remapped to global columns)
+        by_path = {}
+        for paths, (file_chunks, terms, counts, shard_df) in zip(shard_paths, results):
+            if hashed:
+                df += shard_df
+            else:
+                col_map = np.array([column[t] for t in terms], dtype=counts.indices.dtype)
+                df[col_map] += shard_df
+                # Both vocabularies are sorted, so remapping keeps row indices sorted.
+                counts = csr_matrix(
+                    (counts.data, col_map[counts.indices], counts.indptr),
+                    shape=(counts.shape[0], n_columns),
+                )
+            row = 0
+            for path, chunks in zip(paths, file_chunks):
+                by_path[path] = (chunks, counts[row : row + len(chunks)])
+                row += len(chunks)
+
+        builder = ChunkStoreBuilder()
+        blocks = []
+        per_file = []
+        for path in source_paths:
+            chunks, block = by_path[path]
+            per_file.append(len(chunks))
+            if chunks:
+                builder.extend(chunks)
+                blocks.append(block)
+        self.chunks = builder.build()
+        matrix = vstack(blocks, format="csr") if blocks else None
+        if matrix is not None and self.dedup_threshold is not None:
+            matrix, df, per_file = self._collapse_duplicates(matrix, df, per_file, manifest)
+
+        if not self.chunks or not df.any():
             self.vectorizer = None
             self.tfidf_matrix = None
+            return per_file
 
-    def reload(self):
-        """Public: reload and rebuild the index."""
-        self._load_and_index()
+        # Smoothed IDF, as TfidfTransformer(smooth_idf=True) computes it.
+        n_samples = len(self.chunks) + 1
+        idf = np.full(n_columns, fill_value=n_samples, dtype=np.float64)
+        idf /= df.astype(np.float64) + 1.0
+        np.log(idf, out=idf)
+        idf += 1.0
 
-    def retrieve(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Return top_k chunks ranked by cosine similarity to query."""
-        if not query or self.tfidf_matrix is None or self.vectorizer is None:
-            return []
+        term_counts = np.bincount(matrix.indices, weights=matrix.data, minlength=n_columns)
+        keep = self.compaction.keep_columns(df, term_counts, len(self.chunks))
+        if keep is not None:
+            # Hashed columns stay in place with a zero IDF, so queries ignore them.
+            matrix = drop_columns(matrix, keep, renumber=not hashed)
+            if hashed:
+                idf[~keep] = 0.0
+            else:
+                idf = idf[keep]
+                global_terms = [t for t, kept in zip(global_terms, keep) if kept]
+                column = {t: i for i, t in enumerate(global_terms)}
+
+        matrix.data *= idf[matrix.indices]
+        matrix = normalize(matrix, norm="l2", copy=False)
+        self.tfidf_matrix = self.compaction.compact_rows(matrix)
+        self.vectorizer = self._new_vectorizer()
+        if not hashed:
+            self.vectorizer.vocabulary_ = column
+        self.vectorizer.idf_ = idf
+        return per_file
+
+    def _collapse_duplicates(
+        self, counts: csr_matrix, df: np.ndarray, per_file: List[int], manifest: Dict
+    ) -> Tuple[csr_matrix, np.ndarray, List[int]]:
+        """
+        Index-build stage: find near-duplicate chunks from their term sets
+        (dedup.near_duplicates, MinHash + LSH) and keep only the first copy
+        of each group, which records where the others were. Returns the
+        term counts, document frequencies and per-file row counts of the
+        remaining rows.
+        """
+        start = time.perf_counter()
+        with span("index.dedup", rows=counts.shape[0]):
+            canonical = near_duplicates(counts, self.dedup_threshold)
+        keep = canonical == np.arange(len(canonical))
+        manifest["dedup"] = {
+            "threshold": self.dedup_threshold,
+            "chunks_before": len(canonical),
+            "chunks_after": int(keep.sum()),
+            "groups": int(len(np.unique(canonical[~keep]))),
+            "seconds": time.perf_counter() - start,
+        }
+        if keep.all():
+            return counts, df, per_file
+        self.chunks = self.chunks.collapse(canonical)
+        counts = counts[keep]
+        df = np.bincount(counts.indices, minlength=counts.shape[1])
+        bounds = np.cumsum([0] + per_file)
+        per_file = [int(keep[lo:hi].sum()) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        return counts, df, per_file
+
+    def _reload_incremental(self) -> bool:
+        """
+        Re-chunk only added/changed files and splice their rows into the
+        current matrix, transformed with the existing vocabulary and IDF.
+        Returns False when a full rebuild is needed instead.
+        """
+        previous = self._manifest
+        if previous is None or self.vectorizer is None:
+            return False
+        if previous.get("params") != self._index_params():
+            return False
+
+        source_paths = self._list_source_files()
+        manifest = index_store.build_manifest(
+            self.data_dir, source_paths, self._index_params(), previous=previous
+        )
+
+        old_rows = {}
+        offset = 0
+        for entry in previous["files"]:
+            n = entry.get("rows", 0)
+            old_rows[entry["path"]] = (entry["sha256"], offset, offset + n)
+            offset += n
+        changed = [
+            path
+            for path, entry in zip(source_paths, manifest["files"])
+            if old_rows.get(entry["path"], (None,))[0] != entry["sha256"]
+        ]
+        if self.dedup_threshold is not None and (
+            changed or set(old_rows) - {entry["path"] for entry in manifest["files"]}
+        ):
+            # Spliced rows would not be deduplicated against the rest of the
+            # index; rebuild so the result matches a full build.
+            return False
+        self._prepare_pdfs(source_paths, manifest, changed)
+
+        config = self._chunk_config()
+        blocks = []
+        parts = []
+        touched = 0
+        for path, entry in zip(source_paths, manifest["files"]):
+            old = old_rows.pop(entry["path"], None)
+            if old is not None and old[0] == entry["sha256"]:
+                _, start, end = old
+                file_chunks = self.chunks[start:end]
+                block = self.tfidf_matrix[start:end]
+            else:
+                if old is not None:
+                    touched += old[2] - old[1]
+                file_chunks = chunk_file(config, path)
+                touched += len(file_chunks)
+                block = self.compaction.compact_rows(
+                    self.vectorizer.transform([c["text"] for c in file_chunks])
+                )
+            entry["rows"] = len(file_chunks)
+            if len(file_chunks):
+                blocks.append(block)
+                parts.append(file_chunks)
+
+        # Whatever is left in old_rows was deleted from disk.
+        touched += sum(end - start for _, start, end in old_rows.values())
+
+        fit = dict(previous.get("fit", {"rows": len(self.chunks), "drift": 0}))
+        fit["drift"] += touched
+        if not parts or fit["drift"] > self.refit_threshold * max(fit["rows"], 1):
+            return False
+
+        manifest["fit"] = fit
+        self._manifest = manifest
+        if touched:
+            self._invalidate_derived()
+            builder = ChunkStoreBuilder()
+            for part in parts:
+                builder.extend(part)
+            self.chunks = builder.build()
+            self.tfidf_matrix = vstack(blocks, format="csr")
+            self._save_index()
+        elif self.index_dir and manifest != previous:
+            index_store.write_manifest(self.index_dir, manifest)
+        return True
+
+    def reload(self, incremental: bool = True):
+        """
+        Public: bring the index up to date with data_dir.
 
-        q_vec = self.vectorizer.transform([query])
-        scores = cosine_similarity(q_vec, self.tfidf_matrix)[0]
+        With incremental=True only touched files are re-chunked; the vocabulary
+        and IDF are refitted once drift passes refit_threshold.
+        """
+        if incremental and self._reload_incremental():
+            return
+        source_paths = self._list_source_files()
+        manifest = index_store.build_manifest(
+            self.data_dir, source_paths, self._index_params(), previous=self._manifest
+        )
+        self._build_index(source_paths, manifest)
 
-        idx_sorted = np.argsort(scores)[::-1]
-        top_idx = idx_sorted[: max(1, top_k)]
+    def _file_rows(self) -> Tuple[np.ndarray, List[str]]:
+        """First row of every indexed file and its path under data_dir, in row order."""
+        manifest = self._manifest
+        if self._file_starts is None or self._file_starts[0] is not manifest:
+            files = manifest["files"] if manifest else []
+            starts = np.cumsum([0] + [f.get("rows", 0) for f in files])[:-1]
+            self._file_starts = (manifest, starts, [f["path"] for f in files])
+        return self._file_starts[1], self._file_starts[2]
 
+    def _source(self, idx: int, page: int) -> Tuple[Optional[str], int]:
+        """
+        The text a row's "start"/"end" offsets point into (its file, or for
+        PDFs "file#page=N") and the row's ordinal within its file.
+        """
+        starts, paths = self._file_rows()
+        f = int(np.searchsorted(starts, idx, side="right")) - 1
+        if f < 0:
+            return None, int(idx)
+        source = paths[f]
+        if source.lower().endswith(".pdf"):
+            source = f"{source}#page={page}"
+        return source, int(idx - starts[f])
+
+    def _make_results(self, top_idx: np.ndarray, top_scores: np.ndarray) -> List[Dict]:
         results = []
-        for rank, idx in enumerate(top_idx, start=1):
+        for rank, (idx, score) in enumerate(zip(top_idx, top_scores), start=1):
             ch = self.chunks[idx]
+            source, ordinal = self._source(idx, ch["page"])
             results.append(
                 {
                     "subject": ch["subject"],
                     "page": ch["page"],
                     "chunk_id": ch["chunk_id"],
                     "text": ch["text"],
-                    "score": float(scores[idx]),
+                    "start": ch["start"],
+                    "end": ch["end"],
+                    "source": source,
+                    "ordinal": ordinal,
+                    "score": float(score),
                     "rank": rank,
+                    "duplicates": self.chunks.duplicates(idx),
                 }
             )
         return results
 
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 5,
+        subjects: Optional[List[str]] = None,
+        route: Optional[int] = None,
+        backend: Optional[str] = None,
+    ) -> List[Dict]:
+        """Return top_k chunks ranked by the configured (or given) backend."""
+        return self.retrieve_many(
+            [query], top_k=top_k, backend=backend, subjects=subjects, route=route
+        )[0]
+
+    def retrieve_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        batch_size: int = 256,
+        backend: Optional[str] = None,
+        subjects: Optional[List[str]] = None,
+        route: Optional[int] = None,
+    ) -> List[List[Dict]]:
+        """
+        Batched retrieve(): one result list per query, in input order.
+
+        `backend` overrides self.backend for this call. `subjects` limits
+        the search to those subjects or folders ("OS/deadlocks", "OS").
+        Without it, a positive `route` (default self.route_subjects) makes
+        each query search only its `route` nearest subjects by centroid
+        similarity. Scoped searches only score the matching row ranges.
+        Repeated queries (after normalization) are answered from the result
+        cache.
+        """
+        backend = backend or self.backend
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown retrieval backend {backend!r}; expected one of {BACKENDS}")
+        k = max(1, top_k)
+        if isinstance(subjects, str):
+            subjects = [subjects]
+        ranges = self.subject_rows(subjects) if subjects else None
+        route = 0 if subjects else (self.route_subjects if route is None else max(0, route))
+        if subjects:
+            scope = tuple(sorted(set(subjects)))
+        else:
+            scope = ("route", route) if route else None
+
+        with span("retrieve", queries=len(queries), backend=backend):
+            out: List[List[Dict]] = [[] for _ in queries]
+            # normalized query -> positions in `queries` still needing an answer
+            pending: Dict[str, List[int]] = {}
+            for i, q in enumerate(queries):
+                if not q:
+                    continue
+                norm = normalize_query(q)
+                if not norm:
+                    continue
+                if norm not in pending and self._result_cache is not None:
+                    cached = self._result_cache.get((self.generation, backend, norm, k, scope))
+                    if cached is not None:
+                        count("retrieval_cache", result="hit")
+                        out[i] = [dict(r) for r in cached]
+                        continue
+                    count("retrieval_cache", result="miss")
+                pending.setdefault(norm, []).append(i)
+
+            if not pending:
+                return out
+
+            generation = self.generation
+            misses = list(pending)
+            if backend == "bm25":
+                computed = self._retrieve_bm25(misses, k, ranges, route)
+            elif backend == "dense":
+                computed = self._retrieve_dense(misses, k, ranges, route)
+            elif backend == "hybrid":
+                computed = self._retrieve_hybrid(misses, k, batch_size, ranges, route)
+            elif backend == "rerank":
+                computed = self._retrieve_rerank(misses, k, ranges, route)
+            else:
+                computed = self._retrieve_tfidf(misses, k, batch_size, ranges, route)
+
+            for norm, results in zip(misses, computed):
+                if self._result_cache is not None and generation == self.generation:
+                    self._result_cache.put((generation, backend, norm, k, scope), results)
+                for i in pending[norm]:
+                    out[i] = [dict(r) for r in results]
+            return out
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Hit / miss / eviction counters of the result cache."""
+        if self._result_cache is None:
+            return {}
+        return dict(self._result_cache.stats(), generation=self.generation)
+
+    def _retrieve_tfidf(
+        self,
+        queries: List[str],
+        top_k: int,
+        batch_size: int,
+        ranges: Optional[List[Tuple[int, int]]] = None,
+        route: int = 0,
+    ) -> List[List[Dict]]:
+        """
+        Queries are vectorized together and scored with a single sparse product
+        per batch. Both sides are L2-normalized by the vectorizer, so the dot
+        product is the cosine similarity; per-row top_k uses argpartition.
+        With `ranges` or `route`, only the in-scope row blocks are multiplied,
+        once per distinct scope in the batch.
+        """
+        out: List[List[Dict]] = [[] for _ in queries]
+        if self.tfidf_matrix is None or self.vectorizer is None:
+            return out
+
+        live = [i for i, q in enumerate(queries) if q]
+        k = max(1, top_k)
+
+        for b in range(0, len(live), batch_size):
+            rows = live[b : b + batch_size]
+            with span("retrieve.vectorize"):
+                q_mat = self.vectorizer.transform([queries[i] for i in rows])
+            if ranges is not None or route:
+                if route:
+                    with span("retrieve.route"):
+                        scopes = self._route(q_mat, route)
+                else:
+                    scopes = [ranges] * len(rows)
+                groups: Dict[Tuple, List[int]] = {}
+                for j, scope in enumerate(scopes):
+                    groups.setdefault(tuple(scope), []).append(j)
+                with span("retrieve.score", scopes=len(groups)):
+                    for scope, members in groups.items():
+                        row_ids, scores = self._score_rows(scope, q_mat[members])
+                        for j, row_scores in zip(members, scores):
+                            top = top_k_indices(row_scores, k)
+                            out[rows[j]] = self._make_results(row_ids[top], row_scores[top])
+                continue
+            with span("retrieve.score"):
+                # (docs x terms) @ (terms x batch) keeps the big matrix in CSR and
+                # only converts the small query block.
+                scores = (self.tfidf_matrix @ q_mat.T).T.toarray()
+            with span("retrieve.rank"):
+                for qi, row_scores in zip(rows, scores):
+                    top_idx = top_k_indices(row_scores, k)
+                    out[qi] = self._make_results(top_idx, row_scores[top_idx])
+        return out
+
+    def _get_bm25(self) -> Optional[BM25Index]:
+        if self._bm25 is None and self.chunks:
+            with span("retrieve.bm25_fit"):
+                self._bm25 = BM25Index().fit(self.chunks.texts())
+        return self._bm25
+
+    def _retrieve_bm25(
+        self,
+        queries: List[str],
+        top_k: int,
+        ranges: Optional[List[Tuple[int, int]]] = None,
+        route: int = 0,
+    ) -> List[List[Dict]]:
+        """Only chunks sharing at least one term with the query are returned."""
+        index = self._get_bm25()
+        if index is None:
+            return [[] for _ in queries]
+        k = max(1, top_k)
+        scopes = [ranges] * len(queries)
+        if route and self.vectorizer is not None and self.tfidf_matrix is not None:
+            with span("retrieve.route"):
+                scopes = self._route(self.vectorizer.transform(queries), route)
+        out = []
+        with span("retrieve.bm25_search"):
+            for q, scope in zip(queries, scopes):
+                doc_ids, scores = index.search(q, k, ranges=scope)
+                out.append(self._make_results(doc_ids, scores))
+        return out
+
+    def _retrieve_rerank(
+        self,
+        queries: List[str],
+        top_k: int,
+        ranges: Optional[List[Tuple[int, int]]] = None,
+        route: int = 0,
+    ) -> List[List[Dict]]:
+        """
+        Two stages per query: BM25 unigram postings (MaxScore) pull
+        reranker.candidates chunks, then the Reranker re-scores only those
+        rows. Each stage is a span with its own budget; a candidate stage
+        over budget hands fewer candidates to the rerank (Reranker.cut_candidates).
+        """
+        index = self._get_bm25()
+        if index is None or self.vectorizer is None:
+            return [[] for _ in queries]
+        rr = self.reranker
+        k = max(1, top_k)
+        if self._bigram_cols is None:
+            if isinstance(self.vectorizer, HashedTfidfVectorizer):
+                bigram = self.vectorizer.bigram_columns()
+            else:
+                bigram = np.zeros(len(self.vectorizer.vocabulary_), dtype=bool)
+                for term, col in self.vectorizer.vocabulary_.items():
+                    bigram[col] = " " in term
+            self._bigram_cols = bigram
+
+        with span("retrieve.vectorize"):
+            q_mat = self.vectorizer.transform(queries)
+        scopes = [ranges] * len(queries)
+        if route:
+            with span("retrieve.route"):
+                scopes = self._route(q_mat, route)
+
+        out = []
+        for i, (q, scope) in enumerate(zip(queries, scopes)):
+            start = time.perf_counter()
+            with span("retrieve.candidates"):
+                rows, _ = index.search(q, max(rr.candidates, k), ranges=scope)
+            rows = rr.cut_candidates(rows, time.perf_counter() - start, k)
+            with span("retrieve.rerank", candidates=len(rows)):
+                rows = rows.astype(np.intp)
+                rows, scores = rr.rerank(
+                    q, q_mat[i], rows, self.tfidf_matrix[rows], self.chunks, self._bigram_cols, k
+                )
+            out.append(self._make_results(rows, scores))
+        return out
+
+    def _get_dense(self) -> Optional[DenseIndex]:
+        """
+        The LSA/IVF-PQ index for the current tfidf_matrix: memory-mapped
+        from index_dir when one was saved for this exact index, else fitted
+        (and saved).
+        """
+        if self._dense is None and self.tfidf_matrix is not None:
+            fingerprint = index_store.manifest_fingerprint(self._manifest)
+            path = os.path.join(self.index_dir, DENSE_DIR) if self.index_dir else None
+            dense = DenseIndex.load(path) if path else None
+            if (
+                dense is None
+                or dense.fingerprint != fingerprint
+                or dense.dim != self.dense_dim
+                or len(dense) != self.tfidf_matrix.shape[0]
+            ):
+                with span("retrieve.dense_fit"):
+                    dense = DenseIndex(dim=self.dense_dim).fit(self.tfidf_matrix, fingerprint)
+                if path:
+                    dense.save(path)
+            self._dense = dense
+        return self._dense
+
+    def _retrieve_dense(
+        self,
+        queries: List[str],
+        top_k: int,
+        ranges: Optional[List[Tuple[int, int]]] = None,
+        route: int = 0,
+    ) -> List[List[Dict]]:
+        """
+        LSA cosine ranking through the IVF-PQ index; scoped queries are
+        scored exactly over their row ranges instead.
+        """
+        dense = self._get_dense()
+        if dense is None:
+            return [[] for _ in queries]
+        k = max(1, top_k)
+        with span("retrieve.vectorize"):
+            q_mat = self.vectorizer.transform(queries)
+            q_vecs = dense.project(q_mat)
+        scopes = [ranges] * len(queries)
+        if route:
+            with span("retrieve.route"):
+                scopes = self._route(q_mat, route)
+        out = []
+        with span("retrieve.dense_search"):
+            for q, scope in zip(q_vecs, scopes):
+                if scope is None:
+                    rows, scores = dense.search(q, k)
+                else:
+                    rows, scores = dense.search_exact(q, k, scope)
+                out.append(self._make_results(rows, scores))
+        return out
+
+    def _retrieve_hybrid(
+        self,
+        queries: List[str],
+        top_k: int,
+        batch_size: int,
+        ranges: Optional[List[Tuple[int, int]]] = None,
+        route: int = 0,
+    ) -> List[List[Dict]]:
+        """Reciprocal rank fusion of the TF-IDF and dense rankings."""
+        depth = max(HYBRID_DEPTH, top_k)
+        sparse = self._retrieve_tfidf(queries, depth, batch_size, ranges, route)
+        dense = self._retrieve_dense(queries, depth, ranges, route)
+        with span("retrieve.fuse"):
+            return [
+                # Zero-score TF-IDF hits share no term with the query: no evidence.
+                reciprocal_rank_fusion([[r for r in s if r["score"] > 0], d], top_k, RRF_K)
+                for s, d in zip(sparse, dense)
+            ]
+
+    def dense_recall(self, queries: List[str], top_k: int = 10, nprobe: Optional[int] = None) -> Dict:
+        """
+        Quality and speed of the approximate dense search against exact
+        (brute-force) search over the same vectors:
+          - recall_at_k: mean share of the exact top_k that the ANN returns
+          - ann_ms / exact_ms: mean per-query search time
+        """
+        dense = self._get_dense()
+        live = [q for q in queries if q]
+        if dense is None or not live:
+            return {"queries": 0, "top_k": top_k, "recall_at_k": 0.0}
+        q_vecs = dense.project(self.vectorizer.transform(live))
+        k = max(1, top_k)
+
+        start = time.perf_counter()
+        for q in q_vecs:
+            dense.search(q, k, nprobe)
+        ann = time.perf_counter() - start
+        start = time.perf_counter()
+        for q in q_vecs:
+            dense.search_exact(q, k)
+        exact = time.perf_counter() - start
+        return {
+            "queries": len(live),
+            "top_k": k,
+            "nprobe": nprobe or dense.nprobe,
+            "recall_at_k": dense.recall(q_vecs, k, nprobe),
+            "ann_ms": ann / len(live) * 1000,
+            "exact_ms": exact / len(live) * 1000,
+        }
+
+    # ---------- Subject scoping ----------
+
+    def _ranges_by_subject(self) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        subject -> [start, end) row ranges. Files are indexed in path order,
+        so every subject (and every folder) is a contiguous block of rows.
+        """
+        if self._subject_ranges is None:
+            ids = np.asarray(self.chunks.subject_ids)
+            ranges: Dict[str, List[Tuple[int, int]]] = {}
+            if len(ids):
+                cuts = np.flatnonzero(np.diff(ids)) + 1
+                starts = np.concatenate([[0], cuts])
+                ends = np.concatenate([cuts, [len(ids)]])
+                for start, end in zip(starts.tolist(), ends.tolist()):
+                    ranges.setdefault(self.chunks.subjects[ids[start]], []).append((start, end))
+            self._subject_ranges = ranges
+        return self._subject_ranges
+
+    def subject_rows(self, subjects: Iterable[str]) -> List[Tuple[int, int]]:
+        """
+        Sorted, merged [start, end) row ranges of the given subjects or
+        folders, including collapsed rows that also occur in them. Raises
+        ValueError for a name matching no indexed subject.
+        """
+        by_subject = self._ranges_by_subject()
+        known = set(by_subject) | set(self.chunks.subject_names())
+        picked = []
+        matched_ids = []
+        for name in subjects:
+            name = name.strip("/")
+            matched = [s for s in known if s == name or s.startswith(name + "/")]
+            if not matched:
+                raise ValueError(f"Unknown subject or folder {name!r}")
+            for s in matched:
+                picked.extend(by_subject.get(s, []))
+            matched_ids.extend(i for i, s in enumerate(self.chunks.subjects) if s in matched)
+        if self.chunks.duplicate_count():
+            hits = np.flatnonzero(np.isin(self.chunks.dup_subject_ids, matched_ids))
+            rows = np.unique(np.searchsorted(self.chunks.dup_offsets, hits, side="right") - 1)
+            picked.extend((int(r), int(r) + 1) for r in rows)
+        return _merge_ranges(picked)
+
+    def _row_block(self, start: int, end: int) -> csr_matrix:
+        """Rows [start, end) of tfidf_matrix, sharing its data and indices arrays."""
+        m = self.tfidf_matrix
+        lo, hi = m.indptr[start], m.indptr[end]
+        return csr_matrix(
+            (m.data[lo:hi], m.indices[lo:hi], m.indptr[start : end + 1] - lo),
+            shape=(end - start, m.shape[1]),
+            copy=False,
+        )
+
+    def _score_rows(self, ranges, q_mat) -> Tuple[np.ndarray, np.ndarray]:
+        """(global row ids, queries x rows cosine scores) over the given row ranges."""
+        if not ranges:
+            return np.empty(0, dtype=np.intp), np.zeros((q_mat.shape[0], 0))
+        q_t = q_mat.T
+        scores = np.hstack([(self._row_block(s, e) @ q_t).T.toarray() for s, e in ranges])
+        row_ids = np.concatenate([np.arange(s, e) for s, e in ranges])
+        return row_ids, scores
+
+    def _subject_centroids(self) -> Tuple[List[str], csr_matrix]:
+        """
+        Subject names and their L2-normalized mean TF-IDF vectors, stored
+        transposed (terms x subjects) so routing a query only reads the rows
+        of its own terms.
+        """
+        if self._centroids is None:
+            by_subject = self._ranges_by_subject()
+            names = sorted(by_subject)
+            owner = np.zeros(len(self.chunks), dtype=np.int32)
+            for i, name in enumerate(names):
+                for start, end in by_subject[name]:
+                    owner[start:end] = i
+            membership = csr_matrix(
+                (np.ones(len(owner), dtype=self.tfidf_matrix.dtype), (owner, np.arange(len(owner)))),
+                shape=(len(names), len(owner)),
+            )
+            centroids = normalize(membership @ self.tfidf_matrix, norm="l2")
+            self._centroids = (names, centroids.T.tocsr())
+        return self._centroids
+
+    def _route(self, q_mat, n: int) -> List[List[Tuple[int, int]]]:
+        """Row ranges of the n subjects nearest to each query vector."""
+        names, centroids = self._subject_centroids()
+        by_subject = self._ranges_by_subject()
+        sims = (q_mat @ centroids).toarray()
+        return [
+            _merge_ranges([r for i in top_k_indices(row, n) for r in by_subject[names[i]]])
+            for row in sims
+        ]
+
+    def routing_recall(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        route: int = 3,
+        backend: Optional[str] = None,
+    ) -> Dict:
+        """
+        Report what routing to the `route` nearest subjects loses against a
+        full search:
+          - recall_at_k: mean share of the full top_k also found when routed
+          - top1_agreement: share of queries with the same best chunk
+          - rows_scored: mean fraction of chunk rows a routed query scores
+        """
+        full = self.retrieve_many(queries, top_k=top_k, backend=backend, route=0)
+        routed = self.retrieve_many(queries, top_k=top_k, backend=backend, route=route)
+
+        recall = top1 = 0.0
+        counted = 0
+        for a, b in zip(full, routed):
+            if not a:
+                continue
+            a_ids, b_ids = result_ids(a), result_ids(b)
+            counted += 1
+            recall += len(set(a_ids) & set(b_ids)) / len(a_ids)
+            top1 += bool(b_ids and a_ids[0] == b_ids[0])
+
+        rows_scored = 0.0
+        live = [q for q in queries if q]
+        if live and self.vectorizer is not None and self.tfidf_matrix is not None and len(self.chunks):
+            scopes = self._route(self.vectorizer.transform(live), route)
+            rows_scored = sum(sum(e - s for s, e in sc) for sc in scopes) / (len(scopes) * len(self.chunks))
+
+        n = max(counted, 1)
+        return {
+            "queries": counted,
+            "top_k": max(1, top_k),
+            "route": route,
+            "recall_at_k": recall / n,
+            "top1_agreement": top1 / n,
+            "rows_scored": rows_scored,
+        }
+
+    def compare_backends(self, queries: List[str], top_k: int = 5) -> Dict:
+        """
+        Report how closely BM25 rankings agree with TF-IDF ones:
+          - top1_agreement: share of queries with the same best chunk
+          - overlap_at_k: mean |tfidf ∩ bm25| / top_k over the top_k lists
+          - exact_match: share of queries with identical ordered top_k lists
+        """
+        tfidf = self.retrieve_many(queries, top_k=top_k, backend="tfidf")
+        bm25 = self.retrieve_many(queries, top_k=top_k, backend="bm25")
+        k = max(1, top_k)
+
+        top1 = overlap = exact = 0.0
+        counted = 0
+        for a, b in zip(tfidf, bm25):
+            if not a and not b:
+                continue
+            a_ids, b_ids = result_ids(a), result_ids(b)
+            counted += 1
+            top1 += bool(a_ids and b_ids and a_ids[0] == b_ids[0])
+            overlap += len(set(a_ids) & set(b_ids)) / k
+            exact += a_ids == b_ids
+
+        n = max(counted, 1)
+        return {
+            "queries": counted,
+            "top_k": k,
+            "top1_agreement": top1 / n,
+            "overlap_at_k": overlap / n,
+            "exact_match": exact / n,
+        }
+
+    def dedup_report(self, queries: List[str], top_k: int = 5) -> Dict:
+        """
+        What near-duplicate collapsing did to this index, against the same
+        corpus indexed in memory without it:
+          - chunks_before / chunks_after / removed_share, groups, and the
+            term matrix size (matrix_bytes_before / _after)
+          - redundant_at_k: mean share of the un-deduplicated top_k taken by
+            copies of a chunk already ranked higher
+          - overlap_at_k: mean share of the un-deduplicated top_k (copies
+            counted as their kept chunk) also in this index's top_k
+          - top1_agreement: share of queries whose best chunk is the same
+            (or a copy of it)
+          - distinct_at_k_before / _after: mean distinct chunks per top_k
+        """
+        full = Retriever(
+            data_dir=self.data_dir,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            chunk_strategy=self.chunk_strategy,
+            index_dir=None,
+            cache_entries=0,
+            workers=self.workers,
+            compaction=self.compaction,
+            page_cache_dir=self.page_cache_dir,
+            extract_workers=self.extract_workers,
+            dedup_threshold=None,
+        )
+        k = max(1, top_k)
+        # Location of every collapsed copy -> location of the chunk kept for it.
+        kept_as = {}
+        for row in range(len(self.chunks)):
+            if self.chunks.dup_offsets[row + 1] > self.chunks.dup_offsets[row]:
+                chunk = self.chunks[row]
+                here = (chunk["subject"], chunk["page"], chunk["chunk_id"])
+                for d in self.chunks.duplicates(row):
+                    kept_as[(d["subject"], d["page"], d["chunk_id"])] = here
+
+        before_runs = full.retrieve_many(queries, top_k=k, backend="tfidf")
+        after_runs = self.retrieve_many(queries, top_k=k, backend="tfidf")
+        redundant = overlap = top1 = distinct_before = distinct_after = 0.0
+        counted = 0
+        for before, after in zip(before_runs, after_runs):
+            if not before and not after:
+                continue
+            counted += 1
+            mapped = [kept_as.get(i, i) for i in result_ids(before)]
+            after_ids = result_ids(after)
+            redundant += (len(mapped) - len(set(mapped))) / k
+            overlap += len(set(mapped) & set(after_ids)) / k
+            top1 += bool(mapped and after_ids and mapped[0] == after_ids[0])
+            distinct_before += len(set(mapped))
+            distinct_after += len(set(after_ids))
+
+        n = max(counted, 1)
+        return {
+            "threshold": self.dedup_threshold,
+            "chunks_before": len(full.chunks),
+            "chunks_after": len(self.chunks),
+            "removed_share": 1.0 - len(self.chunks) / max(len(full.chunks), 1),
+            "groups": int(np.count_nonzero(np.diff(np.asarray(self.chunks.dup_offsets)))),
+            "matrix_bytes_before": _matrix_bytes(full.tfidf_matrix),
+            "matrix_bytes_after": _matrix_bytes(self.tfidf_matrix),
+            "queries": counted,
+            "top_k": k,
+            "redundant_at_k": redundant / n,
+            "overlap_at_k": overlap / n,
+            "top1_agreement": top1 / n,
+            "distinct_at_k_before": distinct_before / n,
+            "distinct_at_k_after": distinct_after / n,
+        }
+
     def get_subjects(self) -> List[str]:
-        return sorted({c["subject"] for c in self.chunks})
+        return self.chunks.subject_names()
+
+    def get_folders(self) -> List[str]:
+        """Folders containing subjects ("OS" for "OS/deadlocks"), usable as subject filters."""
+        folders = set()
+        for subject in self.get_subjects():
+            parts = subject.split("/")[:-1]
+            folders.update("/".join(parts[: i + 1]) for i in range(len(parts)))
+        return sorted(folders)
+
+    def index_fingerprint(self) -> Optional[str]:
+        """Id of the corpus + parameters behind the current index; equal across processes."""
+        return index_store.manifest_fingerprint(self._manifest)
 
     def get_chunk_count(self) -> int:
         return len(self.chunks)
+
+
+def _chunk_and_count_shard(config: ChunkConfig, compaction: Compaction, paths: List[str]):
+    """Process-pool worker: chunk one shard's files and count their terms."""
+    file_chunks = [chunk_file(config, p) for p in paths]
+    texts = [c["text"] for chunks in file_chunks for c in chunks]
+
+    vectorizer = compaction.new_vectorizer()
+    if isinstance(vectorizer, HashedTfidfVectorizer):
+        counts = vectorizer.counts(texts)
+        return file_chunks, None, counts, np.bincount(counts.indices, minlength=vectorizer.n_features)
+
+    counter = CountVectorizer(
+        analyzer=vectorizer.build_analyzer(), dtype=np.float64
+    )
+    try:
+        counts = counter.fit_transform(texts)
+        counts.sort_indices()
+        terms = counter.get_feature_names_out().tolist()
+    except ValueError:
+        # No texts, or nothing left after stop-word removal.
+        counts = csr_matrix((len(texts), 0), dtype=np.float64)
+        terms = []
+    shard_df = np.bincount(counts.indices, minlength=len(terms))
+    return file_chunks, terms, counts, shard_df
+
+
+def _merge_ranges(ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort [start, end) ranges and merge overlapping or touching ones."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _matrix_bytes(matrix: Optional[csr_matrix]) -> int:
+    if matrix is None:
+        return 0
+    return int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+
+
+def _results_size(results: List[Dict]) -> int:
+    """Rough byte footprint of a cached result list (text dominates)."""
+    return sum(len(r["text"]) + 200 for r in results) + 64
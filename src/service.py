@@ -0,0 +1,400 @@
+# src/service.py
+"""
+Headless HTTP/JSON query service:
+
+    python -m src.service --host 0.0.0.0 --port 8000 --workers 4
+
+The parent process builds (or validates) the on-disk index once, opens the
+listening socket and forks the workers. Each worker loads the index from
+index_dir, where the arrays and chunk columns are memory-mapped read-only,
+so all workers share one copy of the index in the page cache. Dead workers
+are restarted; SIGTERM / SIGINT stops them all.
+
+Endpoints:
+  GET  /healthz         liveness
+  GET  /readyz          503 until this worker's index is loaded; reports the
+                        index fingerprint, generation and chunk count
+  GET  /metrics         Prometheus counters of the answering worker
+  POST /retrieve        {"query", "top_k"?, "backend"?, "subjects"?, "route"?}
+  POST /retrieve_batch  {"queries": [...], "top_k"?, "backend"?, "subjects"?, "route"?}
+  POST /ask             {"question", "top_k"?, "context_budget"?, "subjects"?, "route"?}
+
+"subjects" lists subjects or folders to search ("OS/deadlocks", "OS");
+"route" searches only that many subjects nearest to the query.
+"""
+import os
+import json
+import signal
+import socket
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from src.context_packer import ContextPacker
+from src.dedup import DEFAULT_THRESHOLD
+from src.retriever import BACKENDS, DATA_DIR, INDEX_DIR, Retriever
+from src.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH = 1024
+MAX_TOP_K = 50
+
+
+class NotReady(Exception):
+    pass
+
+
+class BadRequest(ValueError):
+    """A request the client must fix; its message is safe to send back."""
+
+
+class QueryService:
+    """
+    Per-process service state: a Retriever loaded on a background thread
+    (so readiness can be probed while it loads) and a generator created on
+    the first /ask. `generator_factory` defaults to GeminiGenerator.
+    """
+
+    def __init__(self, retriever_kwargs: Dict, generator_factory: Optional[Callable] = None):
+        self.retriever_kwargs = retriever_kwargs
+        self.generator_factory = generator_factory
+        self._retriever: Optional[Retriever] = None
+        self._error: Optional[str] = None
+        self._loaded = threading.Event()
+        self._generator = None
+        self._generator_lock = threading.Lock()
+
+    def load(self):
+        try:
+            self._retriever = Retriever(**self.retriever_kwargs)
+        except Exception as e:
+            logger.exception("Index load failed: %s", e)
+            self._error = f"{type(e).__name__}: {e}"
+        finally:
+            self._loaded.set()
+
+    def start_loading(self):
+        threading.Thread(target=self.load, name="index-load", daemon=True).start()
+
+    @property
+    def retriever(self) -> Retriever:
+        if self._retriever is None:
+            # The load error itself is logged by load(), not sent to clients.
+            raise NotReady("index failed to load" if self._error else "index is loading")
+        return self._retriever
+
+    def generator(self):
+        with self._generator_lock:
+            if self._generator is None:
+                if self.generator_factory is None:
+                    from src.generator import GeminiGenerator
+
+                    self.generator_factory = GeminiGenerator
+                self._generator = self.generator_factory()
+            return self._generator
+
+    def status(self) -> Dict:
+        r = self._retriever
+        return {
+            "ready": r is not None,
+            "pid": os.getpid(),
+            "index": r.index_fingerprint() if r else None,
+            "generation": r.generation if r else None,
+            "chunks": r.get_chunk_count() if r else None,
+            "error": self._error,
+        }
+
+    def _check_scope(self, retriever: Retriever, scope: Dict):
+        if scope["subjects"]:
+            try:
+                retriever.subject_rows(scope["subjects"])
+            except ValueError:
+                raise BadRequest("'subjects' names an unknown subject or folder") from None
+
+    def retrieve_batch(
+        self, queries: List[str], top_k: int, backend: Optional[str], scope: Dict
+    ) -> List[List[Dict]]:
+        retriever = self.retriever
+        self._check_scope(retriever, scope)
+        return retriever.retrieve_many(queries, top_k=top_k, backend=backend, **scope)
+
+    def ask(self, question: str, top_k: int, context_budget: int, scope: Dict) -> Dict:
+        from src.generator import CLASSIC_INSUFFICIENT_MSG
+
+        retriever = self.retriever
+        self._check_scope(retriever, scope)
+        with tracer.trace("ask"):
+            retrieved = retriever.retrieve(question, top_k=top_k, **scope)
+            context, packing = ContextPacker(max_chars=context_budget).pack(retrieved)
+            if retrieved:
+                answer = self.generator().generate(question, context)
+            else:
+                answer = CLASSIC_INSUFFICIENT_MSG
+        return {"answer": answer, "context": context, "packing": packing}
+
+
+def _int(body: Dict, field: str, default: Optional[int] = None) -> Optional[int]:
+    value = body.get(field, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise BadRequest(f"'{field}' must be an integer")
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"'{field}' must be an integer") from None
+
+
+def _top_k(body: Dict) -> int:
+    top_k = _int(body, "top_k", 5)
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise BadRequest(f"'top_k' must be between 1 and {MAX_TOP_K}")
+    return top_k
+
+
+def _backend(body: Dict) -> Optional[str]:
+    backend = body.get("backend")
+    if backend is not None and backend not in BACKENDS:
+        raise BadRequest(f"'backend' must be one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def _scope(body: Dict) -> Dict:
+    subjects = body.get("subjects")
+    if subjects is not None and (
+        not isinstance(subjects, list) or not all(isinstance(s, str) for s in subjects)
+    ):
+        raise BadRequest("'subjects' must be a list of strings")
+    route = _int(body, "route")
+    if route is not None and route < 0:
+        raise BadRequest("'route' must not be negative")
+    return {"subjects": subjects or None, "route": route}
+
+
+def _text(body: Dict, field: str) -> str:
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise BadRequest(f"'{field}' must be a non-empty string")
+    return value
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service: QueryService = None  # bound per server in make_handler()
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Dict):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _read_json(self) -> Dict:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise BadRequest("invalid Content-Length") from None
+        if length > MAX_BODY_BYTES:
+            raise OverflowError("request body too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise BadRequest("request body must be valid JSON") from None
+        if not isinstance(body, dict):
+            raise BadRequest("request body must be a JSON object")
+        return body
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send_json(200, {"status": "ok", "pid": os.getpid()})
+        elif self.path == "/readyz":
+            status = self.service.status()
+            self._send_json(200 if status["ready"] else 503, status)
+        elif self.path == "/metrics":
+            self._send(200, tracer.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        routes = {
+            "/retrieve": self._retrieve,
+            "/retrieve_batch": self._retrieve_batch,
+            "/ask": self._ask,
+        }
+        route = routes.get(self.path)
+        if route is None:
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            self._send_json(200, route(self._read_json()))
+        except NotReady as e:
+            self._send_json(503, {"error": f"not ready: {e}"})
+        except OverflowError:
+            self._send_json(413, {"error": "request body too large"})
+        except BadRequest as e:
+            self._send_json(400, {"error": str(e)})
+        except (ValueError, TypeError) as e:
+            # Anything else the request triggered: log it, tell the client nothing internal.
+            logger.warning("Rejected request to %s: %s: %s", self.path, type(e).__name__, e)
+            self._send_json(400, {"error": "invalid request"})
+        except Exception as e:
+            logger.exception("Request to %s failed: %s", self.path, e)
+            self._send_json(500, {"error": "internal error"})
+
+    def _retrieve(self, body: Dict) -> Dict:
+        results = self.service.retrieve_batch(
+            [_text(body, "query")], _top_k(body), _backend(body), _scope(body)
+        )
+        return {"results": results[0]}
+
+    def _retrieve_batch(self, body: Dict) -> Dict:
+        queries = body.get("queries")
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            raise BadRequest("'queries' must be a list of strings")
+        if len(queries) > MAX_BATCH:
+            raise BadRequest(f"at most {MAX_BATCH} queries per batch")
+        return {"results": self.service.retrieve_batch(queries, _top_k(body), _backend(body), _scope(body))}
+
+    def _ask(self, body: Dict) -> Dict:
+        budget = _int(body, "context_budget", 6000)
+        if budget < 1:
+            raise BadRequest("'context_budget' must be positive")
+        return self.service.ask(_text(body, "question"), _top_k(body), budget, _scope(body))
+
+
+def make_handler(service: QueryService):
+    return type("BoundServiceHandler", (ServiceHandler,), {"service": service})
+
+
+def run_worker(sock: socket.socket, service: QueryService):
+    """Serve requests accepted from the shared listening socket until SIGTERM."""
+    server = ThreadingHTTPServer(sock.getsockname()[:2], make_handler(service), bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    server.daemon_threads = True
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    service.start_loading()
+    server.serve_forever()
+
+
+def serve(
+    host: str,
+    port: int,
+    workers: int,
+    retriever_kwargs: Dict,
+    generator_factory: Optional[Callable] = None,
+):
+    # Build or validate the shared index once, before any worker maps it.
+    Retriever(**retriever_kwargs)
+
+    sock = socket.create_server((host, port), backlog=128)
+    # Every worker polls the same socket; a non-blocking accept lets the
+    # ones that lose the race go back to waiting.
+    sock.setblocking(False)
+    logger.info("Serving on http://%s:%d with %d worker(s)", host, sock.getsockname()[1], workers)
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        run_worker(sock, QueryService(retriever_kwargs, generator_factory))
+        return
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(sock, QueryService(retriever_kwargs, generator_factory))
+            except Exception:
+                logger.exception("Worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logger.warning("Worker %d exited (status %d); restarting", pid, status)
+            spawn()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON retrieval and question-answering service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--backend", default="tfidf", choices=BACKENDS)
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Collapse chunks at least this similar (Jaccard) at index time; 0 keeps every chunk.",
+    )
+    parser.add_argument("--model-url", default=None, help="Answer with an HTTPBackend at this URL instead of Gemini.")
+    args = parser.parse_args()
+
+    generator_factory = None
+    if args.model_url:
+        def generator_factory():
+            from src.backends import HTTPBackend
+            from src.generator import GeminiGenerator
+
+            return GeminiGenerator(backend=HTTPBackend(args.model_url))
+
+    logging.basicConfig(level=logging.INFO)
+    serve(
+        args.host,
+        args.port,
+        args.workers,
+        {
+            "data_dir": args.data_dir,
+            "index_dir": args.index_dir,
+            "backend": args.backend,
+            "dedup_threshold": args.dedup_threshold or None,
+        },
+        generator_factory,
+    )
+
+
+if __name__ == "__main__":
+    main()
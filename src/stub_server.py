@@ -0,0 +1,167 @@
+# src/stub_server.py
+"""
+Local stand-in for the model API, for exercising ModelClient and the app
+offline under simulated latency and failures (see HTTPBackend):
+
+    python -m src.stub_server --port 8765 --latency 0.5 --jitter 0.5 --failure-rate 0.2
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+
+class StubConfig:
+    """
+    Behaviour of the stub. Each request sleeps `latency` plus up to `jitter`
+    seconds. It then fails with HTTP `failure_status` with probability
+    `failure_rate`, or hangs for `hang_seconds` with probability `hang_rate`.
+    Otherwise it answers with `reply(prompt_text)`. Streamed answers are
+    sent word by word, `token_delay` seconds apart.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        failure_status: int = 503,
+        hang_rate: float = 0.0,
+        hang_seconds: float = 300.0,
+        token_delay: float = 0.0,
+        reply: Optional[Callable[[str], str]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.token_delay = token_delay
+        self.reply = reply or (lambda prompt: f"Stub answer to a {len(prompt)}-character prompt.")
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {"requests": 0, "failures": 0, "hangs": 0, "answers": 0}
+
+    def count(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+
+    def roll(self) -> float:
+        with self.lock:
+            return self.random.random()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config: StubConfig = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.config.lock:
+                self._send_json(200, dict(self.config.counters))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        cfg = self.config
+        cfg.count("requests")
+
+        time.sleep(cfg.latency + cfg.jitter * cfg.roll())
+        roll = cfg.roll()
+        if roll < cfg.failure_rate:
+            cfg.count("failures")
+            self._send_json(cfg.failure_status, {"error": "simulated failure"})
+            return
+        if roll < cfg.failure_rate + cfg.hang_rate:
+            cfg.count("hangs")
+            time.sleep(cfg.hang_seconds)
+
+        parts = request.get("prompt", [])
+        prompt = "\n\n".join(p if isinstance(p, str) else "[IMAGE]" for p in parts)
+        text = cfg.reply(prompt)
+        cfg.count("answers")
+
+        if not request.get("stream"):
+            self._send_json(200, {"text": text})
+            return
+
+        # No Content-Length: the body ends when the connection closes.
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for i, word in enumerate(text.split(" ")):
+            if i:
+                time.sleep(cfg.token_delay)
+            self.wfile.write((json.dumps({"text": (" " if i else "") + word}) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, config: Optional[StubConfig] = None) -> ThreadingHTTPServer:
+    """Stub server bound to (host, port); port 0 picks a free one (see server.server_port)."""
+    handler = type("BoundStubHandler", (StubHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_thread(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start a stub server on a daemon thread; stop it with server.shutdown()."""
+    server = make_server(host, port, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub of the model API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=503)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=300.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        token_delay=args.token_delay,
+        seed=args.seed,
+    )
+    server = make_server(args.host, args.port, config)
+    print(f"Stub model server on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# src/tracing.py
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the stage-duration histogram buckets.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = "nexus"
+
+_current_trace: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar("nexus_trace", default=None)
+_current_depth: "contextvars.ContextVar[int]" = contextvars.ContextVar("nexus_span_depth", default=0)
+
+
+def _escape_label(value) -> str:
+    """A label value escaped for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Trace:
+    """Timing spans of one sampled request; safe to add to from several threads."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = "%016x" % random.getrandbits(64)
+        self.timestamp = time.time()
+        self.origin = time.perf_counter()
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, depth: int, start: float, duration: float, attrs: Optional[Dict] = None):
+        span = {
+            "name": name,
+            "depth": depth,
+            "start_ms": (start - self.origin) * 1000,
+            "duration_ms": duration * 1000,
+        }
+        if attrs:
+            span["attrs"] = attrs
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> List[Dict]:
+        """Spans in start order (parents before children)."""
+        with self._lock:
+            return sorted(self.spans, key=lambda s: (s["start_ms"], s["depth"]))
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "spans": self.breakdown(),
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "depth", "token", "start")
+
+    def __init__(self, trace: Trace, name: str, attrs: Dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.depth = _current_depth.get() + 1
+        self.token = _current_depth.set(self.depth)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _current_depth.reset(self.token)
+        self.trace.add(self.name, self.depth, self.start, time.perf_counter() - self.start, self.attrs)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Lightweight request tracing plus process-wide metrics.
+
+    trace() opens a root span for one request. Only a `sample_rate`
+    fraction of requests (or forced ones) record spans; for the rest,
+    span() is a no-op, so instrumented code pays almost nothing. Counters
+    are always kept. Finished traces feed a per-stage duration histogram
+    and, if `jsonl_path` is set, are appended there as JSON lines.
+    prometheus_text() renders counters and histograms in the Prometheus
+    text exposition format.
+
+    Defaults come from NEXUS_TRACE_SAMPLE and NEXUS_TRACE_FILE.
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, jsonl_path: Optional[str] = None):
+        if sample_rate is None:
+            sample_rate = float(os.getenv("NEXUS_TRACE_SAMPLE", "0") or 0)
+        self.sample_rate = sample_rate
+        self.jsonl_path = jsonl_path if jsonl_path is not None else os.getenv("NEXUS_TRACE_FILE") or None
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        # stage -> [bucket counts..., +Inf count], sum of seconds
+        self._histograms: Dict[str, Tuple[List[int], List[float]]] = {}
+
+    # ---------- Spans ----------
+
+    @contextmanager
+    def trace(self, name: str, force: bool = False):
+        """Root span of a request. Yields the Trace, or None when not sampled."""
+        if not (force or (self.sample_rate > 0 and random.random() < self.sample_rate)):
+            yield None
+            return
+        tr = Trace(name)
+        trace_token = _current_trace.set(tr)
+        depth_token = _current_depth.set(0)
+        start = time.perf_counter()
+        try:
+            yield tr
+        finally:
+            tr.add(name, 0, start, time.perf_counter() - start)
+            _current_depth.reset(depth_token)
+            _current_trace.reset(trace_token)
+            self._finish(tr)
+
+    def span(self, name: str, **attrs):
+        """Nested timing span inside the current trace (a shared no-op outside one)."""
+        tr = _current_trace.get()
+        if tr is None:
+            return _NULL_SPAN
+        return _Span(tr, name, attrs)
+
+    def record(self, name: str, start: float, duration: float, **attrs):
+        """Add a span measured by hand (perf_counter start), e.g. across generator yields."""
+        tr = _current_trace.get()
+        if tr is not None:
+            tr.add(name, _current_depth.get() + 1, start, duration, attrs)
+
+    def active(self) -> bool:
+        return _current_trace.get() is not None
+
+    # ---------- Metrics ----------
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, stage: str, seconds: float):
+        """Add a duration measured outside any trace (e.g. start-up) to the stage histogram."""
+        with self._lock:
+            self._observe(stage, seconds)
+
+    def _observe(self, stage: str, seconds: float):
+        hist = self._histograms.get(stage)
+        if hist is None:
+            hist = self._histograms[stage] = ([0] * (len(DURATION_BUCKETS) + 1), [0.0])
+        counts, total = hist
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        total[0] += seconds
+
+    def _finish(self, tr: Trace):
+        spans = tr.breakdown()
+        with self._lock:
+            for s in spans:
+                self._observe(s["name"], s["duration_ms"] / 1000)
+        if self.jsonl_path:
+            try:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(tr.to_dict()) + "\n")
+            except OSError:
+                pass
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                name + "".join(f"[{k}={v}]" for k, v in labels): value
+                for (name, labels), value in sorted(self._counters.items())
+            }
+
+    def prometheus_text(self) -> str:
+        def fmt_labels(pairs) -> str:
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            by_name: Dict[str, List] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                by_name.setdefault(name, []).append((labels, value))
+            for name, series in by_name.items():
+                metric = f"{METRIC_PREFIX}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in series:
+                    lines.append(f"{metric}{fmt_labels(labels)} {value:.15g}")
+
+            if self._histograms:
+                metric = f"{METRIC_PREFIX}_stage_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for stage, (counts, total) in sorted(self._histograms.items()):
+                    for bound, n in zip(DURATION_BUCKETS, counts):
+                        lines.append(f"{metric}_bucket{fmt_labels([('stage', stage), ('le', f'{bound:g}')])} {n}")
+                    lines.append(f"{metric}_bucket{fmt_labels([('stage', stage), ('le', '+Inf')])} {counts[-1]}")
+                    lines.append(f"{metric}_sum{fmt_labels([('stage', stage)])} {total[0]:.6f}")
+                    lines.append(f"{metric}_count{fmt_labels([('stage', stage)])} {counts[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Atomically write prometheus_text() to path (node_exporter textfile collector style)."""
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Process-wide tracer used by the instrumented modules.
+tracer = Tracer()
+span = tracer.span
+count = tracer.count
+record = tracer.record
@@ -1,22 +1,117 @@
 # src/vision.py
+import io
+import re
+import hashlib
 import logging
-import google.generativeai as genai
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from src.backends import GeminiBackend
+from src.cache import LRUCache
+from src.model_client import OK, ModelClient, ModelResult, default_client
+from src.tracing import count, span
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+# EXIF tag holding the camera orientation; 1 means "already upright".
+_EXIF_ORIENTATION = 0x0112
+# "QUESTION: ..." lines requested by the extraction prompt, tolerating
+# list markers or numbering the model sometimes puts in front. Matches stay
+# on one line, so an empty QUESTION: never swallows the next line.
+_QUESTION_RE = re.compile(r"^[ \t*\-\d.)]*QUESTION[ \t]*:[ \t]*(\S.*?)[ \t\r]*$", re.IGNORECASE | re.MULTILINE)
+
+
+def parse_questions(text: str) -> List[str]:
+    """The distinct QUESTION: lines of an extraction, in order."""
+    questions = []
+    seen = set()
+    for m in _QUESTION_RE.finditer(text or ""):
+        q = m.group(1)
+        if q.lower() not in seen:
+            seen.add(q.lower())
+            questions.append(q)
+    return questions
+
+
+def preprocess_image(
+    data: bytes,
+    mime_type: str,
+    max_dim: int = 1600,
+    grayscale: bool = True,
+    fmt: str = "JPEG",
+    quality: int = 80,
+    small_bytes: int = 256 * 1024,
+) -> Tuple[bytes, str]:
+    """
+    Shrink an uploaded image before it is sent for text extraction: apply
+    the EXIF rotation, downscale so the longer side is at most `max_dim`,
+    optionally convert to grayscale, and re-encode as `fmt` (JPEG or WEBP).
+
+    Images that are already upright, within `max_dim` and under
+    `small_bytes` are returned untouched, as is anything Pillow cannot
+    read or whose re-encoding would not be smaller.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        orientation = img.getexif().get(_EXIF_ORIENTATION, 1)
+        if len(data) <= small_bytes and max(img.size) <= max_dim and orientation == 1:
+            return data, mime_type
+
+        # For JPEGs, let the decoder downscale by a power of two while reading.
+        img.draft("L" if grayscale else "RGB", (max_dim, max_dim))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+        img = img.convert("L" if grayscale else "RGB")
+
+        out = io.BytesIO()
+        img.save(out, format=fmt, quality=quality)
+    except Exception as e:
+        logger.warning("Image preprocessing skipped: %s", e)
+        return data, mime_type
+
+    processed = out.getvalue()
+    if len(processed) >= len(data) and orientation == 1:
+        return data, mime_type
+    return processed, _MIME_TYPES.get(fmt.upper(), mime_type)
+
 
 class VisionExtractor:
     """
     Uses Gemini Vision to extract text (and questions) from an image.
+    Calls share the ModelClient (limits, deadline, retries) with the generator.
+
+    Images go through preprocess_image() first (`max_dim`, `grayscale`,
+    `fmt`). Extracted text is cached in memory by a hash of the original
+    image bytes, so each distinct image is sent to the model only once.
     """
 
-    def __init__(self, model_name: str = "gemini-2.5-flash"):
-        self.model_name = model_name
-        try:
-            self.model = genai.GenerativeModel(model_name)
-        except Exception:
-            self.model = None
+    def __init__(
+        self,
+        model_name: str = "gemini-2.5-flash",
+        backend=None,
+        client: Optional[ModelClient] = None,
+        timeout: Optional[float] = None,
+        max_dim: int = 1600,
+        grayscale: bool = True,
+        fmt: str = "JPEG",
+        cache_entries: int = 256,
+        cache_bytes: int = 4 * 1024 * 1024,
+    ):
+        self.backend = backend or GeminiBackend(model_name)
+        self.model_name = self.backend.model_name
+        self.client = client or default_client()
+        self.timeout = timeout
+        self.max_dim = max_dim
+        self.grayscale = grayscale
+        self.fmt = fmt
+        self._cache = LRUCache(
+            max_entries=cache_entries,
+            max_bytes=cache_bytes,
+            sizeof=lambda text: len(text.encode("utf-8")) + 64,
+        )
 
     def _build_prompt(self) -> str:
         return (
@@ -26,32 +121,42 @@ class VisionExtractor:
             "Do NOT add any new text that is not present in the image."
         )
 
-    def extract_text(self, uploaded_file) -> str:
+    def extract(self, uploaded_file) -> ModelResult:
+        """Like extract_text(), but keeps the call status (ok / timeout / error)."""
         uploaded_file.seek(0)
         image_bytes = uploaded_file.read()
         if not image_bytes:
-            return ""
-
-        prompt = self._build_prompt()
-
-        try:
-            if self.model:
-                response = self.model.generate_content([
-                    prompt,
-                    {
-                        "mime_type": uploaded_file.type,
-                        "data": image_bytes
-                    }
-                ])
-                text = getattr(response, "text", "") or str(response)
-                return text.strip()
-            else:
-                resp = genai.generate_text(
-                    model=self.model_name,
-                    prompt=prompt + "\n\n[IMAGE DATA OMITTED]",
-                )
-                text = getattr(resp, "text", "") or str(resp)
-                return text.strip()
-        except Exception as e:
-            logger.exception("Vision extraction failed: %s", e)
-            return ""
+            return ModelResult(OK)
+
+        key = (
+            hashlib.sha256(image_bytes).hexdigest(),
+            self.model_name, self.max_dim, self.grayscale, self.fmt,
+        )
+        cached = self._cache.get(key)
+        count("vision_cache", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return ModelResult(OK, cached)
+
+        with span("vision.preprocess", bytes_in=len(image_bytes)):
+            data, mime_type = preprocess_image(
+                image_bytes, uploaded_file.type,
+                max_dim=self.max_dim, grayscale=self.grayscale, fmt=self.fmt,
+            )
+        count("vision_image_bytes", len(data))
+        prompt = [self._build_prompt(), {"mime_type": mime_type, "data": data}]
+        with span("vision.model", model=self.model_name):
+            result = self.client.call(self.backend, prompt, timeout=self.timeout)
+        count("model_results", status=result.status)
+        if not result.ok:
+            logger.error("Vision extraction failed (%s): %s", result.status, result.error)
+            return result
+        result.text = result.text.strip()
+        self._cache.put(key, result.text)
+        return result
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Hit / miss / eviction counters of the extracted-text cache."""
+        return self._cache.stats()
+
+    def extract_text(self, uploaded_file) -> str:
+        return self.extract(uploaded_file).text
@@ -0,0 +1,53 @@
+# src/warmup.py
+import time
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundResource:
+    """
+    Builds a value on a daemon thread as soon as it is created, so callers
+    can render (or serve) while it loads. `ready` / `error` report the
+    state without blocking; wait() blocks until the build has finished.
+    `seconds` is how long the build took.
+    """
+
+    def __init__(self, factory: Callable[[], Any], name: str = "warmup"):
+        self.name = name
+        self._factory = factory
+        self._value: Any = None
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self._done = threading.Event()
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self._value = self._factory()
+        except Exception as e:
+            logger.exception("%s failed: %s", self.name, e)
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.seconds = time.perf_counter() - start
+            self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self.error is None
+
+    @property
+    def value(self) -> Any:
+        """The built value, or None while loading or after a failure."""
+        return self._value if self.ready else None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the build finished (successfully or not); False on timeout."""
+        return self._done.wait(timeout)
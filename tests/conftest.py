@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the app's modules as `src.*`, like app.py and the benchmarks.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
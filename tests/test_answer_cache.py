@@ -0,0 +1,89 @@
+import pytest
+
+from src import answer_cache
+from src.answer_cache import AnswerCache, answer_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache, "time", clock)
+    return clock
+
+
+def _cache(tmp_path, **kwargs) -> AnswerCache:
+    return AnswerCache(str(tmp_path / "answers.sqlite3"), **kwargs)
+
+
+def test_round_trip_and_counters(tmp_path, clock):
+    cache = _cache(tmp_path)
+    assert cache.get("k") is None
+    cache.put("k", "answer")
+    assert cache.get("k") == "answer"
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, ttl_seconds=60)
+    cache.put("k", "answer")
+    clock.now += 59
+    assert cache.get("k") == "answer"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_use_does_not_extend_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, ttl_seconds=60)
+    cache.put("k", "answer")
+    for _ in range(3):
+        clock.now += 25
+        cache.get("k")
+    assert cache.get("k") is None
+
+
+def test_evicts_least_recently_used_beyond_max_entries(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=2)
+    cache.put("a", "1")
+    clock.now += 1
+    cache.put("b", "2")
+    clock.now += 1
+    cache.get("a")  # "b" is now the least recently used
+    clock.now += 1
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_beyond_max_bytes(tmp_path, clock):
+    cache = _cache(tmp_path, max_entries=None, max_bytes=10)
+    for key in "abc":
+        cache.put(key, "x" * 4)
+        clock.now += 1
+    stats = cache.stats()
+    assert stats["bytes"] <= 10 and stats["entries"] == 2
+    assert cache.get("a") is None
+
+
+def test_shared_between_instances(tmp_path, clock):
+    _cache(tmp_path).put("k", "answer")
+    assert _cache(tmp_path).get("k") == "answer"
+
+
+def test_key_depends_on_question_model_and_context():
+    chunks = [{"subject": "OS/deadlocks", "page": 1, "chunk_id": 1, "text": "A deadlock is..."}]
+    key = answer_key("What is a deadlock?", chunks, "model-a")
+    assert answer_key("  what is a DEADLOCK? ", chunks, "model-a") == key
+    assert answer_key("What is a deadlock?", chunks, "model-b") != key
+    edited = [dict(chunks[0], text="A deadlock occurs when...")]
+    assert answer_key("What is a deadlock?", edited, "model-a") != key
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+from src.bm25 import BM25Index
+from src.retriever import DATA_DIR, Retriever
+
+QUERIES = [
+    "deadlock",
+    "deadlock prevention circular wait",
+    "virtual memory page replacement algorithm",
+    "java generics type erasure wildcard",
+    "process thread process scheduling",
+    "unknownterm deadlock",
+]
+
+
+@pytest.fixture(scope="module")
+def texts():
+    retriever = Retriever(data_dir=DATA_DIR, index_dir=None, page_cache_dir=None, cache_entries=0)
+    return list(retriever.chunks.texts())
+
+
+@pytest.fixture(scope="module")
+def index(texts):
+    return BM25Index().fit(texts)
+
+
+def brute_force(texts, query, k1=1.2, b=0.75) -> np.ndarray:
+    """BM25 score of every document, computed directly from term counts."""
+    counter = CountVectorizer(stop_words="english")
+    tf = counter.fit_transform(texts).toarray().astype(np.float64)
+    n_docs = tf.shape[0]
+    doc_len = tf.sum(axis=1)
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+    scores = np.zeros(n_docs)
+    for term in counter.build_analyzer()(query):
+        col = counter.vocabulary_.get(term)
+        if col is None:
+            continue
+        f = tf[:, col]
+        scores += idf[col] * f * (k1 + 1) / (f + k1 * (1 - b + b * doc_len / doc_len.mean()))
+    return scores
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("k", [1, 5, 20])
+def test_maxscore_matches_brute_force(texts, index, query, k):
+    expected = brute_force(texts, query)
+    docs, scores = index.search(query, k)
+    top = np.sort(expected[expected > 0])[::-1][:k]
+    assert scores == pytest.approx(top, rel=1e-5)
+    # Every returned document really has the score reported for it.
+    assert scores == pytest.approx(expected[docs], rel=1e-5)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_ranges_restrict_the_search(texts, index):
+    query = "deadlock prevention circular wait"
+    ranges = [(0, 100), (300, 400)]
+    expected = brute_force(texts, query)
+    inside = np.zeros(len(texts), dtype=bool)
+    for lo, hi in ranges:
+        inside[lo:hi] = True
+    expected[~inside] = 0
+    docs, scores = index.search(query, 10, ranges=ranges)
+    assert inside[docs].all()
+    assert scores == pytest.approx(np.sort(expected[expected > 0])[::-1][:10], rel=1e-5)
+
+
+def test_no_known_terms(index):
+    docs, scores = index.search("zzzqqq", 5)
+    assert len(docs) == 0 and len(scores) == 0
@@ -0,0 +1,67 @@
+import glob
+import os
+
+import pytest
+
+from src.chunker import STRATEGIES, chunk_text, clean_text
+from src.retriever import DATA_DIR
+
+# Three paragraphs; leading whitespace, a tab, a zero-width space and a
+# whitespace-only separator line exercise the raw-offset mapping.
+RAW = (
+    "  First sentence here. Second one!\n\n"
+    "\tThird para, one sentence?  Fourth​ sentence.\n \n"
+    "Last paragraph without a stop"
+)
+
+
+def _chunks(raw, strategy, chunk_size=40, chunk_overlap=10):
+    return [(c["page"], c["chunk_id"], c["text"]) for c in chunk_text(raw, strategy, chunk_size, chunk_overlap)]
+
+
+def test_sentence_strategy_packs_whole_sentences():
+    assert _chunks(RAW, "sentence") == [
+        (1, 1, "First sentence here. Second one!"),
+        (2, 1, "Third para, one sentence?"),
+        (2, 2, "Fourth sentence."),
+        (3, 1, "Last paragraph without a stop"),
+    ]
+
+
+def test_paragraph_strategy_windows_only_overlong_paragraphs():
+    assert _chunks(RAW, "paragraph") == [
+        (1, 1, "First sentence here. Second one!"),
+        (2, 1, "Third para, one sentence? Fourth sentenc"),
+        (2, 2, "th sentence."),
+        (3, 1, "Last paragraph without a stop"),
+    ]
+    # Short paragraphs are packed together up to chunk_size.
+    assert _chunks(RAW, "paragraph", chunk_size=200) == [(1, 1, clean_text(RAW))]
+
+
+def test_window_strategy_overlaps_across_paragraphs():
+    chunks = _chunks(RAW, "window")
+    assert [c[:2] for c in chunks] == [(1, 1), (1, 2), (2, 1), (3, 1)]
+    assert all(len(text) <= 40 for _, _, text in chunks)
+    # Windows start chunk_size - chunk_overlap = 30 characters apart; the
+    # last one starts on a space, which is stripped.
+    cleaned = clean_text(RAW)
+    assert [cleaned.find(text) for _, _, text in chunks] == [0, 30, 60, 91]
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        list(chunk_text(RAW, "pages"))
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(40, 10), (300, 50), (900, 100)])
+def test_offsets_map_back_to_the_chunk_text(strategy, chunk_size, chunk_overlap):
+    texts = [RAW, "", "   \n\n  ", "no punctuation at all"]
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, "**", "*.txt"), recursive=True))[:6]:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    for raw in texts:
+        for c in chunk_text(raw, strategy, chunk_size, chunk_overlap):
+            assert c["text"]
+            assert clean_text(raw[c["start"] : c["end"]]) == c["text"]
@@ -0,0 +1,19 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from src.compact import Compaction, HashedTfidfVectorizer, drop_columns
+
+
+def test_hashed_vectorizers_do_not_share_a_vocabulary():
+    a = HashedTfidfVectorizer(1 << 10)
+    b = HashedTfidfVectorizer(1 << 10)
+    a.vocabulary_["deadlock"] = 3
+    assert b.vocabulary_ == {}
+    assert Compaction(hash_bits=12).new_vectorizer().vocabulary_ == {}
+
+
+def test_drop_columns_renumbers_kept_columns():
+    matrix = csr_matrix(np.array([[1.0, 0, 2.0, 3.0], [0, 4.0, 0, 5.0]]))
+    keep = np.array([True, False, True, True])
+    assert drop_columns(matrix, keep, renumber=True).toarray().tolist() == [[1.0, 2.0, 3.0], [0, 0, 5.0]]
+    assert drop_columns(matrix, keep, renumber=False).toarray().tolist() == [[1.0, 0, 2.0, 3.0], [0, 0, 0, 5.0]]
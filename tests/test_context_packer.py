@@ -0,0 +1,59 @@
+from src.chunker import chunk_text, clean_text
+from src.context_packer import ContextPacker, format_context
+
+RAW = "\n\n".join(
+    " ".join(f"Paragraph {p} sentence {s} talks about topic {p * 10 + s}." for s in range(12))
+    for p in range(6)
+)
+
+
+def _chunks(strategy="window", **kwargs):
+    """Chunks of RAW as the retriever reports them: one source, ordinals in file order."""
+    chunks = []
+    for ordinal, chunk in enumerate(chunk_text(RAW, strategy=strategy, chunk_size=300, chunk_overlap=80, **kwargs)):
+        chunks.append({"subject": "notes", "source": "notes.txt", "ordinal": ordinal, "score": 1.0, **chunk})
+    return chunks
+
+
+def test_merges_overlapping_windows_across_paragraphs():
+    chunks = _chunks()
+    assert len({c["page"] for c in chunks}) > 1
+    passages, report = ContextPacker(max_chars=None).pack(chunks)
+    assert len(passages) == 1
+    assert report["merged"] == len(chunks) - 1
+    assert passages[0]["text"] == clean_text(RAW)
+    assert report["chars_saved"] > 0
+
+
+def test_merges_consecutive_chunks_without_repeating_text():
+    chunks = _chunks()
+    picked = [chunks[2], chunks[3], chunks[4]]
+    passages, report = ContextPacker(max_chars=None).pack(picked)
+    assert report["merged"] == 2 and len(passages) == 1
+    assert passages[0]["text"] == clean_text(RAW[chunks[2]["start"] : chunks[4]["end"]])
+    assert passages[0]["chunk_ids"] == [c["chunk_id"] for c in picked]
+
+
+def test_keeps_distant_chunks_and_other_sources_apart():
+    chunks = _chunks()
+    other = dict(chunks[1], source="other.txt", subject="other")
+    passages, report = ContextPacker(max_chars=None).pack([chunks[0], chunks[5], other])
+    assert report["merged"] == 0 and len(passages) == 3
+
+
+def test_chunks_without_source_group_by_page():
+    chunks = [{k: v for k, v in c.items() if k not in ("source", "ordinal")} for c in _chunks("sentence")]
+    same_page = [c for c in chunks if c["page"] == chunks[0]["page"]]
+    passages, report = ContextPacker(max_chars=None).pack(same_page)
+    assert report["merged"] == len(same_page) - 1
+
+
+def test_drops_near_duplicates_and_fits_the_budget():
+    chunks = _chunks()
+    copy = dict(chunks[0], subject="copy", source="copy.txt", score=0.5)
+    passages, report = ContextPacker(max_chars=None).pack([chunks[0], copy])
+    assert report["duplicates"] == 1 and len(passages) == 1
+
+    passages, report = ContextPacker(max_chars=500, min_tail_chars=100).pack(_chunks())
+    assert len(format_context(passages)) <= 500
+    assert report["truncated"] == 1
@@ -0,0 +1,67 @@
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from src.chunk_store import ChunkStore
+from src.dedup import DEFAULT_THRESHOLD, near_duplicates
+
+TEXTS = [
+    "the mitochondria is the powerhouse of the cell and makes atp for the cell",
+    "photosynthesis turns light water and carbon dioxide into glucose and oxygen",
+    "the mitochondria is the powerhouse of the cell and makes atp for the cell",
+    "newton's second law says force equals mass times acceleration for a body",
+    "the mitochondria is the powerhouse of the cell and it makes atp for the cell",
+    "",
+    "",
+]
+
+
+def _features(texts):
+    return CountVectorizer(ngram_range=(1, 2)).fit_transform(texts).tocsr()
+
+
+def test_near_duplicates_collapse_into_the_first_copy():
+    canonical = near_duplicates(_features(TEXTS), DEFAULT_THRESHOLD)
+    assert canonical.tolist() == [0, 1, 0, 3, 0, 5, 6]
+
+
+def test_distinct_chunks_survive():
+    texts = [t for t in TEXTS if t and "mitochondria" not in t] + [TEXTS[0]]
+    canonical = near_duplicates(_features(texts), DEFAULT_THRESHOLD)
+    assert canonical.tolist() == list(range(len(texts)))
+
+
+def test_threshold_above_similarity_keeps_near_copies():
+    # Rows 0 and 2 are identical; row 4 only shares most of their bigrams.
+    canonical = near_duplicates(_features(TEXTS), 0.99)
+    assert canonical.tolist() == [0, 1, 0, 3, 4, 5, 6]
+
+
+def test_collapse_keeps_back_references():
+    rows = [
+        {"subject": "Biology", "page": 1, "chunk_id": 0, "text": "cell", "start": 0, "end": 4},
+        {"subject": "Physics", "page": 1, "chunk_id": 0, "text": "force", "start": 0, "end": 5},
+        {"subject": "Biology", "page": 2, "chunk_id": 3, "text": "cell", "start": 9, "end": 13},
+        {"subject": "Chemistry", "page": 4, "chunk_id": 1, "text": "force", "start": 2, "end": 7},
+        {"subject": "Chemistry", "page": 5, "chunk_id": 0, "text": "cell", "start": 0, "end": 4},
+    ]
+    store = ChunkStore.from_rows(rows).collapse(np.array([0, 1, 0, 1, 0]))
+
+    assert len(store) == 2
+    assert [(c["subject"], c["page"], c["chunk_id"], c["text"]) for c in store] == [
+        ("Biology", 1, 0, "cell"),
+        ("Physics", 1, 0, "force"),
+    ]
+    assert store.duplicates(0) == [
+        {"subject": "Biology", "page": 2, "chunk_id": 3},
+        {"subject": "Chemistry", "page": 5, "chunk_id": 0},
+    ]
+    assert store.duplicates(1) == [{"subject": "Chemistry", "page": 4, "chunk_id": 1}]
+    assert store.duplicate_count() == 3
+    assert store.subject_names() == ["Biology", "Chemistry", "Physics"]
+
+
+def test_collapse_without_duplicates_is_unchanged():
+    rows = [{"subject": "A", "page": 1, "chunk_id": i, "text": f"t{i}"} for i in range(3)]
+    store = ChunkStore.from_rows(rows).collapse(np.arange(3))
+    assert [c["text"] for c in store] == ["t0", "t1", "t2"]
+    assert store.duplicate_count() == 0
@@ -0,0 +1,102 @@
+import pytest
+
+from src.backends import FakeBackend
+from src.generator import (
+    CLASSIC_INSUFFICIENT_MSG,
+    MODEL_ERROR_MSG,
+    GeminiGenerator,
+)
+from src.model_client import ModelClient
+
+CONTEXT = [{"subject": "OS/deadlocks", "page": 1, "chunk_id": 1, "text": "A deadlock is a cycle of waits."}]
+
+
+class BrokenStream(FakeBackend):
+    """Streams the first `good` deltas of its reply, then fails."""
+
+    def __init__(self, reply: str, good: int, **kwargs):
+        super().__init__(reply, **kwargs)
+        self.good = good
+
+    def generate_stream(self, prompt, timeout=None):
+        for i, delta in enumerate(super().generate_stream(prompt, timeout)):
+            if i == self.good:
+                raise ConnectionError("connection reset")
+            yield delta
+
+
+@pytest.fixture
+def client():
+    client = ModelClient(max_concurrency=2, timeout=5.0, max_retries=0)
+    yield client
+    client.close()
+
+
+def _generator(backend, client, tmp_path=None, max_chars=2200) -> GeminiGenerator:
+    cache_path = str(tmp_path / "answers.sqlite3") if tmp_path else None
+    return GeminiGenerator(backend=backend, client=client, cache_path=cache_path, max_chars=max_chars)
+
+
+def test_deltas_add_up_to_the_final_text(client):
+    backend = FakeBackend("A deadlock is a cycle of processes   \n waiting on each other.  \n\n", stream_chars=5)
+    stream = _generator(backend, client).generate_stream("What is a deadlock?", CONTEXT)
+    deltas = list(stream)
+    assert len(deltas) > 1
+    assert "".join(deltas) == stream.text
+    assert stream.text == "A deadlock is a cycle of processes   \n waiting on each other."
+
+
+def test_stops_at_max_chars(client):
+    backend = FakeBackend("word " * 200, stream_chars=7)
+    stream = _generator(backend, client, max_chars=50).generate_stream("q", CONTEXT)
+    deltas = list(stream)
+    assert "".join(deltas) == stream.text
+    assert len(stream.text) <= 50
+    # The model stream is closed once the budget is spent.
+    assert backend.streamed_deltas < len("word " * 200) // 7
+
+
+def test_insufficient_message_is_detected_early(client):
+    backend = FakeBackend(CLASSIC_INSUFFICIENT_MSG + " " + "padding " * 100, stream_chars=4)
+    stream = _generator(backend, client).generate_stream("q", CONTEXT)
+    assert list(stream) == [CLASSIC_INSUFFICIENT_MSG]
+    assert stream.text == CLASSIC_INSUFFICIENT_MSG
+    assert backend.streamed_deltas <= len(CLASSIC_INSUFFICIENT_MSG) // 4 + 1
+
+
+def test_insufficient_message_after_shown_text(client, tmp_path):
+    backend = FakeBackend("Looking at the passages. " + CLASSIC_INSUFFICIENT_MSG, stream_chars=6)
+    generator = _generator(backend, client, tmp_path)
+    stream = generator.generate_stream("q", CONTEXT)
+    assert "".join(stream) == stream.text
+    assert stream.text.endswith(CLASSIC_INSUFFICIENT_MSG)
+    # Cached like generate() would have answered.
+    assert generator.generate("q", CONTEXT) == CLASSIC_INSUFFICIENT_MSG
+    assert backend.calls == 1
+
+
+def test_partial_stream_then_error_is_marked_and_not_cached(client, tmp_path):
+    reply = "A deadlock is a cycle of processes waiting on each other."
+    backend = BrokenStream(reply, good=3, stream_chars=8)
+    generator = _generator(backend, client, tmp_path)
+    stream = generator.generate_stream("q", CONTEXT)
+    deltas = list(stream)
+    assert "".join(deltas) == stream.text
+    assert stream.text.startswith(reply[:20])
+    assert "cut short" in stream.text and MODEL_ERROR_MSG in stream.text
+    assert generator.cache.stats()["entries"] == 0
+
+
+def test_error_before_any_text(client):
+    stream = _generator(BrokenStream("never shown", good=0), client).generate_stream("q", CONTEXT)
+    assert list(stream) == [MODEL_ERROR_MSG]
+    assert stream.text == MODEL_ERROR_MSG
+
+
+def test_cached_answer_is_streamed_whole(client, tmp_path):
+    backend = FakeBackend("Cached answer.", stream_chars=3)
+    generator = _generator(backend, client, tmp_path)
+    assert "".join(generator.generate_stream("q", CONTEXT)) == "Cached answer."
+    stream = generator.generate_stream("q", CONTEXT)
+    assert list(stream) == ["Cached answer."]
+    assert backend.calls == 1
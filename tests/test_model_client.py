@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from src.backends import FakeBackend
+from src.model_client import ERROR, OK, TIMEOUT, ModelClient, ModelTimeout
+
+
+class Gauge:
+    """Reply callable that sleeps `seconds` and records the peak number of concurrent calls."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.seconds)
+        with self.lock:
+            self.active -= 1
+        return f"answer to {prompt}"
+
+
+@pytest.fixture
+def client():
+    client = ModelClient(max_concurrency=2, timeout=5.0, max_retries=3, backoff_base=0.01, backoff_max=0.02)
+    yield client
+    client.close()
+
+
+def _call_all(client, backend, prompts, timeout=None):
+    results = [None] * len(prompts)
+
+    def run(i):
+        results[i] = client.call(backend, prompts[i], timeout=timeout)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(prompts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_retries_transient_errors_with_backoff(client):
+    failures = [ConnectionError("reset"), ConnectionError("reset")]
+
+    def reply(prompt):
+        if failures:
+            raise failures.pop()
+        return "ok"
+
+    result = client.call(FakeBackend(reply), "q")
+    assert result.status == OK and result.text == "ok"
+    assert result.attempts == 3
+    assert client.stats()["retries"] == 2
+
+
+def test_does_not_retry_permanent_errors(client):
+    def reply(prompt):
+        raise ValueError("bad request")
+
+    result = client.call(FakeBackend(reply), "q")
+    assert result.status == ERROR
+    assert result.attempts == 1
+    assert "ValueError" in result.error
+
+
+def test_gives_up_after_max_retries(client):
+    def reply(prompt):
+        raise ConnectionError("down")
+
+    result = client.call(FakeBackend(reply), "q")
+    assert result.status == ERROR
+    assert result.attempts == client.max_retries + 1
+
+
+def test_coalesces_identical_prompts_in_flight(client):
+    backend = FakeBackend(Gauge(0.2))
+    results = _call_all(client, backend, ["same"] * 3)
+    assert backend.calls == 1
+    assert {r.text for r in results} == {"answer to same"}
+    assert sum(r.coalesced for r in results) == 2
+
+
+def test_times_out(client):
+    start = time.monotonic()
+    result = client.call(FakeBackend(Gauge(1.0)), "slow", timeout=0.1)
+    assert result.status == TIMEOUT
+    assert time.monotonic() - start < 0.5
+    assert client.stats()["timeouts"] == 1
+
+
+def test_caps_concurrency(client):
+    gauge = Gauge(0.1)
+    results = _call_all(client, FakeBackend(gauge), [f"q{i}" for i in range(6)])
+    assert all(r.ok for r in results)
+    assert gauge.peak == 2
+
+
+def test_timed_out_calls_keep_their_slot_until_they_return(client):
+    gauge = Gauge(0.5)
+    timed_out = _call_all(client, FakeBackend(gauge), [f"slow{i}" for i in range(3)], timeout=0.05)
+    assert all(r.status == TIMEOUT for r in timed_out)
+
+    # The abandoned calls are still running; new calls must wait for them
+    # rather than push past max_concurrency.
+    results = _call_all(client, FakeBackend(gauge), [f"fast{i}" for i in range(4)])
+    assert all(r.ok for r in results)
+    assert gauge.peak == 2
+
+
+def test_stream_holds_a_slot(client):
+    gauge = Gauge(0.1)
+    backend = FakeBackend("streamed answer", stream_chars=4)
+    deltas = list(client.stream(backend, "q"))
+    assert "".join(deltas) == "streamed answer"
+    # The stream's slot was released: both slots are free for calls.
+    results = _call_all(client, FakeBackend(gauge), ["a", "b"])
+    assert all(r.ok for r in results) and gauge.peak == 2
+
+
+def test_timed_out_stream_keeps_its_slot_until_the_read_returns(client):
+    stuck = FakeBackend("late answer", first_delay=0.5)
+    with pytest.raises(ModelTimeout):
+        list(client.stream(stuck, "q", timeout=0.05))
+
+    # One slot is still taken by the pending read, so two calls run one after the other.
+    start = time.monotonic()
+    results = _call_all(client, FakeBackend(Gauge(0.1)), ["a", "b"])
+    assert all(r.ok for r in results)
+    assert time.monotonic() - start >= 0.2
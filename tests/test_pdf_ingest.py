@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+pytest.importorskip("pypdf")
+
+from src import pdf_pages  # noqa: E402
+from src.retriever import Retriever  # noqa: E402
+
+PAGES = [
+    "Semaphores guard critical sections. A mutex is a binary semaphore.",
+    "Monitors wrap condition variables and a lock.",
+    "The banker algorithm avoids deadlock by checking for a safe state.",
+]
+
+
+def _write_pdf(path, pages):
+    """A minimal uncompressed PDF with one line of Helvetica text per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    font = 3 + 2 * len(pages)
+    for i, text in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> >>".encode()
+        )
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "data"
+    os.makedirs(root / "OS")
+    _write_pdf(root / "OS" / "sync.pdf", PAGES)
+    return root
+
+
+def _retriever(corpus, tmp_path, **kwargs) -> Retriever:
+    return Retriever(
+        data_dir=str(corpus),
+        index_dir=str(tmp_path / "index"),
+        page_cache_dir=str(tmp_path / "pages"),
+        extract_workers=1,
+        cache_entries=0,
+        **kwargs,
+    )
+
+
+def test_pdf_chunks_carry_page_numbers_and_sources(corpus, tmp_path):
+    retriever = _retriever(corpus, tmp_path)
+    assert retriever.get_subjects() == ["OS/sync"]
+    assert [(c["page"], c["chunk_id"]) for c in retriever.chunks] == [(1, 1), (2, 1), (3, 1)]
+
+    top = retriever.retrieve("banker algorithm safe state", top_k=1)[0]
+    assert top["page"] == 3
+    assert top["source"].endswith(os.path.join("OS", "sync.pdf") + "#page=3")
+    # start/end point into the page's extracted text, not the whole book.
+    assert top["start"] == 0 and "banker algorithm" in top["text"]
+
+
+def test_page_cache_serves_later_builds(corpus, tmp_path, monkeypatch):
+    first = _retriever(corpus, tmp_path)
+    digest = next(iter(first._pdf_digests.values()))
+    assert pdf_pages.PageCache(str(tmp_path / "pages")).count(digest) == len(PAGES)
+
+    def unreadable(path):
+        raise AssertionError("page cache hit expected, PDF was opened")
+
+    monkeypatch.setattr(pdf_pages, "_open", unreadable)
+    rebuilt = _retriever(corpus, tmp_path)
+    rebuilt.reload(incremental=False)
+    assert [c["text"] for c in rebuilt.chunks] == [c["text"] for c in first.chunks]
+
+
+def test_changed_pdf_misses_the_page_cache(corpus, tmp_path):
+    retriever = _retriever(corpus, tmp_path)
+    old_digest = next(iter(retriever._pdf_digests.values()))
+
+    _write_pdf(corpus / "OS" / "sync.pdf", PAGES[:2] + ["Peterson solution for two processes."])
+    retriever.reload()
+
+    new_digest = next(iter(retriever._pdf_digests.values()))
+    assert new_digest != old_digest
+    assert pdf_pages.PageCache(str(tmp_path / "pages")).count(new_digest) == len(PAGES)
+    top = retriever.retrieve("peterson solution", top_k=1)[0]
+    assert (top["page"], top["source"].rsplit("#", 1)[1]) == (3, "page=3")
+    assert not any("banker" in c["text"] for c in retriever.chunks)
@@ -0,0 +1,135 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from src.retriever import DATA_DIR, Retriever
+
+FILES = ["OS/deadlocks.txt", "OS/security.txt", "JAVA/generics.txt", "JAVA/multithreading.txt"]
+QUERIES = ["deadlock prevention", "circular wait", "generic type erasure", "thread synchronization", "encryption keys"]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "data"
+    for name in FILES:
+        os.makedirs(root / os.path.dirname(name), exist_ok=True)
+        shutil.copy(os.path.join(DATA_DIR, name), root / name)
+    return root
+
+
+def _retriever(corpus, index_dir=None, **kwargs) -> Retriever:
+    return Retriever(
+        data_dir=str(corpus),
+        index_dir=str(index_dir) if index_dir else None,
+        page_cache_dir=None,
+        cache_entries=0,
+        **kwargs,
+    )
+
+
+def _edit(corpus):
+    with open(corpus / "OS/deadlocks.txt", "a", encoding="utf-8") as f:
+        f.write("\n\nBanker's algorithm checks every request against a safe state before granting it.\n")
+    os.remove(corpus / "JAVA/generics.txt")
+    with open(corpus / "JAVA/records.txt", "w", encoding="utf-8") as f:
+        f.write("Records are immutable data carriers with generated accessors and equals.\n" * 5)
+
+
+def _ids(results):
+    return [(r["subject"], r["page"], r["chunk_id"]) for r in results]
+
+
+def test_incremental_reload_matches_a_full_rebuild(corpus, tmp_path):
+    retriever = _retriever(corpus, tmp_path / "index", refit_threshold=1.0)
+    _edit(corpus)
+    retriever.reload()
+    assert retriever._manifest["fit"]["drift"] > 0  # spliced, not rebuilt
+    rebuilt = _retriever(corpus)
+
+    assert [dict(c) for c in retriever.chunks] == [dict(c) for c in rebuilt.chunks]
+    assert retriever.get_subjects() == rebuilt.get_subjects()
+    # BM25 is fitted from the chunks alone, so rankings are identical.
+    for query in QUERIES:
+        a = retriever.retrieve(query, top_k=5, backend="bm25")
+        b = rebuilt.retrieve(query, top_k=5, backend="bm25")
+        assert _ids(a) == _ids(b)
+        assert [r["score"] for r in a] == pytest.approx([r["score"] for r in b])
+
+
+def test_refit_after_drift_matches_a_full_rebuild(corpus, tmp_path):
+    retriever = _retriever(corpus, tmp_path / "index", refit_threshold=0.0)
+    _edit(corpus)
+    retriever.reload()
+    assert retriever._manifest["fit"]["drift"] == 0
+    rebuilt = _retriever(corpus)
+
+    assert retriever.vectorizer.vocabulary_ == rebuilt.vectorizer.vocabulary_
+    assert np.allclose(retriever.vectorizer.idf_, rebuilt.vectorizer.idf_)
+    assert abs(retriever.tfidf_matrix - rebuilt.tfidf_matrix).max() < 1e-12
+    for query in QUERIES:
+        assert _ids(retriever.retrieve(query, top_k=5)) == _ids(rebuilt.retrieve(query, top_k=5))
+
+
+def test_reloaded_index_round_trips_through_disk(corpus, tmp_path):
+    retriever = _retriever(corpus, tmp_path / "index", refit_threshold=1.0)
+    _edit(corpus)
+    retriever.reload()
+    loaded = _retriever(corpus, tmp_path / "index", refit_threshold=1.0)
+
+    assert len(loaded.chunks) == len(retriever.chunks)
+    assert (loaded.tfidf_matrix != retriever.tfidf_matrix).nnz == 0
+    for query in QUERIES:
+        for backend in ("tfidf", "bm25"):
+            a = loaded.retrieve(query, top_k=5, backend=backend)
+            assert _ids(a) == _ids(retriever.retrieve(query, top_k=5, backend=backend))
+
+
+def test_reload_with_dedup_matches_a_full_rebuild(corpus, tmp_path):
+    os.makedirs(corpus / "COPY")
+    shutil.copy(corpus / "OS/deadlocks.txt", corpus / "COPY/deadlocks_notes.txt")
+    retriever = _retriever(corpus, tmp_path / "index", refit_threshold=1.0, dedup_threshold=0.8)
+    assert retriever.chunks.duplicate_count() > 0
+    shutil.copy(corpus / "OS/security.txt", corpus / "COPY/security_notes.txt")
+    retriever.reload()
+    rebuilt = _retriever(corpus, dedup_threshold=0.8)
+
+    assert [dict(c) for c in retriever.chunks] == [dict(c) for c in rebuilt.chunks]
+    assert [retriever.chunks.duplicates(i) for i in range(len(retriever.chunks))] == [
+        rebuilt.chunks.duplicates(i) for i in range(len(rebuilt.chunks))
+    ]
+    assert abs(retriever.tfidf_matrix - rebuilt.tfidf_matrix).max() < 1e-12
+
+
+def test_reload_invalidates_cached_results(corpus, tmp_path):
+    retriever = Retriever(data_dir=str(corpus), index_dir=str(tmp_path / "index"), page_cache_dir=None)
+    query = "immutable data carriers generated accessors"
+    before = retriever.retrieve(query, top_k=3)
+    assert retriever.retrieve(query, top_k=3) == before
+    assert retriever.cache_stats()["hits"] == 1
+
+    generation = retriever.generation
+    _edit(corpus)
+    retriever.reload()
+    assert retriever.generation > generation
+    assert retriever.cache_stats()["entries"] == 0
+
+    after = retriever.retrieve(query, top_k=3)
+    assert after[0]["subject"] == "JAVA/records"
+    assert "JAVA/records" not in [r["subject"] for r in before]
+    assert retriever.cache_stats()["hits"] == 1
+
+
+def test_results_computed_across_a_reload_are_not_cached(corpus):
+    retriever = Retriever(data_dir=str(corpus), index_dir=None, page_cache_dir=None)
+    compute = retriever._retrieve_bm25
+
+    def reload_midway(*args):
+        results = compute(*args)
+        retriever._invalidate_derived()  # what reload() does once the new index is in place
+        return results
+
+    retriever._retrieve_bm25 = reload_midway
+    retriever.retrieve("deadlock prevention", top_k=3, backend="bm25")
+    assert retriever.cache_stats()["entries"] == 0
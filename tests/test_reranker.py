@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from src.reranker import Reranker
+from src.retriever import DATA_DIR, Retriever
+
+
+def test_candidates_within_budget_are_all_kept():
+    rows = np.arange(200)
+    assert len(Reranker(candidate_budget_ms=10.0).cut_candidates(rows, 0.005, 5)) == 200
+    assert len(Reranker(candidate_budget_ms=None).cut_candidates(rows, 1.0, 5)) == 200
+
+
+def test_candidates_over_budget_are_cut_in_proportion():
+    rows = np.arange(200)
+    rr = Reranker(candidate_budget_ms=10.0)
+    assert list(rr.cut_candidates(rows, 0.020, 5)) == list(range(100))
+    assert list(rr.cut_candidates(rows, 10.0, 5)) == list(range(5))
+
+
+@pytest.fixture(scope="module")
+def retriever():
+    return Retriever(data_dir=DATA_DIR, index_dir=None, page_cache_dir=None, cache_entries=0)
+
+
+def test_rerank_over_candidate_budget_still_returns_top_k(retriever, monkeypatch):
+    seen = []
+    rerank = Reranker.rerank
+
+    def spy(self, query, q_vec, rows, *args):
+        seen.append(len(rows))
+        return rerank(self, query, q_vec, rows, *args)
+
+    monkeypatch.setattr(Reranker, "rerank", spy)
+    retriever.reranker = Reranker(candidates=200, candidate_budget_ms=1e-6)
+    results = retriever.retrieve("deadlock prevention", top_k=5, backend="rerank")
+    assert len(results) == 5
+    assert seen == [5]
+
+    retriever.reranker = Reranker(candidates=200, candidate_budget_ms=None)
+    retriever.retrieve("deadlock prevention", top_k=5, backend="rerank")
+    assert seen[-1] > 5
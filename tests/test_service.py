@@ -0,0 +1,53 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from src.retriever import DATA_DIR
+from src.service import QueryService, make_handler
+
+
+@pytest.fixture(scope="module")
+def url():
+    service = QueryService({"data_dir": DATA_DIR, "index_dir": None, "page_cache_dir": None})
+    service.load()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def _post(url: str, path: str, data: bytes):
+    request = urllib.request.Request(url + path, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as resp:
+            return resp.status, json.load(resp)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_retrieve(url):
+    status, body = _post(url, "/retrieve", json.dumps({"query": "deadlock prevention", "top_k": 3}).encode())
+    assert status == 200 and len(body["results"]) == 3
+
+
+@pytest.mark.parametrize(
+    "payload, message",
+    [
+        (b"{not json", "request body must be valid JSON"),
+        (b"[1, 2]", "request body must be a JSON object"),
+        (json.dumps({"query": ""}).encode(), "'query' must be a non-empty string"),
+        (json.dumps({"query": "x", "top_k": "many"}).encode(), "'top_k' must be an integer"),
+        (json.dumps({"query": "x", "top_k": [1]}).encode(), "'top_k' must be an integer"),
+        (json.dumps({"query": "x", "top_k": 500}).encode(), "'top_k' must be between 1 and 50"),
+        (json.dumps({"query": "x", "route": "far"}).encode(), "'route' must be an integer"),
+        (json.dumps({"query": "x", "subjects": ["NOPE/nothing"]}).encode(), "'subjects' names an unknown subject or folder"),
+    ],
+)
+def test_bad_requests_get_fixed_messages(url, payload, message):
+    status, body = _post(url, "/retrieve", payload)
+    assert status == 400
+    assert body == {"error": message}
@@ -0,0 +1,17 @@
+from src.tracing import METRIC_PREFIX, Tracer
+
+
+def test_prometheus_label_values_are_escaped():
+    tracer = Tracer(sample_rate=0)
+    tracer.count("requests", route='a\\b"c\nd')
+    assert f'{METRIC_PREFIX}_requests_total{{route="a\\\\b\\"c\\nd"}} 1' in tracer.prometheus_text().splitlines()
+
+
+def test_prometheus_text_plain_labels_unchanged():
+    tracer = Tracer(sample_rate=0)
+    tracer.count("requests", 2, route="ask")
+    tracer.observe("retrieve", 0.003)
+    lines = tracer.prometheus_text().splitlines()
+    assert f'{METRIC_PREFIX}_requests_total{{route="ask"}} 2' in lines
+    assert f'{METRIC_PREFIX}_stage_seconds_bucket{{stage="retrieve",le="0.005"}} 1' in lines
+    assert f'{METRIC_PREFIX}_stage_seconds_count{{stage="retrieve"}} 1' in lines
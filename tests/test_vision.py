@@ -0,0 +1,123 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.backends import FakeBackend
+from src.model_client import ModelClient
+from src.vision import VisionExtractor, parse_questions, preprocess_image
+
+
+class Upload(io.BytesIO):
+    """The parts of a Streamlit UploadedFile that VisionExtractor uses."""
+
+    def __init__(self, data: bytes, type: str = "image/png"):
+        super().__init__(data)
+        self.type = type
+
+
+def _image(width, height, fmt="PNG", **save) -> bytes:
+    pixels = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, format=fmt, **save)
+    return out.getvalue()
+
+
+@pytest.fixture
+def client():
+    client = ModelClient(max_concurrency=2, timeout=5.0, max_retries=0)
+    yield client
+    client.close()
+
+
+def test_large_image_is_downscaled_and_reencoded():
+    data = _image(2400, 1200)
+    out, mime_type = preprocess_image(data, "image/png", max_dim=800)
+    img = Image.open(io.BytesIO(out))
+    assert mime_type == "image/jpeg"
+    assert (img.format, img.mode, img.size) == ("JPEG", "L", (800, 400))
+    assert len(out) < len(data)
+
+
+def test_color_webp_output():
+    out, mime_type = preprocess_image(_image(1000, 500), "image/png", max_dim=500, grayscale=False, fmt="WEBP")
+    img = Image.open(io.BytesIO(out))
+    assert mime_type == "image/webp"
+    assert (img.format, img.mode, img.size) == ("WEBP", "RGB", (500, 250))
+
+
+def test_small_upright_image_is_untouched():
+    data = _image(64, 32)
+    assert preprocess_image(data, "image/png") == (data, "image/png")
+
+
+def test_exif_rotation_is_applied_even_to_small_images():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise to display
+    data = _image(64, 32, fmt="JPEG", exif=exif)
+    out, mime_type = preprocess_image(data, "image/jpeg")
+    assert mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(out)).size == (32, 64)
+
+
+def test_unreadable_bytes_are_passed_through():
+    assert preprocess_image(b"not an image", "image/png") == (b"not an image", "image/png")
+
+
+def test_extraction_is_cached_by_image_content(client):
+    backend = FakeBackend("QUESTION: What is a semaphore?")
+    vision = VisionExtractor(backend=backend, client=client, max_dim=400)
+    data = _image(800, 600)
+
+    assert vision.extract_text(Upload(data)) == "QUESTION: What is a semaphore?"
+    # Same bytes under another upload object (and name) is a hit.
+    assert vision.extract_text(Upload(data, type="image/x-png")) == "QUESTION: What is a semaphore?"
+    assert backend.calls == 1
+    assert vision.cache_stats()["hits"] == 1
+
+    vision.extract_text(Upload(_image(800, 601)))
+    assert backend.calls == 2
+    # Another preprocessing setting is another cache key.
+    vision.max_dim = 200
+    vision.extract_text(Upload(data))
+    assert backend.calls == 3
+
+
+def test_failed_extractions_are_not_cached(client):
+    def fail(prompt):
+        raise RuntimeError("model down")
+
+    vision = VisionExtractor(backend=FakeBackend(fail), client=client)
+    data = _image(64, 32)
+    assert not vision.extract(Upload(data)).ok
+    assert vision.cache_stats()["entries"] == 0
+    assert vision.extract_text(Upload(b"")) == ""
+
+
+def test_parse_questions_tolerates_list_markers():
+    text = (
+        "Unit 3: Synchronization\n"
+        "QUESTION: What is a semaphore?\n"
+        "1. QUESTION: Define a monitor.  \n"
+        "- question : Explain the banker algorithm.\n"
+        "  * 2) Question:What is starvation?\n"
+        "A semaphore is an integer variable. QUESTION: not at line start\n"
+    )
+    assert parse_questions(text) == [
+        "What is a semaphore?",
+        "Define a monitor.",
+        "Explain the banker algorithm.",
+        "What is starvation?",
+    ]
+
+
+def test_parse_questions_drops_repeats_and_blanks():
+    text = "QUESTION: What is a deadlock?\nQUESTION:   \nquestion: what is a DEADLOCK?\nQUESTION: Why?"
+    assert parse_questions(text) == ["What is a deadlock?", "Why?"]
+    assert parse_questions("QUESTION: What is paging?\r\nQUESTION: What is a TLB?\r\n") == [
+        "What is paging?",
+        "What is a TLB?",
+    ]
+    assert parse_questions("") == []
+    assert parse_questions(None) == []